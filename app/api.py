@@ -1,11 +1,19 @@
-"""RPC-style action API endpoints (POST /api/{action})."""
+"""RPC-style action API endpoints (POST /api/{action}).
 
+Endpoints that only touch the database are plain ``def`` so FastAPI runs them in its
+threadpool; endpoints that dispatch messages stay ``async`` and use ``run_db``.
+"""
+
+import datetime
 import json
 import secrets
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import get_db, run_db
 from app.auth import require_login
 from app.models import Channel, APIKey, MessageLog
 from app.schemas import (
@@ -15,19 +23,31 @@ from app.schemas import (
     DeleteChannelRequest,
     TestChannelRequest,
     CreateKeyRequest,
+    UpdateKeyRequest,
     DeleteKeyRequest,
     RetryMsgRequest,
+    StartProfileRequest,
 )
+from app import breaker, cache, retention, retry, stats
+from app.log_query import LogFilters, count_logs, invalidate_counts, log_to_dict, parse_time, query_logs
 from app.services import dispatch_message
 from app.channels import get_handler, all_types
+from app import dedup, log_sink, pacing, profiling
+from app.config import settings
+from app.http_client import pool_stats as http_pool_stats
+from app.smtp_pool import pool_stats as smtp_pool_stats
 
 router = APIRouter(prefix="/api", dependencies=[Depends(require_login)])
 
 
+def _bad_request(msg: str) -> JSONResponse:
+    return JSONResponse(status_code=400, content=ApiResponse(ok=False, msg=msg).model_dump())
+
+
 # ── Channel CRUD ─────────────────────────────────────────
 
 @router.post("/create_channel", response_model=ApiResponse)
-async def create_channel(req: CreateChannelRequest, db: Session = Depends(get_db)):
+def create_channel(req: CreateChannelRequest, db: Session = Depends(get_db)):
     # Validate channel type and config
     try:
         handler = get_handler(req.type)
@@ -46,11 +66,12 @@ async def create_channel(req: CreateChannelRequest, db: Session = Depends(get_db
     )
     db.add(ch)
     db.commit()
+    cache.invalidate()
     return ApiResponse(msg="渠道已创建")
 
 
 @router.post("/update_channel", response_model=ApiResponse)
-async def update_channel(req: UpdateChannelRequest, db: Session = Depends(get_db)):
+def update_channel(req: UpdateChannelRequest, db: Session = Depends(get_db)):
     # Validate channel type and config
     try:
         handler = get_handler(req.type)
@@ -61,32 +82,36 @@ async def update_channel(req: UpdateChannelRequest, db: Session = Depends(get_db
     ch = db.query(Channel).filter(Channel.id == req.id).first()
     if not ch:
         return ApiResponse(ok=False, msg="渠道不存在")
+    breaker.reset(ch.name)  # the edit may have fixed whatever tripped it
     ch.name = req.name
     ch.type = req.type
     ch.config = json.dumps(req.config, ensure_ascii=False)
     ch.is_default = req.is_default
     ch.enabled = req.enabled
     db.commit()
+    cache.invalidate()
     return ApiResponse(msg="渠道已更新")
 
 
 @router.post("/delete_channel", response_model=ApiResponse)
-async def delete_channel(req: DeleteChannelRequest, db: Session = Depends(get_db)):
+def delete_channel(req: DeleteChannelRequest, db: Session = Depends(get_db)):
     ch = db.query(Channel).filter(Channel.id == req.id).first()
     if not ch:
         return ApiResponse(ok=False, msg="渠道不存在")
     db.delete(ch)
     db.commit()
+    cache.invalidate()
+    breaker.reset(ch.name)
     return ApiResponse(msg="渠道已删除")
 
 
 @router.post("/test_channel", response_model=ApiResponse)
-async def test_channel(req: TestChannelRequest, db: Session = Depends(get_db)):
-    ch = db.query(Channel).filter(Channel.id == req.id).first()
+async def test_channel(req: TestChannelRequest):
+    ch = await run_db(lambda db: db.query(Channel).filter(Channel.id == req.id).first())
     if not ch:
         return ApiResponse(ok=False, msg="渠道不存在")
     logs = await dispatch_message(
-        db, title="Herald 测试消息", body="这是一条来自 Herald 的测试消息。", channels=[ch], api_key_name="[test]"
+        title="Herald 测试消息", body="这是一条来自 Herald 的测试消息。", channels=[ch], api_key_name="[test]"
     )
     log = logs[0]
     if log.status == "failed":
@@ -97,43 +122,105 @@ async def test_channel(req: TestChannelRequest, db: Session = Depends(get_db)):
 # ── API Key CRUD ─────────────────────────────────────────
 
 @router.post("/create_key", response_model=ApiResponse)
-async def create_key(req: CreateKeyRequest, db: Session = Depends(get_db)):
+def create_key(req: CreateKeyRequest, db: Session = Depends(get_db)):
     key_value = secrets.token_hex(16)  # 32-char lowercase alphanumeric
-    k = APIKey(name=req.name, key=key_value)
+    k = APIKey(name=req.name, key=key_value, async_delivery=req.async_delivery, rate_limit=req.rate_limit)
     db.add(k)
     db.commit()
+    cache.invalidate()
     return ApiResponse(msg="密钥已创建", data={"key": key_value})
 
 
+@router.post("/update_key", response_model=ApiResponse)
+def update_key(req: UpdateKeyRequest, db: Session = Depends(get_db)):
+    k = db.query(APIKey).filter(APIKey.id == req.id).first()
+    if not k:
+        return ApiResponse(ok=False, msg="密钥不存在")
+    k.name = req.name
+    k.async_delivery = req.async_delivery
+    k.rate_limit = req.rate_limit
+    db.commit()
+    cache.invalidate()
+    return ApiResponse(msg="密钥已更新")
+
+
 @router.post("/delete_key", response_model=ApiResponse)
-async def delete_key(req: DeleteKeyRequest, db: Session = Depends(get_db)):
+def delete_key(req: DeleteKeyRequest, db: Session = Depends(get_db)):
     k = db.query(APIKey).filter(APIKey.id == req.id).first()
     if not k:
         return ApiResponse(ok=False, msg="密钥不存在")
     db.delete(k)
     db.commit()
+    cache.invalidate()
     return ApiResponse(msg="密钥已删除")
 
 
 # ── Log Operations ───────────────────────────────────────
 
 @router.post("/clear_logs", response_model=ApiResponse)
-async def clear_logs(db: Session = Depends(get_db)):
+def clear_logs(db: Session = Depends(get_db)):
     db.query(MessageLog).delete()
+    stats.clear(db)
     db.commit()
+    invalidate_counts()
     return ApiResponse(msg="日志已清空")
 
 
+@router.post("/prune_logs", response_model=ApiResponse)
+async def prune_logs():
+    if not retention.policy_enabled():
+        return ApiResponse(ok=False, msg="未配置日志保留策略 (LOG_RETENTION_DAYS / LOG_RETENTION_MAX_ROWS)")
+    result = await run_db(retention.prune)
+    return ApiResponse(msg=f"已清理 {result['expired'] + result['over_limit']} 条日志", data=result)
+
+
+@router.get("/logs")
+def list_logs(
+    cursor: Optional[str] = Query(None),
+    dir: str = Query("next", pattern="^(next|prev)$"),
+    limit: int = Query(50, ge=1, le=200),
+    status: str = Query(""),
+    channel: str = Query(""),
+    api_key: str = Query(""),
+    since: str = Query(""),
+    until: str = Query(""),
+    trace_id: str = Query(""),
+    db: Session = Depends(get_db),
+):
+    """Return logs newest first, paginated by cursor. Times are ISO-8601 UTC."""
+    try:
+        filters = LogFilters(
+            status=status.strip(),
+            channel=channel.strip(),
+            api_key=api_key.strip(),
+            since=parse_time(since),
+            until=parse_time(until),
+            trace_id=trace_id.strip(),
+        )
+    except ValueError as e:
+        return _bad_request(str(e))
+    try:
+        page = query_logs(db, filters, cursor=cursor, direction=dir, limit=limit)
+    except ValueError as e:
+        return _bad_request(str(e))
+    return ApiResponse(data={
+        "items": [log_to_dict(log) for log in page.items],
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+        "total": count_logs(db, filters),
+    })
+
+
 @router.post("/retry_msg", response_model=ApiResponse)
-async def retry_msg(req: RetryMsgRequest, db: Session = Depends(get_db)):
-    log = db.query(MessageLog).filter(MessageLog.id == req.log_id).first()
+async def retry_msg(req: RetryMsgRequest):
+    log = await run_db(lambda db: db.query(MessageLog).filter(MessageLog.id == req.log_id).first())
     if not log:
         return ApiResponse(ok=False, msg="日志不存在")
-    ch = db.query(Channel).filter(Channel.name == log.channel_name).first()
+    ch = await run_db(lambda db: db.query(Channel).filter(Channel.name == log.channel_name).first())
     if not ch:
         return ApiResponse(ok=False, msg=f"渠道 '{log.channel_name}' 已被删除")
     new_logs = await dispatch_message(
-        db, title=log.title, body=log.body, channels=[ch], api_key_name=log.api_key_name
+        title=log.title, body=log.body, channels=[ch], api_key_name=log.api_key_name
     )
     new_log = new_logs[0]
     if new_log.status == "failed":
@@ -141,6 +228,42 @@ async def retry_msg(req: RetryMsgRequest, db: Session = Depends(get_db)):
     return ApiResponse(msg="消息已重新发送")
 
 
+# ── Statistics ───────────────────────────────────────────
+
+@router.get("/stats")
+def get_stats(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    since: str = Query(""),
+    until: str = Query(""),
+    channel: str = Query(""),
+    api_key: str = Query(""),
+    db: Session = Depends(get_db),
+):
+    """Per-channel outcome counts and success rates from the pre-aggregated rollup.
+
+    Defaults to the last 7 days by day (or the last 24 hours by hour). Times are UTC.
+    """
+    default_span = datetime.timedelta(days=7) if granularity == "day" else datetime.timedelta(hours=24)
+    try:
+        start, end = parse_time(since), parse_time(until)
+    except ValueError as e:
+        return _bad_request(str(e))
+    start = start or datetime.datetime.utcnow() - default_span
+    if granularity == "day":
+        start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    data = stats.trends(
+        db, start, until=end, granularity=granularity,
+        channel=channel.strip(), api_key=api_key.strip(),
+    )
+    return ApiResponse(data=data)
+
+
+@router.post("/rebuild_stats", response_model=ApiResponse)
+def rebuild_stats(db: Session = Depends(get_db)):
+    counted = stats.rebuild(db)
+    return ApiResponse(msg=f"统计已重建（{counted} 条日志）")
+
+
 # ── Channel Type Discovery ───────────────────────────────
 
 @router.get("/channel_types")
@@ -152,6 +275,121 @@ async def channel_types():
             "type": cls.type_name,
             "display_name": cls.display_name,
             "icon": cls.icon,
-            "config_schema": cls.config_schema,
+            "config_schema": cls.config_schema + retry.CONFIG_SCHEMA,
         })
     return ApiResponse(data=types)
+
+
+# ── Diagnostics ──────────────────────────────────────────
+
+@router.get("/pool_stats")
+async def pool_stats():
+    """Return outbound connection pool statistics."""
+    return ApiResponse(data={"http": http_pool_stats(), "smtp": smtp_pool_stats()})
+
+
+@router.get("/log_sink_stats")
+async def log_sink_stats():
+    """Return write-behind log sink counters (batches, flush latency, backpressure)."""
+    return ApiResponse(data=log_sink.stats())
+
+
+@router.get("/pacing_stats")
+async def pacing_stats():
+    """Return outbound pacing counters and the number of sends waiting per bucket."""
+    return ApiResponse(data=pacing.stats())
+
+
+@router.get("/breaker_states")
+async def breaker_states():
+    """Return circuit breaker state for every channel that has failed recently."""
+    return ApiResponse(data=breaker.states())
+
+
+@router.get("/dedup_stats")
+async def dedup_stats():
+    """Return duplicate suppression counters and the number of open dedup windows."""
+    return ApiResponse(data=dedup.stats())
+
+
+# ── Profiling (PROFILING_ENABLED) ────────────────────────
+
+_PROFILING_OFF = ApiResponse(ok=False, msg="未开启性能分析 (PROFILING_ENABLED)")
+
+
+@router.post("/start_profile", response_model=ApiResponse)
+async def start_profile(req: StartProfileRequest):
+    """Start the sampling profiler; it stops by itself after ``seconds``."""
+    if not settings.PROFILING_ENABLED:
+        return _PROFILING_OFF
+    if req.seconds > settings.PROFILE_MAX_SECONDS:
+        return ApiResponse(ok=False, msg=f"采样时长不能超过 {settings.PROFILE_MAX_SECONDS:g} 秒")
+    try:
+        sampler = profiling.start_sampler(req.seconds)
+    except RuntimeError:
+        return ApiResponse(ok=False, msg="已有采样正在进行")
+    return ApiResponse(msg=f"开始采样，{req.seconds:g} 秒后自动停止", data=sampler.status())
+
+
+@router.post("/stop_profile", response_model=ApiResponse)
+async def stop_profile():
+    if not settings.PROFILING_ENABLED:
+        return _PROFILING_OFF
+    sampler = await run_in_threadpool(profiling.stop_sampler)
+    if sampler is None:
+        return ApiResponse(ok=False, msg="没有采样记录")
+    return ApiResponse(msg="采样已停止", data=sampler.status())
+
+
+@router.get("/profile_status")
+async def profile_status():
+    if not settings.PROFILING_ENABLED:
+        return _PROFILING_OFF
+    return ApiResponse(data=profiling.sampler_status())
+
+
+@router.get("/profile")
+async def download_profile():
+    """The last finished profile as collapsed stacks (for flamegraph.pl, speedscope, inferno)."""
+    if not settings.PROFILING_ENABLED:
+        return _PROFILING_OFF
+    status = profiling.sampler_status()
+    if status is None:
+        return ApiResponse(ok=False, msg="没有采样记录")
+    if status["running"]:
+        return ApiResponse(ok=False, msg="采样仍在进行，请等待结束或先停止")
+    return PlainTextResponse(
+        profiling.stop_sampler().collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="herald-{int(status["started_at"])}.folded"'},
+    )
+
+
+@router.post("/start_tracemalloc", response_model=ApiResponse)
+async def start_tracemalloc():
+    """Start tracing allocations (slows every allocation until stopped)."""
+    if not settings.PROFILING_ENABLED:
+        return _PROFILING_OFF
+    profiling.start_tracemalloc()
+    return ApiResponse(msg="已开始追踪内存分配")
+
+
+@router.post("/stop_tracemalloc", response_model=ApiResponse)
+async def stop_tracemalloc():
+    if not settings.PROFILING_ENABLED:
+        return _PROFILING_OFF
+    profiling.stop_tracemalloc()
+    return ApiResponse(msg="已停止追踪内存分配")
+
+
+@router.get("/top_allocations")
+async def top_allocations(
+    limit: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename)$"),
+):
+    """The largest live allocation sites since tracemalloc was started."""
+    if not settings.PROFILING_ENABLED:
+        return _PROFILING_OFF
+    data = await run_in_threadpool(profiling.top_allocations, limit, group_by)
+    if data is None:
+        return ApiResponse(ok=False, msg="内存分配追踪未开启，请先调用 start_tracemalloc")
+    return ApiResponse(data=data)
@@ -0,0 +1,179 @@
+"""Per-channel circuit breakers — stop hammering channels that keep failing.
+
+A channel's breaker is ``closed`` while sends work. After ``BREAKER_FAILURE_THRESHOLD``
+consecutive failed attempts that say the channel itself is broken (see :func:`counts`:
+connection errors, 5xx, rejected credentials, a missing endpoint) it ``open``s. Failures
+caused by one message — a payload the provider rejects with 400/413, a body template
+that fails for it — don't count, so a few bad messages can't block good ones; nor do
+provider rate limiting (:class:`~app.channels.RetryAfter`), which shows the channel is
+up, and attempts cut short by the delivery deadline (which may have been spent waiting
+on pacing). When open, :func:`app.services.deliver` raises :class:`CircuitOpen` instead of sending
+(direct sends record it as a failure, the async queue leaves the message pending) and a
+background task probes the channel every ``BREAKER_OPEN_SECONDS`` using the handler's
+:meth:`~app.channels.ChannelHandler.probe`. A successful probe closes the breaker.
+Handlers without ``supports_probe`` go ``half_open`` instead, letting one real send
+through as the trial: success closes the breaker, any counted failure reopens it.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from dataclasses import dataclass
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+@dataclass
+class _Breaker:
+    state: str = CLOSED
+    failures: int = 0  # consecutive failed attempts
+    opened_at: float = 0.0
+    trial_started: float = 0.0  # half-open: when the in-flight trial send was admitted
+    last_error: str = ""
+
+
+class CircuitOpen(Exception):
+    """A send was not attempted because the channel's circuit is open (or its trial is running)."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit open for channel {name} after repeated failures; next check in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+_breakers: dict[str, _Breaker] = {}
+_probes: set[asyncio.Task] = set()
+
+
+def _enabled() -> bool:
+    return settings.BREAKER_FAILURE_THRESHOLD > 0
+
+
+def fault_status(status_code: int) -> bool:
+    """HTTP statuses that say the channel is broken: server errors, auth, a missing endpoint."""
+    return status_code >= 500 or status_code in (401, 403, 404, 410)
+
+
+def counts(error: Exception) -> bool:
+    """Whether a failed attempt counts towards the channel's breaker.
+
+    Handlers say so with :class:`~app.channels.DeliveryError`'s ``channel_fault``;
+    library errors are classified here (looked up in ``sys.modules`` like
+    :func:`app.retry.retryable`, so nothing is imported). Anything else, such as a
+    ``ValueError`` from a bad config or payload, doesn't count.
+    """
+    channel_fault = getattr(error, "channel_fault", None)
+    if channel_fault is not None:
+        return channel_fault
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        if isinstance(error, httpx.HTTPStatusError):
+            return fault_status(error.response.status_code)
+        if isinstance(error, httpx.TransportError):
+            return True
+    smtplib = sys.modules.get("smtplib")
+    if smtplib is not None:
+        if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPConnectError)):
+            return True
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return False
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code == 421  # "service not available"; other codes are about the message
+    return isinstance(error, OSError)  # timeouts, refused or dropped connections
+
+
+def blocked_for(name: str) -> float:
+    """Seconds until ``name`` may be tried again, or 0 if a send would be admitted now."""
+    b = _breakers.get(name)
+    if b is None or b.state == CLOSED:
+        return 0.0
+    now = time.monotonic()
+    if b.state == HALF_OPEN:
+        trial_busy = b.trial_started and now - b.trial_started < settings.BREAKER_OPEN_SECONDS
+        return 1.0 if trial_busy else 0.0
+    return max(1.0, b.opened_at + settings.BREAKER_OPEN_SECONDS - now)
+
+
+def allow(name: str) -> bool:
+    """Whether a send to ``name`` may proceed now; admits the trial send when half-open."""
+    if blocked_for(name) > 0:
+        return False
+    b = _breakers.get(name)
+    if b is not None and b.state == HALF_OPEN:
+        b.trial_started = time.monotonic()
+    return True
+
+
+def record_success(name: str) -> None:
+    b = _breakers.get(name)
+    if b is None:
+        return
+    if b.state != CLOSED:
+        logger.info("Channel %s recovered — circuit closed", name)
+    b.state, b.failures, b.trial_started = CLOSED, 0, 0.0
+
+
+def record_failure(name: str, handler, error: Exception) -> None:
+    """Count a failed attempt; open the breaker (and start probing) at the threshold."""
+    if not _enabled():
+        return
+    b = _breakers.setdefault(name, _Breaker())
+    b.failures += 1
+    b.last_error = str(error)[:300]
+    if b.state == HALF_OPEN or (b.state == CLOSED and b.failures >= settings.BREAKER_FAILURE_THRESHOLD):
+        logger.warning("Channel %s failed %d time(s) in a row — circuit open", name, b.failures)
+        b.state, b.opened_at, b.trial_started = OPEN, time.monotonic(), 0.0
+        task = asyncio.create_task(_probe_loop(name, b, handler), name=f"herald-probe-{name}")
+        _probes.add(task)
+        task.add_done_callback(_probes.discard)
+
+
+async def _probe_loop(name: str, b: _Breaker, handler) -> None:
+    while b.state == OPEN:
+        await asyncio.sleep(settings.BREAKER_OPEN_SECONDS)
+        if b.state != OPEN:
+            return
+        if not handler.supports_probe:
+            b.state = HALF_OPEN  # the next real send is the trial
+            return
+        try:
+            await handler.probe(handler.config)
+        except Exception as e:
+            b.last_error = str(e)[:300]
+            b.opened_at = time.monotonic()
+            logger.info("Channel %s probe failed: %s", name, e)
+            continue
+        record_success(name)
+
+
+def reset(name: str) -> None:
+    """Forget a channel's breaker (e.g. after its config was edited). Thread-safe."""
+    b = _breakers.pop(name, None)
+    if b is not None:
+        b.state = CLOSED  # stops its probe loop
+
+
+def states() -> dict[str, dict]:
+    """Breaker state per channel that has failed at least once."""
+    now = time.monotonic()
+    return {
+        name: {
+            "state": b.state,
+            "failures": b.failures,
+            "last_error": b.last_error,
+            "retry_in": round(blocked_for(name), 1) if b.state != CLOSED else 0,
+            "open_for": round(now - b.opened_at) if b.state != CLOSED else 0,
+        }
+        for name, b in list(_breakers.items())
+    }
+
+
+async def stop() -> None:
+    """Cancel background probes."""
+    for task in list(_probes):
+        task.cancel()
+    await asyncio.gather(*_probes, return_exceptions=True)
@@ -0,0 +1,150 @@
+"""Process-local cache of API keys and parsed channel configs for the /send hot path.
+
+Both tables are small and only change through the ``/api`` CRUD endpoints, which call
+:func:`invalidate`. That drops this process's snapshot and bumps the shared ``config``
+version in the database; other workers compare that version at most every
+``CACHE_SYNC_INTERVAL`` seconds and reload when it moved. The snapshot is also
+reloaded after ``CACHE_TTL`` seconds as a backstop.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy.orm import Session
+
+from app import coordination
+from app.channels import get_handler, retain_channels
+from app.config import settings
+from app.database import run_db
+from app.models import APIKey, Channel
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CachedKey:
+    id: int
+    name: str
+    async_delivery: bool
+    rate_limit: int | None
+
+
+@dataclass(frozen=True)
+class CachedChannel:
+    """Read-only channel snapshot; ``config`` is already parsed."""
+    id: int
+    name: str
+    type: str
+    config: dict
+    is_default: bool
+
+
+@dataclass
+class _Snapshot:
+    keys: dict[str, CachedKey] = field(default_factory=dict)
+    channels: dict[str, CachedChannel] = field(default_factory=dict)  # enabled only
+    defaults: list[CachedChannel] = field(default_factory=list)
+    loaded_at: float = 0.0
+    version: int = 0  # shared config version the snapshot was loaded at
+    checked_at: float = 0.0  # last time the shared version was compared
+
+
+_snapshot: _Snapshot | None = None
+_reload_lock: asyncio.Lock | None = None
+
+
+def _parse_config(ch: Channel) -> dict:
+    try:
+        config = json.loads(ch.config) if ch.config else {}
+    except ValueError:
+        logger.warning("Channel %s has malformed config JSON", ch.name)
+        return {}
+    try:
+        get_handler(ch.type).validate_config(config)
+    except ValueError as e:
+        logger.warning("Channel %s has an invalid config: %s", ch.name, e)
+    return config
+
+
+def _load(db: Session) -> _Snapshot:
+    now = time.monotonic()
+    snap = _Snapshot(loaded_at=now, checked_at=now, version=coordination.version(db, "config"))
+    for k in db.query(APIKey).all():
+        snap.keys[k.key] = CachedKey(
+            id=k.id, name=k.name, async_delivery=bool(k.async_delivery), rate_limit=k.rate_limit
+        )
+    for ch in db.query(Channel).filter(Channel.enabled == True).order_by(Channel.id).all():
+        entry = CachedChannel(
+            id=ch.id,
+            name=ch.name,
+            type=ch.type,
+            config=_parse_config(ch),
+            is_default=bool(ch.is_default),
+        )
+        snap.channels[ch.name] = entry
+        if entry.is_default:
+            snap.defaults.append(entry)
+    return snap
+
+
+def _fresh(snap: _Snapshot | None) -> bool:
+    now = time.monotonic()
+    return (
+        snap is not None
+        and now - snap.loaded_at < settings.CACHE_TTL
+        and now - snap.checked_at < settings.CACHE_SYNC_INTERVAL
+    )
+
+
+async def _current() -> _Snapshot:
+    global _snapshot, _reload_lock
+    snap = _snapshot
+    if _fresh(snap):
+        return snap
+    if _reload_lock is None:
+        _reload_lock = asyncio.Lock()
+    async with _reload_lock:
+        # Another task may have reloaded (or re-checked) while we waited
+        snap = _snapshot
+        if _fresh(snap):
+            return snap
+        if snap is not None and time.monotonic() - snap.loaded_at < settings.CACHE_TTL:
+            if await run_db(coordination.version, "config") == snap.version:
+                snap.checked_at = time.monotonic()
+                return snap
+        snap = _snapshot = await run_db(_load)
+        retain_channels(snap.channels)
+    return snap
+
+
+def invalidate() -> None:
+    """Drop the snapshot here and tell other workers to reload theirs.
+
+    Call after committing a key or channel change, from a worker thread (it writes to
+    the database).
+    """
+    global _snapshot
+    _snapshot = None
+    coordination.bump("config")
+
+
+async def get_api_key(key: str) -> CachedKey | None:
+    """Return the API key entry for ``key``, or None if it doesn't exist."""
+    return (await _current()).keys.get(key)
+
+
+async def get_channel(name: str) -> CachedChannel | None:
+    """Return the enabled channel called ``name``, or None."""
+    return (await _current()).channels.get(name)
+
+
+async def resolve_channels(names: list[str] | None = None) -> list[CachedChannel]:
+    """Return the enabled channels with the given names, or the default set if no names."""
+    snap = await _current()
+    if names is None:
+        return list(snap.defaults)
+    seen = dict.fromkeys(names)  # de-duplicate, keep order
+    return [snap.channels[n] for n in seen if n in snap.channels]
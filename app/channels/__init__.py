@@ -1,8 +1,47 @@
-"""Channel handler registry — Strategy + Registry pattern for pluggable channels."""
+"""Channel handler registry — Strategy + Registry pattern for pluggable channels.
 
+Handler modules are imported on first use of their type, so a process only pays for
+the channels it actually sends to (``email`` pulls in MIME, ``webhook`` the Jinja2
+sandbox). Built-in types are listed in ``_BUILTIN``; other packages can add types
+through the ``herald.channels`` entry point group, e.g. in their ``pyproject.toml``::
+
+    [project.entry-points."herald.channels"]
+    sms = "herald_sms:SMSHandler"
+
+The entry point's name is the type name. It may point at the handler class or at a
+module that registers its handlers with :func:`register`.
+"""
+
+import importlib
+import logging
 from abc import ABC, abstractmethod
+from importlib.metadata import entry_points
 from typing import ClassVar
 
+from app.retry import validate_overrides
+
+
+class DeliveryError(Exception):
+    """A send failure whose retryability the handler knows (e.g. from a provider status).
+
+    ``channel_fault=False`` marks failures caused by this one message (a payload the
+    provider rejects, a template that fails for its body): they don't count towards the
+    channel's circuit breaker.
+    """
+
+    def __init__(self, message: str, retryable: bool, channel_fault: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+        self.channel_fault = channel_fault
+
+
+class RetryAfter(DeliveryError):
+    """Raised by a handler when the provider asks us to back off for ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message, retryable=True, channel_fault=False)  # a rate-limited channel is up
+        self.retry_after = retry_after
+
 
 class ChannelHandler(ABC):
     """Abstract base class for all channel handlers."""
@@ -10,6 +49,7 @@ class ChannelHandler(ABC):
     type_name: ClassVar[str] = ""
     display_name: ClassVar[str] = ""
     icon: ClassVar[str] = ""  # Remix Icon class, e.g. "ri-webhook-line"
+    supports_probe: ClassVar[bool] = False  # implements probe(); otherwise a real send is the breaker's trial
     config_schema: ClassVar[list[dict]] = []
     """
     Describes the config fields this channel requires.
@@ -17,21 +57,60 @@ class ChannelHandler(ABC):
                 "required": True, "placeholder": "...", "options": [...]}
     """
 
+    def __init__(self) -> None:
+        self.config: dict = {}
+        self.prepared = None
+
     @abstractmethod
     async def send(self, config: dict, title: str, body: str) -> None:
         """Send a message. Raise on failure."""
         ...
 
+    async def probe(self, config: dict) -> None:
+        """Check the channel is reachable without delivering a message; raise if not.
+
+        Used by the circuit breaker when ``supports_probe`` is set. Handlers that can't
+        probe leave both alone, and the breaker lets the next real send through as the
+        trial instead.
+        """
+        raise NotImplementedError
+
+    def prepare(self, config: dict):
+        """Pre-parse ``config`` into whatever ``send`` needs. Override per handler."""
+        return config
+
+    def configure(self, config: dict) -> None:
+        """Bind this instance to one channel's config and build its prepared state."""
+        self.prepared = self.prepare(config)
+        self.config = config
+
+    def prepared_for(self, config: dict):
+        """Return the prepared state for ``config``, reusing the bound one when it matches."""
+        return self.prepared if config is self.config else self.prepare(config)
+
     def validate_config(self, config: dict) -> None:
         """Validate config against config_schema. Raises ValueError on missing required fields."""
         for field in self.config_schema:
             if field.get("required") and not config.get(field["key"], ""):
                 raise ValueError(f"缺少必填配置项: {field['label']}")
+        validate_overrides(config)  # per-channel retry overrides must be numbers in range
 
 
 # ── Global Registry ──────────────────────────────────────
 
+logger = logging.getLogger(__name__)
+
+_BUILTIN = {
+    "webhook": "app.channels.webhook",
+    "telegram": "app.channels.telegram",
+    "email": "app.channels.email",
+}
+ENTRY_POINT_GROUP = "herald.channels"
+
 _registry: dict[str, type[ChannelHandler]] = {}
+_plugins: dict | None = None  # type name -> entry point, read on first lookup of a non-builtin type
+_shared: dict[str, ChannelHandler] = {}  # one unbound instance per type, for validation
+_bound: dict[str, ChannelHandler] = {}  # channel name -> instance configured for it
 
 
 def register(cls: type[ChannelHandler]) -> type[ChannelHandler]:
@@ -42,18 +121,76 @@ def register(cls: type[ChannelHandler]) -> type[ChannelHandler]:
     return cls
 
 
-def get_handler(type_name: str) -> ChannelHandler:
-    """Instantiate and return a handler for the given type."""
+def _entry_points() -> dict:
+    global _plugins
+    if _plugins is None:
+        _plugins = {ep.name: ep for ep in entry_points(group=ENTRY_POINT_GROUP)}
+    return _plugins
+
+
+def _load(type_name: str) -> None:
+    """Import the module providing ``type_name``, registering its handler."""
+    if type_name in _BUILTIN:
+        importlib.import_module(_BUILTIN[type_name])
+        return
+    ep = _entry_points().get(type_name)
+    if ep is None:
+        return
+    try:
+        loaded = ep.load()
+    except Exception:
+        logger.exception("Loading channel type %r from %s failed", type_name, ep.value)
+        return
+    if isinstance(loaded, type) and issubclass(loaded, ChannelHandler) and loaded.type_name not in _registry:
+        register(loaded)
+
+
+def _handler_class(type_name: str) -> type[ChannelHandler]:
     cls = _registry.get(type_name)
+    if cls is None:
+        _load(type_name)
+        cls = _registry.get(type_name)
     if not cls:
         raise ValueError(f"未知的渠道类型: {type_name}")
-    return cls()
+    return cls
 
 
-def all_types() -> dict[str, type[ChannelHandler]]:
-    """Return a copy of the registry."""
-    return dict(_registry)
+def get_handler(type_name: str) -> ChannelHandler:
+    """Return the shared, unbound handler for the given type."""
+    handler = _shared.get(type_name)
+    if handler is None:
+        handler = _shared[type_name] = _handler_class(type_name)()
+    return handler
+
+
+def handler_for(name: str, type_name: str, config: dict) -> ChannelHandler:
+    """Return the long-lived handler for channel ``name``, prepared from ``config``.
+
+    A new instance is configured only the first time a channel is seen or after its
+    type or config changed; otherwise the prepared instance is reused.
+    """
+    handler = _bound.get(name)
+    if handler is None or handler.type_name != type_name or (
+        handler.config is not config and handler.config != config
+    ):
+        handler = _handler_class(type_name)()
+        handler.configure(config)
+        _bound[name] = handler
+    return handler
+
 
+def retain_channels(names) -> None:
+    """Drop bound handlers for channels not in ``names`` (deleted or renamed)."""
+    keep = set(names)
+    for name in [n for n in _bound if n not in keep]:
+        _bound.pop(name, None)
 
-# ── Auto-import all handler modules to trigger registration ──
-from app.channels import webhook, telegram, email  # noqa: E402, F401
+
+def all_types() -> dict[str, type[ChannelHandler]]:
+    """Return every available handler type, loading the ones not used yet."""
+    names = [*_BUILTIN, *_entry_points()]
+    for type_name in names:
+        if type_name not in _registry:
+            _load(type_name)
+    ordered = {name: _registry[name] for name in names if name in _registry}
+    return {**ordered, **_registry}  # plus types registered under other names
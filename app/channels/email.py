@@ -1,12 +1,12 @@
-"""Email (SMTP) channel handler — async wrapper around smtplib."""
+"""Email (SMTP) channel handler — async wrapper around the pooled SMTP sessions."""
 
-import asyncio
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from app import tracing
 from app.channels import ChannelHandler, register
 from app.config import settings
+from app.smtp_pool import get_pool
 
 
 @register
@@ -18,18 +18,17 @@ class EmailHandler(ChannelHandler):
         {"key": "to", "label": "收件邮箱", "type": "email", "required": True, "placeholder": "user@example.com"},
     ]
 
-    async def send(self, config: dict, title: str, body: str) -> None:
+    def prepare(self, config: dict) -> str:
         to_addr = config.get("to", "")
         if not to_addr:
             raise ValueError("Email recipient (to) is empty")
+        return to_addr
 
-        host = settings.SMTP_HOST
-        port = settings.SMTP_PORT
-        user = settings.SMTP_USER
-        password = settings.SMTP_PASSWORD
-        from_addr = settings.SMTP_FROM or user
+    async def send(self, config: dict, title: str, body: str) -> None:
+        to_addr = self.prepared_for(config)
 
-        if not host or not user:
+        from_addr = settings.SMTP_FROM or settings.SMTP_USER
+        if not settings.SMTP_HOST or not from_addr:
             raise ValueError("SMTP not configured (set SMTP_HOST / SMTP_USER env vars)")
 
         msg = MIMEMultipart("alternative")
@@ -38,11 +37,6 @@ class EmailHandler(ChannelHandler):
         msg["To"] = to_addr
         msg.attach(MIMEText(body or title, "plain", "utf-8"))
 
-        # Run blocking SMTP in a thread to avoid blocking the event loop
-        await asyncio.to_thread(self._smtp_send, host, port, user, password, from_addr, to_addr, msg)
-
-    @staticmethod
-    def _smtp_send(host, port, user, password, from_addr, to_addr, msg):
-        with smtplib.SMTP_SSL(host, port, timeout=15) as server:
-            server.login(user, password)
-            server.sendmail(from_addr, [to_addr], msg.as_string())
+        # Blocking SMTP runs on the pool's own threads, off the event loop and run_db's executor
+        with tracing.span("smtp"):
+            await get_pool().send_async(from_addr, [to_addr], msg.as_string())
@@ -1,8 +1,11 @@
 """Telegram Bot channel handler."""
 
-import httpx
-
-from app.channels import ChannelHandler, register
+from app import tracing
+from app.breaker import fault_status
+from app.channels import ChannelHandler, DeliveryError, RetryAfter, register
+from app.config import settings
+from app.http_client import get_client
+from app.retry import retryable_status
 
 
 @register
@@ -10,31 +13,48 @@ class TelegramHandler(ChannelHandler):
     type_name = "telegram"
     display_name = "Telegram"
     icon = "ri-telegram-line"
+    supports_probe = True
     config_schema = [
         {"key": "bot_token", "label": "Bot Token", "type": "password", "required": True, "placeholder": "123456:ABC-..."},
         {"key": "chat_id", "label": "Chat ID", "type": "text", "required": True, "placeholder": "-100..."},
     ]
 
-    async def send(self, config: dict, title: str, body: str) -> None:
+    def prepare(self, config: dict) -> tuple[str, str]:
+        """Return the sendMessage URL and chat id."""
         bot_token = config.get("bot_token", "")
         chat_id = config.get("chat_id", "")
         if not bot_token or not chat_id:
             raise ValueError("Telegram bot_token or chat_id is empty")
+        return f"{settings.TELEGRAM_API_BASE.rstrip('/')}/bot{bot_token}/sendMessage", chat_id
+
+    async def probe(self, config: dict) -> None:
+        """Call getMe, which checks the bot token without messaging the chat."""
+        url, _ = self.prepared_for(config)
+        resp = await get_client().get(url.rsplit("/", 1)[0] + "/getMe")
+        resp.raise_for_status()
 
+    async def send(self, config: dict, title: str, body: str) -> None:
+        url, chat_id = self.prepared_for(config)
         text = f"*{title}*\n{body}" if body else f"*{title}*"
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
 
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.post(
+        with tracing.span("http"):
+            resp = await get_client().post(
                 url,
                 json={"chat_id": chat_id, "text": text, "parse_mode": "Markdown"},
             )
-            if resp.status_code != 200:
-                error_desc = resp.text
-                try:
-                    error_data = resp.json()
-                    error_desc = error_data.get("description", resp.text)
-                except Exception:
-                    pass
-                raise ValueError(f"Telegram API Error ({resp.status_code}): {error_desc}")
-            resp.raise_for_status()
+        if resp.status_code != 200:
+            error_desc = resp.text
+            retry_after = None
+            try:
+                error_data = resp.json()
+                error_desc = error_data.get("description", resp.text)
+                retry_after = (error_data.get("parameters") or {}).get("retry_after")
+            except Exception:
+                pass
+            if resp.status_code == 429 and retry_after is not None:
+                raise RetryAfter(f"Telegram API Error (429): {error_desc}", float(retry_after))
+            raise DeliveryError(
+                f"Telegram API Error ({resp.status_code}): {error_desc}",
+                retryable=retryable_status(resp.status_code),
+                channel_fault=fault_status(resp.status_code),  # not e.g. 400 "can't parse entities"
+            )
@@ -1,19 +1,58 @@
 """Webhook channel handler with Jinja2 sandboxed template rendering."""
 
 import json
-import httpx
+from dataclasses import dataclass
+from functools import lru_cache
+
+from jinja2 import Template, TemplateError, TemplateSyntaxError
 from jinja2.sandbox import SandboxedEnvironment
 
-from app.channels import ChannelHandler, register
+from app import tracing
+from app.breaker import fault_status
+from app.channels import ChannelHandler, DeliveryError, RetryAfter, register
+from app.config import settings
+from app.http_client import get_client, parse_retry_after
 
 _sandbox = SandboxedEnvironment()
 
 
+@lru_cache(maxsize=settings.WEBHOOK_TEMPLATE_CACHE_SIZE)
+def compile_template(source: str) -> Template:
+    """Parse and compile a body template once; later calls reuse the compiled template."""
+    return _sandbox.from_string(source)
+
+
+def parse_headers(text: str) -> dict[str, str]:
+    """Parse ``Key: Value`` lines (one per line, blanks ignored) into a header dict."""
+    headers = {}
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        key, sep, value = line.partition(":")
+        if not sep or not key.strip():
+            raise ValueError(f"自定义 Headers 第 {lineno} 行格式错误，应为 Key: Value")
+        headers[key.strip()] = value.strip()
+    return headers
+
+
+@dataclass(frozen=True)
+class _Target:
+    """A webhook config parsed once into everything ``send`` needs."""
+
+    url: str
+    method: str
+    content_type: str
+    template: Template | None
+    headers: dict[str, str] | None
+
+
 @register
 class WebhookHandler(ChannelHandler):
     type_name = "webhook"
     display_name = "Webhook"
     icon = "ri-webhook-line"
+    supports_probe = True
     config_schema = [
         {"key": "url", "label": "URL", "type": "url", "required": True, "placeholder": "https://..."},
         {
@@ -51,32 +90,92 @@ class WebhookHandler(ChannelHandler):
         },
     ]
 
-    async def send(self, config: dict, title: str, body: str) -> None:
+    def validate_config(self, config: dict) -> None:
+        """Also compile and trial-render the body template so its errors surface when saving."""
+        super().validate_config(config)
+        parse_headers(config.get("headers_text", ""))
+        body_template = config.get("body_template", "")
+        if not body_template.strip():
+            return
+        try:
+            rendered = compile_template(body_template).render(title="title", body="body")
+        except TemplateSyntaxError as e:
+            raise ValueError(f"自定义 Body 模板语法错误（第 {e.lineno} 行）: {e.message}")
+        except TemplateError as e:
+            raise ValueError(f"自定义 Body 模板渲染失败: {e.message}")
+        except Exception as e:
+            # e.g. TypeError from {{ title|int + body }}
+            raise ValueError(f"自定义 Body 模板渲染失败: {type(e).__name__}: {e}")
+        if config.get("content_type", "json") == "json":
+            try:
+                json.loads(rendered)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"自定义 Body 渲染结果不是合法 JSON: {e}")
+
+    def prepare(self, config: dict) -> _Target:
         url = config.get("url", "")
         if not url:
             raise ValueError("Webhook URL is empty")
-
-        method = config.get("method", "POST").upper()
-        content_type = config.get("content_type", "json")
+        # Legacy configs carry a "headers" dict; the UI saves "headers_text" lines
+        headers = dict(config.get("headers") or {})
+        headers.update(parse_headers(config.get("headers_text", "")))
         body_template = config.get("body_template", "")
-        custom_headers = config.get("headers", {})
+        return _Target(
+            url=url,
+            method=config.get("method", "POST").upper(),
+            content_type=config.get("content_type", "json"),
+            template=compile_template(body_template) if body_template.strip() else None,
+            headers=headers or None,
+        )
+
+    async def probe(self, config: dict) -> None:
+        """HEAD the target URL; it is up unless it answers 5xx, 401/403 or 404/410.
+
+        Other 4xx, and 501, mean it is reachable (e.g. 405 or 501 from a POST-only endpoint).
+        """
+        resp = await get_client().request("HEAD", self.prepared_for(config).url)
+        if resp.status_code != 501 and fault_status(resp.status_code):
+            resp.raise_for_status()
+
+    async def send(self, config: dict, title: str, body: str) -> None:
+        target = self.prepared_for(config)
+        content_type = target.content_type
 
         # Build payload — use Jinja2 sandbox for template rendering
-        if body_template.strip():
-            rendered = _sandbox.from_string(body_template).render(title=title, body=body)
-            if content_type == "form":
+        if target.template is not None:
+            with tracing.span("render"):
                 try:
-                    payload = json.loads(rendered)
-                except json.JSONDecodeError:
-                    payload = {"body": rendered}
-            else:
-                payload = json.loads(rendered)
+                    rendered = target.template.render(title=title, body=body)
+                except Exception as e:
+                    # Depends only on the template and this message: retrying can't help
+                    raise DeliveryError(
+                        f"Body template failed to render: {type(e).__name__}: {e}",
+                        retryable=False, channel_fault=False,
+                    )
+                if content_type == "form":
+                    try:
+                        payload = json.loads(rendered)
+                    except json.JSONDecodeError:
+                        payload = {"body": rendered}
+                else:
+                    try:
+                        payload = json.loads(rendered)
+                    except json.JSONDecodeError as e:
+                        # e.g. a quote or newline in the body under {"text": "{{ body }}"}
+                        raise DeliveryError(
+                            f"Rendered body is not valid JSON: {e}", retryable=False, channel_fault=False,
+                        )
         else:
             payload = {"title": title, "body": body}
 
-        async with httpx.AsyncClient(timeout=15) as client:
+        client = get_client()
+        with tracing.span("http"):
             if content_type == "form":
-                resp = await client.request(method, url, data=payload, headers=custom_headers or None)
+                resp = await client.request(target.method, target.url, data=payload, headers=target.headers)
             else:
-                resp = await client.request(method, url, json=payload, headers=custom_headers or None)
-            resp.raise_for_status()
+                resp = await client.request(target.method, target.url, json=payload, headers=target.headers)
+        if resp.status_code in (429, 503):
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            if retry_after is not None:
+                raise RetryAfter(f"Webhook returned {resp.status_code}, retry after {retry_after:g}s", retry_after)
+        resp.raise_for_status()
@@ -7,7 +7,75 @@ class Settings(BaseSettings):
     # --- Core ---
     HERALD_SECRET: str = "changeme"  # Admin login password & cookie signing key
     DATABASE_URL: str = "sqlite:///data/herald.db"
-    RATE_LIMIT_PER_MINUTE: int = 60  # Webhook rate limit per IP or API key
+    SQLITE_PROFILE: str = "default"  # default | performance (WAL + tuned pragmas + larger pool)
+    SQLITE_POOL_SIZE: int = 10  # performance profile: pooled connections (plus as many overflow)
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # performance profile: wait this long for the write lock
+    SQLITE_CACHE_SIZE_KB: int = 20000  # performance profile: page cache per connection
+    SQLITE_MMAP_SIZE: int = 268435456  # performance profile: bytes of the DB file to mmap
+    DB_POOL_SIZE: int = 10  # PostgreSQL etc.: pooled connections per worker process (plus as many overflow)
+    AUTO_MIGRATE: bool = True  # Create/upgrade tables at startup; disable when running "python -m app.migrate" first
+    RATE_LIMIT_PER_MINUTE: int = 60  # Default /send quota per API key (keys can override; 0 = unlimited)
+    RATE_LIMIT_BURST: int = 0  # Requests a key may send back-to-back (0 = its per-minute quota)
+    RATE_LIMIT_BACKEND: str = "memory"  # memory (per process) | database | redis — shared ones for multi-worker
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    SEND_BATCH_MAX: int = 100  # Max messages accepted by one /send_batch call
+
+    # --- Dispatch ---
+    DISPATCH_CONCURRENCY: int = 20  # Max concurrent channel sends per process
+    DISPATCH_CONCURRENCY_PER_TYPE: dict[str, int] = {}  # e.g. {"telegram": 5, "email": 2}
+    ASYNC_WORKERS: int = 4  # Background workers draining the async delivery queue
+    DELIVERY_CLAIM_TIMEOUT: float = 300  # seconds; a queued message claimed by a vanished process is retried after this (keep above RETRY_DEADLINE)
+    DELIVERY_SWEEP_INTERVAL: float = 60  # seconds between scans for queued messages no process is working on
+    PACING_TYPE_RATES: dict[str, float] = {}  # msgs/sec per channel type, all channels combined; e.g. {"telegram": 30}
+    PACING_CHANNEL_RATES: dict[str, float] = {}  # msgs/sec per channel; keys are channel names or types; e.g. {"telegram": 1}
+    RETRY_MAX: int = 3  # Retries after the first attempt, for transient failures only
+    RETRY_BASE_DELAY: float = 1  # seconds; backoff cap doubles per retry, actual delay is random below it
+    RETRY_MAX_DELAY: float = 30  # seconds; upper bound of the backoff cap
+    RETRY_DEADLINE: float = 120  # seconds; total time budget per message and channel, retries included
+    BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failed attempts that open a channel's circuit (0 = off)
+    BREAKER_OPEN_SECONDS: float = 30  # Fail fast this long, then probe the channel again
+    DEDUP_WINDOW: float = 0  # seconds; suppress repeats of the same message within it (0 = off)
+    DEDUP_MODE: str = "drop"  # drop | digest (send one "[×N] title" message when the window closes)
+    DEDUP_MAX_ENTRIES: int = 10000  # Max open dedup windows kept in memory
+    CACHE_TTL: float = 30  # seconds; API key / channel cache reload interval (backstop)
+    CACHE_SYNC_INTERVAL: float = 1  # seconds; how often workers check the shared config version
+
+    # --- Message log persistence ---
+    LOG_WRITE_BEHIND: bool = False  # Buffer /send logs and insert them in batches
+    LOG_BATCH_SIZE: int = 200  # Max rows per bulk insert
+    LOG_FLUSH_INTERVAL: float = 0.5  # seconds a buffered row may wait before a flush
+    LOG_QUEUE_MAX: int = 10000  # Buffered rows before /send waits (backpressure)
+    LOG_COUNT_CACHE_TTL: float = 30  # seconds a /logs total count is reused
+
+    # --- Log retention ---
+    LOG_RETENTION_DAYS: int = 0  # Delete logs older than this (0 = keep forever)
+    LOG_RETENTION_MAX_ROWS: int = 0  # Keep at most this many logs (0 = unlimited)
+    LOG_PRUNE_INTERVAL: float = 3600  # seconds between background pruning runs
+    LOG_PRUNE_BATCH_SIZE: int = 1000  # Rows deleted per short transaction
+    LOG_ARCHIVE_DIR: str = ""  # Export pruned rows to gzip JSONL files here (empty = no archive)
+
+    # --- Tracing ---
+    TRACE_EXPORT_FILE: str = ""  # Append finished traces here as OTLP/JSON lines (empty = don't export)
+
+    # --- Profiling ---
+    PROFILING_ENABLED: bool = False  # Allow the admin API to run the sampling profiler and tracemalloc
+    PROFILE_MAX_SECONDS: float = 300  # Longest profile the admin API may start
+    PROFILE_SAMPLE_INTERVAL: float = 0.005  # Seconds between stack samples while profiling
+    SLOW_REQUEST_SECONDS: float = 0  # Log /send and /send_batch requests slower than this (0 = off)
+
+    # --- Metrics ---
+    METRICS_ENABLED: bool = False  # Serve Prometheus metrics at /metrics (names channels and keys: set METRICS_TOKEN)
+    METRICS_TOKEN: str = ""  # If set, /metrics requires "Authorization: Bearer <token>"
+
+    # --- Outbound HTTP (webhook / telegram) ---
+    HTTP_TIMEOUT: float = 15  # seconds, read/write/pool timeout
+    HTTP_CONNECT_TIMEOUT: float = 5  # seconds
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20  # Idle keep-alive connections kept in the pool
+    HTTP_KEEPALIVE_EXPIRY: float = 30  # seconds before an idle connection is closed
+    HTTP2: bool = True  # Negotiate HTTP/2 where the server supports it
+    WEBHOOK_TEMPLATE_CACHE_SIZE: int = 256  # Compiled body templates kept (LRU)
+    TELEGRAM_API_BASE: str = "https://api.telegram.org"  # Bot API server (or a local Bot API / test stand-in)
 
     # --- SMTP ---
     SMTP_HOST: str = ""
@@ -15,6 +83,10 @@ class Settings(BaseSettings):
     SMTP_USER: str = ""
     SMTP_PASSWORD: str = ""
     SMTP_FROM: str = ""
+    SMTP_SECURITY: str = "ssl"  # ssl | starttls | none
+    SMTP_POOL_SIZE: int = 2  # Max concurrent SMTP sessions (kept open for reuse)
+    SMTP_IDLE_TIMEOUT: float = 60  # seconds before an idle session is discarded
+    SMTP_NOOP_AFTER: float = 10  # seconds idle before a session is checked with NOOP
 
     model_config = {"env_prefix": "", "env_file": ".env", "env_file_encoding": "utf-8"}
 
@@ -0,0 +1,59 @@
+"""Cross-worker coordination through the shared database.
+
+Worker processes (and instances) share nothing but the database. :func:`bump` and
+:func:`version` let one worker tell the others that cached state changed, and
+:func:`try_lease` elects a single worker for periodic maintenance. Both are single-row
+``UPDATE`` statements on ``app_state``, atomic on SQLite and PostgreSQL alike.
+"""
+
+import datetime
+import os
+import socket
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import AppState
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _ensure_row(db: Session, name: str) -> None:
+    if db.get(AppState, name) is not None:
+        return
+    db.add(AppState(name=name, version=0))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # another worker created it first
+
+
+def version(db: Session, name: str) -> int:
+    """Current version of ``name`` (0 if it was never bumped)."""
+    return db.query(AppState.version).filter(AppState.name == name).scalar() or 0
+
+
+def bump(name: str) -> None:
+    """Increment the version of ``name`` so other workers notice the change."""
+    with SessionLocal() as db:
+        _ensure_row(db, name)
+        db.execute(update(AppState).where(AppState.name == name).values(version=AppState.version + 1))
+        db.commit()
+
+
+def try_lease(db: Session, name: str, ttl: float) -> bool:
+    """Take or renew the lease on ``name`` for ``ttl`` seconds; False if another worker holds it."""
+    _ensure_row(db, name)
+    now = datetime.datetime.utcnow()
+    taken = db.execute(
+        update(AppState)
+        .where(
+            AppState.name == name,
+            or_(AppState.holder == WORKER_ID, AppState.lease_until.is_(None), AppState.lease_until < now),
+        )
+        .values(holder=WORKER_ID, lease_until=now + datetime.timedelta(seconds=ttl))
+    ).rowcount
+    db.commit()
+    return taken == 1
@@ -1,59 +1,83 @@
 """Database engine, session, and dependency injection."""
 
+import asyncio
+import logging
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from app.config import settings
 
-# Ensure data directory exists for SQLite
-db_path = settings.DATABASE_URL.replace("sqlite:///", "")
-db_dir = os.path.dirname(db_path)
-if db_dir:
-    os.makedirs(db_dir, exist_ok=True)
+logger = logging.getLogger(__name__)
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False},  # SQLite only
-    echo=False,
-)
+is_sqlite = settings.DATABASE_URL.startswith("sqlite")
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+if is_sqlite:
+    # Ensure data directory exists for SQLite
+    db_path = settings.DATABASE_URL.replace("sqlite:///", "")
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
 
+_sqlite_tuned = is_sqlite and settings.SQLITE_PROFILE == "performance"
+_engine_kwargs = {}
+if is_sqlite:
+    _engine_kwargs["connect_args"] = {"check_same_thread": False}
+    if _sqlite_tuned:
+        # WAL allows concurrent readers alongside the single writer, so size the pool for them
+        _engine_kwargs.update(
+            pool_size=settings.SQLITE_POOL_SIZE,
+            max_overflow=settings.SQLITE_POOL_SIZE,
+            pool_timeout=10,
+        )
+else:
+    # Server databases (e.g. postgresql+psycopg://...): every worker process has its own pool
+    _engine_kwargs.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_POOL_SIZE,
+        pool_timeout=10,
+        pool_pre_ping=True,
+    )
 
-class Base(DeclarativeBase):
-    pass
+engine = create_engine(settings.DATABASE_URL, echo=False, **_engine_kwargs)
 
 
-def init_db():
-    """Create all tables and apply lightweight migrations."""
-    from app import models  # noqa: F401 – ensure models are registered
-    Base.metadata.create_all(bind=engine)
+@event.listens_for(engine, "connect")
+def _apply_sqlite_profile(dbapi_conn, connection_record):
+    """Set per-connection pragmas for the ``performance`` SQLite profile."""
+    if not _sqlite_tuned:
+        return
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # readers no longer block the writer
+    cursor.execute("PRAGMA synchronous=NORMAL")  # fsync at checkpoints only; safe with WAL
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
 
-    # Auto-migrate: add missing columns to existing tables
-    _migrate_add_columns()
+# expire_on_commit=False: committed objects stay readable without a lazy reload,
+# which would otherwise hit the DB from the event loop after run_db() returns.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 
-def _migrate_add_columns():
-    """Add any new columns that don't exist in the current schema."""
-    migrations = [
-        ("message_logs", "retry_count", "INTEGER DEFAULT 0"),
-    ]
-    with engine.connect() as conn:
-        for table, column, col_type in migrations:
-            try:
-                conn.execute(
-                    __import__("sqlalchemy").text(
-                        f"ALTER TABLE {table} ADD COLUMN {column} {col_type}"
-                    )
-                )
-                conn.commit()
-            except Exception:
-                # Column already exists — ignore
-                conn.rollback()
+class Base(DeclarativeBase):
+    pass
+
 
-    # Manual index creation for existing tables
-    indexes = [
+# Versioned schema changes, applied once each and recorded in ``schema_migrations``.
+# A fresh database gets the current schema from the models and is marked as fully
+# migrated; only databases from older releases run these. Statements that fail are
+# skipped (databases from before versioning may already have some of the changes), so
+# keep them idempotent. Append new versions; never edit applied ones.
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (1, "columns and indexes added before versioned migrations", [
+        "ALTER TABLE message_logs ADD COLUMN retry_count INTEGER DEFAULT 0",
+        "ALTER TABLE api_keys ADD COLUMN async_delivery BOOLEAN DEFAULT FALSE",
+        "ALTER TABLE message_logs ADD COLUMN attempt_ms TEXT DEFAULT ''",
+        "ALTER TABLE api_keys ADD COLUMN rate_limit INTEGER",
+        "ALTER TABLE message_logs ADD COLUMN claimed_at TIMESTAMP",
         "CREATE INDEX IF NOT EXISTS ix_channels_name ON channels (name)",
         "CREATE INDEX IF NOT EXISTS ix_channels_type ON channels (type)",
         "CREATE INDEX IF NOT EXISTS ix_channels_is_default ON channels (is_default)",
@@ -63,14 +87,73 @@ def _migrate_add_columns():
         "CREATE INDEX IF NOT EXISTS ix_message_logs_channel_name ON message_logs (channel_name)",
         "CREATE INDEX IF NOT EXISTS ix_message_logs_api_key_name ON message_logs (api_key_name)",
         "CREATE INDEX IF NOT EXISTS ix_message_logs_created_at ON message_logs (created_at)",
-    ]
+        "CREATE INDEX IF NOT EXISTS ix_message_logs_created_at_id ON message_logs (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_message_logs_status_created_at ON message_logs (status, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_message_logs_channel_created_at ON message_logs (channel_name, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_message_logs_api_key_created_at ON message_logs (api_key_name, created_at, id)",
+    ]),
+    (2, "per-log stage timings and trace ID", [
+        "ALTER TABLE message_logs ADD COLUMN timings TEXT DEFAULT ''",
+        "ALTER TABLE message_logs ADD COLUMN trace_id VARCHAR(64) DEFAULT ''",
+        "CREATE INDEX IF NOT EXISTS ix_message_logs_trace_id ON message_logs (trace_id)",
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version() -> int:
+    """The highest applied migration, or 0 if ``schema_migrations`` doesn't exist yet."""
     with engine.connect() as conn:
-        for idx_sql in indexes:
+        try:
+            return conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() or 0
+        except Exception:
+            conn.rollback()
+            return 0
+
+
+def init_db() -> list[int]:
+    """Create or upgrade the schema; return the migration versions applied (if any).
+
+    When the database is already at :data:`SCHEMA_VERSION` this is a single query.
+    """
+    current = schema_version()
+    if current >= SCHEMA_VERSION:
+        return []
+
+    from app import models  # noqa: F401 – ensure models are registered
+    fresh = not inspect(engine).has_table("message_logs")
+    Base.metadata.create_all(bind=engine)
+    pending = [m for m in MIGRATIONS if m[0] > current]
+    if fresh:
+        _record(pending)
+        return []
+    for version, name, statements in pending:
+        _apply(version, name, statements)
+    return [m[0] for m in pending]
+
+
+def _apply(version: int, name: str, statements: list[str]) -> None:
+    with engine.connect() as conn:
+        for sql in statements:
             try:
-                conn.execute(__import__("sqlalchemy").text(idx_sql))
+                conn.execute(text(sql))
                 conn.commit()
             except Exception:
+                # Already applied (e.g. the column exists) — ignore
                 conn.rollback()
+    _record([(version, name, statements)])
+    logger.info("Applied schema migration %d: %s", version, name)
+
+
+def _record(migrations) -> None:
+    from app.models import SchemaMigration
+    with SessionLocal() as db:
+        for version, name, _ in migrations:
+            db.merge(SchemaMigration(version=version, name=name))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another process recorded them first
 
 
 def get_db():
@@ -80,3 +163,17 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def run_db(func, *args, **kwargs):
+    """Run ``func(db, *args, **kwargs)`` in a worker thread with its own short-lived session.
+
+    Use from ``async def`` code paths so DB work doesn't stall the event loop. The
+    session (and its pooled connection) never outlives the call, so no connection is
+    held across an ``await``. Returned objects stay readable after the session closes.
+    """
+    def _call():
+        with SessionLocal() as db:
+            return func(db, *args, **kwargs)
+
+    return await asyncio.to_thread(_call)
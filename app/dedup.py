@@ -0,0 +1,194 @@
+"""Duplicate suppression for ``/send`` — opt-in via ``DEDUP_WINDOW``.
+
+The first copy of a message — same API key, channels, title and body — is sent as
+usual and opens a window of ``DEDUP_WINDOW`` seconds. Copies arriving inside the
+window are not sent; each is logged with status ``suppressed``. With
+``DEDUP_MODE=digest``, when a window that suppressed anything closes, one digest
+message ("[×N] title") goes out to the same channels.
+
+The index is in memory, per process, and bounded to ``DEDUP_MAX_ENTRIES`` windows (the
+oldest are evicted first, which for digest mode means their digest is sent early). On
+shutdown, digests of open windows are not sent inline: they are saved as ``pending``
+logs, which the async delivery queue sends after the restart (or another worker's sweep
+picks up). Digests already being sent get ``SHUTDOWN_GRACE`` seconds to finish.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from app.cache import CachedChannel
+from app import tracing
+from app.config import settings
+from app.database import run_db
+from app.models import MessageLog
+from app.services import dispatch_message, save_logs
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 1  # seconds between checks for closed windows
+SHUTDOWN_GRACE = 5  # seconds stop() waits for digests already being sent
+
+_windows: "OrderedDict[str, _Window]" = OrderedDict()
+_task: asyncio.Task | None = None
+_digests: set[asyncio.Task] = set()
+_stats = {"suppressed": 0, "digests": 0, "evicted": 0}
+
+
+@dataclass
+class _Window:
+    expires_at: float
+    title: str
+    body: str
+    channels: list[CachedChannel] = field(default_factory=list)
+    api_key_name: str = ""
+    suppressed: int = 0
+
+
+def enabled() -> bool:
+    return settings.DEDUP_WINDOW > 0
+
+
+def _fingerprint(api_key_name: str, channels: list[CachedChannel], title: str, body: str) -> str:
+    names = ",".join(sorted(ch.name for ch in channels))
+    raw = "\x1f".join((api_key_name, names, title, body))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def check(api_key_name: str, channels: list[CachedChannel], title: str, body: str) -> bool:
+    """Return True if this message duplicates one sent within the window (and count it)."""
+    if not enabled():
+        return False
+    now = time.monotonic()
+    fp = _fingerprint(api_key_name, channels, title, body)
+    window = _windows.get(fp)
+    if window is not None and window.expires_at > now:
+        window.suppressed += 1
+        _stats["suppressed"] += 1
+        return True
+    if window is not None:
+        _close(fp)
+    _windows[fp] = _Window(now + settings.DEDUP_WINDOW, title, body, list(channels), api_key_name)
+    while len(_windows) > settings.DEDUP_MAX_ENTRIES:
+        _stats["evicted"] += 1
+        _close(next(iter(_windows)))
+    return False
+
+
+def suppressed_logs(api_key_name: str, channels: list[CachedChannel], title: str, body: str) -> list[MessageLog]:
+    """Log rows recording a suppressed copy, one per channel."""
+    note = "Merged into a digest" if settings.DEDUP_MODE == "digest" else "Duplicate"
+    return [
+        MessageLog(
+            title=title,
+            body=body,
+            channel_name=ch.name,
+            api_key_name=api_key_name,
+            status="suppressed",
+            error_msg=f"{note} of a message sent within the last {settings.DEDUP_WINDOW:g}s",
+            retry_count=0,
+            trace_id=tracing.current_id(),
+        )
+        for ch in channels
+    ]
+
+
+def _close(fp: str) -> None:
+    """Remove a window; in digest mode, send its digest if it suppressed anything."""
+    window = _windows.pop(fp)
+    if settings.DEDUP_MODE == "digest" and window.suppressed:
+        _stats["digests"] += 1
+        task = asyncio.get_running_loop().create_task(_send_digest(window))
+        _digests.add(task)
+        task.add_done_callback(_digests.discard)
+
+
+def _digest(window: _Window) -> tuple[str, str]:
+    """Title and body of a window's digest message."""
+    count = window.suppressed + 1
+    title = f"[×{count}] {window.title}"
+    body = f"{window.body}\n\n（{settings.DEDUP_WINDOW:g} 秒内共出现 {count} 次）".lstrip()
+    return title, body
+
+
+async def _send_digest(window: _Window) -> None:
+    title, body = _digest(window)
+    try:
+        await dispatch_message(title, body, window.channels, api_key_name=window.api_key_name)
+    except Exception:
+        logger.exception("Failed to send dedup digest for %r", window.title)
+
+
+def _close_expired() -> None:
+    now = time.monotonic()
+    for fp in [fp for fp, w in _windows.items() if w.expires_at <= now]:
+        _close(fp)
+
+
+async def _run() -> None:
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        _close_expired()
+
+
+async def start():
+    """Start the sweeper that closes expired windows (and sends digests)."""
+    global _task
+    if enabled():
+        _task = asyncio.create_task(_run(), name="herald-dedup")
+
+
+def _queued_digests(windows: list[_Window]) -> list[MessageLog]:
+    logs = []
+    for window in windows:
+        title, body = _digest(window)
+        logs.extend(
+            MessageLog(
+                title=title,
+                body=body,
+                channel_name=ch.name,
+                api_key_name=window.api_key_name,
+                status="pending",
+                retry_count=0,
+            )
+            for ch in window.channels
+        )
+    return logs
+
+
+async def stop():
+    """Stop the sweeper, queue the digests of open windows and wait briefly for those being sent.
+
+    Sending can take up to ``RETRY_DEADLINE`` per digest, so open windows' digests are
+    handed to the persistent delivery queue instead, and the whole stop is bounded.
+    """
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    if settings.DEDUP_MODE != "digest":
+        return
+    pending = [w for w in _windows.values() if w.suppressed]
+    _windows.clear()
+    if pending:
+        try:
+            await run_db(save_logs, _queued_digests(pending))
+        except Exception:
+            logger.exception("Failed to queue %d dedup digest(s) at shutdown", len(pending))
+        else:
+            logger.info("Queued %d dedup digest(s) for delivery after restart", len(pending))
+    if _digests:
+        _, unfinished = await asyncio.wait(set(_digests), timeout=SHUTDOWN_GRACE)
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            logger.warning("Cancelled %d dedup digest(s) still sending at shutdown", len(unfinished))
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+
+def stats() -> dict:
+    return {**_stats, "windows": len(_windows)}
@@ -0,0 +1,217 @@
+"""Asynchronous delivery queue — accepted messages are drained by background workers.
+
+The ``message_logs`` table is the persistent queue: every accepted message is stored
+as a ``pending`` row before ``/send`` returns, and workers flip it to ``success`` or
+``failed``. Before sending, a worker claims the row by stamping ``claimed_at`` with a
+conditional ``UPDATE``, so when several processes share the database each message is
+delivered by exactly one of them. Unclaimed rows, and rows whose claim is older than
+``DELIVERY_CLAIM_TIMEOUT`` (their process died mid-send), are picked up at startup and
+by a periodic sweep. Each process tracks the ids it has queued, deferred or is
+delivering, and never queues one of those twice.
+"""
+
+import asyncio
+import datetime
+import logging
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app import breaker, cache, tracing
+from app.cache import CachedChannel
+from app.database import run_db
+from app.models import Channel, MessageLog
+from app.services import deliver, save_logs
+
+logger = logging.getLogger(__name__)
+
+SWEEP_MIN_AGE = 30  # seconds; younger unclaimed rows are still in their own process's queue
+
+_queue: asyncio.Queue[int] | None = None
+_owned: set[int] = set()  # ids queued, deferred or in flight in this process
+_workers: list[asyncio.Task] = []
+_sweeper: asyncio.Task | None = None
+
+
+async def enqueue_message(
+    title: str,
+    body: str,
+    channels: list[Channel | CachedChannel],
+    api_key_name: str = "",
+) -> list[MessageLog]:
+    """Persist one ``pending`` log per channel and hand them to the worker pool."""
+    return (await enqueue_batch([(title, body, channels)], api_key_name))[0]
+
+
+async def enqueue_batch(
+    messages: list[tuple[str, str, list[Channel | CachedChannel]]],
+    api_key_name: str = "",
+) -> list[list[MessageLog]]:
+    """Queue several ``(title, body, channels)`` messages with a single insert transaction."""
+    batches = [
+        [
+            MessageLog(
+                title=title,
+                body=body,
+                channel_name=ch.name,
+                api_key_name=api_key_name,
+                status="pending",
+                retry_count=0,
+                trace_id=tracing.current_id(),
+            )
+            for ch in channels
+        ]
+        for title, body, channels in messages
+    ]
+    await run_db(save_logs, [log for logs in batches for log in logs])
+    for logs in batches:
+        for log in logs:
+            _schedule(log.id)
+    return batches
+
+
+def _schedule(log_id: int) -> bool:
+    """Queue ``log_id`` unless this process already has it; True if it was queued."""
+    if log_id in _owned:
+        return False
+    _owned.add(log_id)
+    _queue.put_nowait(log_id)
+    return True
+
+
+async def start():
+    """Start the worker pool and re-queue messages left pending by a previous run."""
+    global _queue, _sweeper
+    _queue = asyncio.Queue()
+    _owned.clear()
+    if settings.RETRY_DEADLINE >= settings.DELIVERY_CLAIM_TIMEOUT:
+        logger.warning(
+            "RETRY_DEADLINE (%gs) is not below DELIVERY_CLAIM_TIMEOUT (%gs): slow deliveries "
+            "may be claimed again by another process and sent twice",
+            settings.RETRY_DEADLINE, settings.DELIVERY_CLAIM_TIMEOUT,
+        )
+
+    pending = await run_db(_pending_ids, 0)
+    for log_id in pending:
+        _schedule(log_id)
+    if pending:
+        logger.info("Re-queued %d pending message(s)", len(pending))
+
+    for i in range(max(1, settings.ASYNC_WORKERS)):
+        _workers.append(asyncio.create_task(_worker(), name=f"herald-delivery-{i}"))
+    _sweeper = asyncio.create_task(_sweep(), name="herald-delivery-sweep")
+
+
+async def stop():
+    """Cancel the workers. Unfinished rows stay ``pending`` and are resumed on next start."""
+    global _sweeper
+    tasks = [*_workers, _sweeper] if _sweeper else list(_workers)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _workers.clear()
+    _sweeper = None
+
+
+def queue_size() -> int:
+    """Number of messages waiting for a worker."""
+    return _queue.qsize() if _queue else 0
+
+
+async def _worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        log_id = await _queue.get()
+        retry_in = None
+        try:
+            retry_in = await _process(log_id)
+        except Exception:
+            logger.exception("Delivery of message log %d failed unexpectedly", log_id)
+        finally:
+            _queue.task_done()
+            if retry_in is not None:
+                loop.call_later(retry_in, _queue.put_nowait, log_id)  # stays owned meanwhile
+            else:
+                _owned.discard(log_id)
+
+
+def _ago(seconds: float) -> datetime.datetime:
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds)
+
+
+def _claimable(min_age: float = 0):
+    """Pending rows no live worker is on: unclaimed (for ``min_age``+ s), or claimed too long ago."""
+    unclaimed = MessageLog.claimed_at.is_(None)
+    if min_age:
+        unclaimed &= MessageLog.created_at <= _ago(min_age)
+    return (MessageLog.status == "pending") & or_(
+        unclaimed, MessageLog.claimed_at < _ago(settings.DELIVERY_CLAIM_TIMEOUT)
+    )
+
+
+def _pending_ids(db: Session, min_age: float) -> list[int]:
+    rows = (
+        db.query(MessageLog.id)
+        .filter(_claimable(min_age))
+        .order_by(MessageLog.id)
+        .all()
+    )
+    return [log_id for (log_id,) in rows]
+
+
+async def _sweep():
+    """Queue rows other processes left behind (crashed, or stopped with a backlog)."""
+    while True:
+        await asyncio.sleep(settings.DELIVERY_SWEEP_INTERVAL)
+        try:
+            found = await run_db(_pending_ids, SWEEP_MIN_AGE)
+        except Exception:
+            logger.exception("Scanning for unclaimed messages failed")
+            continue
+        queued = sum(_schedule(log_id) for log_id in found)  # skips rows this process holds
+        if queued:
+            logger.info("Picked up %d unclaimed pending message(s)", queued)
+
+
+def _load(db: Session, log_id: int) -> MessageLog | None:
+    """Claim a pending row for this process and return it; None if it is taken or done."""
+    claimed = db.execute(
+        update(MessageLog)
+        .where(MessageLog.id == log_id, _claimable())
+        .values(claimed_at=datetime.datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return db.get(MessageLog, log_id) if claimed else None
+
+
+def _release(db: Session, log_id: int) -> None:
+    db.execute(update(MessageLog).where(MessageLog.id == log_id).values(claimed_at=None))
+    db.commit()
+
+
+async def _process(log_id: int) -> float | None:
+    """Deliver one queued row; returns seconds until it should be tried again, if deferred."""
+    log = await run_db(_load, log_id)
+    if not log:
+        return None
+    # A trace of its own, under the ID of the request that queued the message
+    with tracing.trace(log.trace_id or None, "deliver", channel=log.channel_name, log_id=log_id):
+        return await _process_claimed(log)
+
+
+async def _process_claimed(log: MessageLog) -> float | None:
+    log_id = log.id
+    ch = await cache.get_channel(log.channel_name)
+    if ch:
+        try:
+            await deliver(ch, log)
+        except breaker.CircuitOpen as e:
+            # Leave the row pending and look at it again once the circuit may pass it
+            await run_db(_release, log_id)
+            return e.retry_in
+    else:
+        log.status = "failed"
+        log.error_msg = f"Channel not found or disabled: {log.channel_name}"
+    with tracing.span("save"):
+        await run_db(save_logs, [log])
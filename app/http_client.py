@@ -0,0 +1,116 @@
+"""Shared outbound HTTP client — one pooled httpx.AsyncClient per process.
+
+Channel handlers call :func:`get_client` instead of opening a client per message, so
+connections (and TLS sessions) to the same host are kept alive and reused. The client
+(and httpx itself) is loaded by the first handler that needs it and closed on app
+shutdown; :func:`pool_stats` reports connection reuse.
+"""
+
+import datetime
+import logging
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+_client: "httpx.AsyncClient | None" = None
+_counters = {"requests": 0, "connections_opened": 0}
+
+
+async def _trace(event_name: str, info: dict) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        _counters["connections_opened"] += 1
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> "httpx.AsyncClient":
+    import httpx
+
+    class _CountingTransport(httpx.AsyncHTTPTransport):
+        """Transport that counts requests and newly opened connections."""
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            _counters["requests"] += 1
+            request.extensions = {**request.extensions, "trace": _trace}
+            return await super().handle_async_request(request)
+
+    http2 = settings.HTTP2
+    if http2 and not _http2_available():
+        logger.warning("HTTP2 enabled but the 'h2' package is not installed — using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+    transport = _CountingTransport(http2=http2, limits=limits)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+def get_client() -> "httpx.AsyncClient":
+    """Return the shared client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def stop():
+    """Close the shared client and all pooled connections (called on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def pool_stats() -> dict:
+    """Snapshot of pool usage: request/connection counters and live connection states."""
+    stats = {
+        "requests": _counters["requests"],
+        "connections_opened": _counters["connections_opened"],
+        "connections": 0,
+        "idle": 0,
+        "active": 0,
+        "http2": 0,
+    }
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    for conn in getattr(pool, "connections", []):
+        stats["connections"] += 1
+        if conn.is_idle():
+            stats["idle"] += 1
+        else:
+            stats["active"] += 1
+        if "HTTP/2" in conn.info():
+            stats["http2"] += 1
+    return stats
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a ``Retry-After`` header (delay seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
@@ -0,0 +1,192 @@
+"""Keyset (cursor) pagination and filtering over message_logs.
+
+Pages are ordered by ``(created_at, id)`` descending and addressed by an opaque cursor
+holding the boundary row's key, so every page costs one index range scan regardless
+of depth. Totals are counted once per filter set and cached for ``LOG_COUNT_CACHE_TTL``.
+"""
+
+import base64
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import astuple, dataclass
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import MessageLog
+
+MAX_LIMIT = 200
+_COUNT_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class LogFilters:
+    status: str = ""
+    channel: str = ""
+    api_key: str = ""
+    since: datetime.datetime | None = None
+    until: datetime.datetime | None = None
+    trace_id: str = ""
+
+    def as_params(self) -> dict:
+        """Non-empty filters as query-string parameters.
+
+        Times keep full precision, so page links run exactly the query of the first page.
+        """
+        params = {"status": self.status, "channel": self.channel, "api_key": self.api_key, "trace_id": self.trace_id}
+        if self.since:
+            params["since"] = self.since.isoformat()
+        if self.until:
+            params["until"] = self.until.isoformat()
+        return {k: v for k, v in params.items() if v}
+
+
+@dataclass
+class LogPage:
+    items: list[MessageLog]
+    next_cursor: str | None
+    prev_cursor: str | None
+
+
+def parse_time(value: str | None) -> datetime.datetime | None:
+    """Parse an ISO-8601 timestamp (UTC, as stored); empty values give None.
+
+    Raises ValueError for anything else that isn't a timestamp, so a typo doesn't
+    silently drop the time filter.
+    """
+    if not value or not value.strip():
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"无效的时间: {value!r}（应为 ISO-8601 格式，如 2024-01-31T08:00:00）")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def encode_cursor(log: MessageLog) -> str:
+    raw = f"{log.created_at.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """Decode a cursor into its ``(created_at, id)`` key. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, log_id = raw.rsplit("|", 1)
+        return datetime.datetime.fromisoformat(created_at), int(log_id)
+    except Exception as e:
+        raise ValueError("无效的分页游标（cursor），请从第一页重新翻页") from e
+
+
+def _filtered(db: Session, filters: LogFilters, *columns):
+    query = db.query(*columns) if columns else db.query(MessageLog)
+    if filters.status:
+        query = query.filter(MessageLog.status == filters.status)
+    if filters.channel:
+        query = query.filter(MessageLog.channel_name == filters.channel)
+    if filters.api_key:
+        query = query.filter(MessageLog.api_key_name == filters.api_key)
+    if filters.since:
+        query = query.filter(MessageLog.created_at >= filters.since)
+    if filters.until:
+        query = query.filter(MessageLog.created_at < filters.until)
+    if filters.trace_id:
+        query = query.filter(MessageLog.trace_id == filters.trace_id)
+    return query
+
+
+def query_logs(
+    db: Session,
+    filters: LogFilters,
+    cursor: str | None = None,
+    direction: str = "next",
+    limit: int = 20,
+) -> LogPage:
+    """Return one page of logs, newest first.
+
+    ``direction="next"`` returns rows older than ``cursor``; ``"prev"`` returns the
+    rows newer than it (i.e. the previous page). Raises ValueError on a bad cursor.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    key = tuple_(MessageLog.created_at, MessageLog.id)
+    query = _filtered(db, filters)
+
+    if cursor and direction == "prev":
+        boundary = decode_cursor(cursor)
+        rows = (
+            query.filter(key > tuple_(*boundary))
+            .order_by(MessageLog.created_at.asc(), MessageLog.id.asc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_prev = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        has_next = True
+    else:
+        if cursor:
+            query = query.filter(key < tuple_(*decode_cursor(cursor)))
+        rows = (
+            query.order_by(MessageLog.created_at.desc(), MessageLog.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        has_prev = bool(cursor)
+
+    return LogPage(
+        items=rows,
+        next_cursor=encode_cursor(rows[-1]) if rows and has_next else None,
+        prev_cursor=encode_cursor(rows[0]) if rows and has_prev else None,
+    )
+
+
+# ── Cached totals ────────────────────────────────────────
+
+_count_cache: OrderedDict[tuple, tuple[int, float]] = OrderedDict()
+_count_lock = threading.Lock()
+
+
+def count_logs(db: Session, filters: LogFilters) -> int:
+    """Total rows matching ``filters``, cached per filter set for ``LOG_COUNT_CACHE_TTL``."""
+    cache_key = astuple(filters)
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(cache_key)
+        if hit and now - hit[1] < settings.LOG_COUNT_CACHE_TTL:
+            return hit[0]
+    total = _filtered(db, filters, func.count(MessageLog.id)).scalar() or 0
+    with _count_lock:
+        _count_cache[cache_key] = (total, now)
+        _count_cache.move_to_end(cache_key)
+        while len(_count_cache) > _COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return total
+
+
+def invalidate_counts() -> None:
+    with _count_lock:
+        _count_cache.clear()
+
+
+def log_to_dict(log: MessageLog) -> dict:
+    return {
+        "id": log.id,
+        "title": log.title,
+        "body": log.body,
+        "status": log.status,
+        "channel_name": log.channel_name,
+        "api_key_name": log.api_key_name,
+        "error_msg": log.error_msg,
+        "retry_count": log.retry_count,
+        "attempt_ms": [int(ms) for ms in log.attempt_ms.split(",")] if log.attempt_ms else [],
+        "timings": json.loads(log.timings) if log.timings else {},
+        "trace_id": log.trace_id or "",
+        "created_at": log.created_at.isoformat() if log.created_at else None,
+    }
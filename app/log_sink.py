@@ -0,0 +1,147 @@
+"""Write-behind sink for MessageLog inserts.
+
+When ``LOG_WRITE_BEHIND`` is on, :func:`submit` only enqueues log rows; a background
+task flushes them with one bulk ``executemany`` INSERT per batch, either when
+``LOG_BATCH_SIZE`` rows are buffered or ``LOG_FLUSH_INTERVAL`` seconds after the first
+buffered row. The queue is bounded by ``LOG_QUEUE_MAX``; when it is full, submitters
+wait for the flusher (backpressure) rather than dropping rows. Remaining rows are
+flushed on shutdown.
+"""
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import run_db
+from app.models import MessageLog
+from app.stats import record as record_stats
+
+logger = logging.getLogger(__name__)
+
+FLUSH_ATTEMPTS = 3
+
+_STOP = object()
+_queue: asyncio.Queue | None = None
+_task: asyncio.Task | None = None
+_stats = {
+    "batches": 0,
+    "rows_written": 0,
+    "last_batch_size": 0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+    "total_flush_ms": 0.0,
+    "backpressure_waits": 0,
+    "dropped": 0,
+}
+
+
+def _row(log: MessageLog) -> dict:
+    """Column values for ``log``, with column defaults applied for unset fields."""
+    row = {}
+    for col in MessageLog.__table__.columns:
+        if col.primary_key:
+            continue
+        value = getattr(log, col.key)
+        if value is None and col.default is not None:
+            value = col.default.arg(None) if col.default.is_callable else col.default.arg
+        row[col.key] = value
+    return row
+
+
+def _insert_rows(db: Session, rows: list[dict]) -> None:
+    db.execute(insert(MessageLog), rows)
+    record_stats(db, ((r["created_at"], r["channel_name"], r["api_key_name"], r["status"]) for r in rows))
+    db.commit()
+
+
+async def _flush(rows: list[dict]) -> None:
+    started = time.perf_counter()
+    for attempt in range(1, FLUSH_ATTEMPTS + 1):
+        try:
+            await run_db(_insert_rows, rows)
+            break
+        except Exception:
+            logger.exception("Flushing %d message log(s) failed (attempt %d)", len(rows), attempt)
+            if attempt == FLUSH_ATTEMPTS:
+                _stats["dropped"] += len(rows)
+                return
+            await asyncio.sleep(attempt)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _stats["batches"] += 1
+    _stats["rows_written"] += len(rows)
+    _stats["last_batch_size"] = len(rows)
+    _stats["last_flush_ms"] = round(elapsed_ms, 2)
+    _stats["max_flush_ms"] = round(max(_stats["max_flush_ms"], elapsed_ms), 2)
+    _stats["total_flush_ms"] += elapsed_ms
+
+
+async def _run():
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        item = await _queue.get()
+        if item is _STOP:
+            break
+        batch = [item]
+        deadline = loop.time() + settings.LOG_FLUSH_INTERVAL
+        while len(batch) < settings.LOG_BATCH_SIZE:
+            try:
+                item = _queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(_queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                stopping = True
+                break
+            batch.append(item)
+        await _flush(batch)
+
+
+def enabled() -> bool:
+    """True when logs are currently being buffered (sink configured and running)."""
+    return _task is not None
+
+
+async def submit(logs: list[MessageLog]) -> None:
+    """Buffer ``logs`` for a later bulk insert. Waits while the queue is full."""
+    for log in logs:
+        if _queue.full():
+            _stats["backpressure_waits"] += 1
+        await _queue.put(_row(log))
+
+
+async def start():
+    """Start the flusher if ``LOG_WRITE_BEHIND`` is enabled."""
+    global _queue, _task
+    if not settings.LOG_WRITE_BEHIND:
+        return
+    _queue = asyncio.Queue(maxsize=max(1, settings.LOG_QUEUE_MAX))
+    _task = asyncio.create_task(_run(), name="herald-log-sink")
+
+
+async def stop():
+    """Flush everything still buffered and stop the flusher."""
+    global _task
+    if _task is None:
+        return
+    await _queue.put(_STOP)
+    await _task
+    _task = None
+
+
+def stats() -> dict:
+    result = dict(_stats)
+    result["total_flush_ms"] = round(result["total_flush_ms"], 2)
+    result["avg_flush_ms"] = round(_stats["total_flush_ms"] / _stats["batches"], 2) if _stats["batches"] else 0.0
+    result["queue_depth"] = _queue.qsize() if _queue else 0
+    result["enabled"] = enabled()
+    return result
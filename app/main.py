@@ -2,35 +2,41 @@
 
 import datetime
 import json
+import math
+from urllib.parse import urlencode
 
 from fastapi import FastAPI, Request, Depends, Form, Query, Header
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from typing import Optional
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 
 from app.config import settings
-from app.database import get_db, init_db
+from app.database import get_db
 from app.models import Channel, APIKey, MessageLog
 from app.schemas import ApiResponse
+from app.log_query import LogFilters, count_logs, parse_time, query_logs
 from app.auth import require_login, verify_session, create_session_cookie, clear_session_cookie
-from app.services import dispatch_message
+from app.services import dispatch_batch, dispatch_message, record_logs
 from app.api import router as api_router
-
-# Setup slowapi rate limiter based on client IP
-limiter = Limiter(key_func=get_remote_address)
+from app import (
+    breaker, cache, dedup, delivery, http_client, log_sink, metrics, migrate, profiling, ratelimit, retention,
+    smtp_pool, tracing,
+)
+from app.stats import totals_since
 
 app = FastAPI(title="Herald", docs_url=None, redoc_url=None)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+if settings.SLOW_REQUEST_SECONDS > 0:
+    app.add_middleware(profiling.SlowRequestLog, threshold=settings.SLOW_REQUEST_SECONDS)
+app.add_middleware(tracing.TraceMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.RequestTimer)
 
 # Mount static files & templates
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.filters["timings"] = tracing.format_timings
 
 # Include RPC API router
 app.include_router(api_router)
@@ -38,7 +44,28 @@ app.include_router(api_router)
 
 @app.on_event("startup")
 async def startup():
-    init_db()
+    if settings.AUTO_MIGRATE:
+        migrate.run()
+    await metrics.start()
+    await tracing.start()
+    await log_sink.start()
+    await delivery.start()
+    await retention.start()
+    await dedup.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await dedup.stop()
+    await metrics.stop()
+    await tracing.stop()
+    await retention.stop()
+    await breaker.stop()
+    await ratelimit.stop()
+    await delivery.stop()
+    await log_sink.stop()
+    await http_client.stop()
+    smtp_pool.close_pool()
 
 
 # ── Jinja2 Helpers ───────────────────────────────────────
@@ -49,6 +76,13 @@ def _ctx(request: Request, **kwargs):
     return kwargs
 
 
+def _is_truthy(value) -> bool:
+    """Interpret a JSON/form/query flag such as ``true``, ``"1"`` or ``"yes"``."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
 # ── Auth Routes ──────────────────────────────────────────
 
 @app.get("/login", response_class=HTMLResponse)
@@ -79,17 +113,14 @@ async def logout():
 # ── Page Routes (SSR, require login) ────────────────────
 
 @app.get("/", response_class=HTMLResponse, dependencies=[Depends(require_login)])
-async def page_index(request: Request, db: Session = Depends(get_db)):
+def page_index(request: Request, db: Session = Depends(get_db)):
     total_channels = db.query(Channel).count()
     total_keys = db.query(APIKey).count()
 
     today_start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_msgs = db.query(MessageLog).filter(MessageLog.created_at >= today_start).count()
-    today_failed = (
-        db.query(MessageLog)
-        .filter(MessageLog.created_at >= today_start, MessageLog.status == "failed")
-        .count()
-    )
+    today = totals_since(db, today_start)
+    today_msgs = sum(today.values())  # every log created today: sent, failed, suppressed or pending
+    today_failed = today.get("failed", 0)
 
     recent_logs = (
         db.query(MessageLog).order_by(MessageLog.created_at.desc()).limit(10).all()
@@ -107,7 +138,7 @@ async def page_index(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/channels", response_class=HTMLResponse, dependencies=[Depends(require_login)])
-async def page_channels(request: Request, db: Session = Depends(get_db)):
+def page_channels(request: Request, db: Session = Depends(get_db)):
     channels = db.query(Channel).order_by(Channel.created_at.desc()).all()
     # Parse config JSON for template display
     for ch in channels:
@@ -115,48 +146,92 @@ async def page_channels(request: Request, db: Session = Depends(get_db)):
             ch._config_dict = json.loads(ch.config) if ch.config else {}
         except Exception:
             ch._config_dict = {}
-    return templates.TemplateResponse("channels.html", _ctx(request, channels=channels))
+    return templates.TemplateResponse(
+        "channels.html", _ctx(request, channels=channels, breakers=breaker.states())
+    )
 
 
 @app.get("/keys", response_class=HTMLResponse, dependencies=[Depends(require_login)])
-async def page_keys(request: Request, db: Session = Depends(get_db)):
+def page_keys(request: Request, db: Session = Depends(get_db)):
     keys = db.query(APIKey).order_by(APIKey.created_at.desc()).all()
-    return templates.TemplateResponse("keys.html", _ctx(request, keys=keys))
+    return templates.TemplateResponse(
+        "keys.html", _ctx(request, keys=keys, default_rate_limit=settings.RATE_LIMIT_PER_MINUTE)
+    )
 
 
 @app.get("/logs", response_class=HTMLResponse, dependencies=[Depends(require_login)])
-async def page_logs(
+def page_logs(
     request: Request,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None),
+    dir: str = Query("next", pattern="^(next|prev)$"),
+    status: str = Query(""),
+    channel: str = Query(""),
+    api_key: str = Query(""),
+    since: str = Query(""),
+    until: str = Query(""),
     db: Session = Depends(get_db),
 ):
-    page_size = 20
-    total = db.query(MessageLog).count()
-    total_pages = max(1, (total + page_size - 1) // page_size)
-    logs = (
-        db.query(MessageLog)
-        .order_by(MessageLog.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
-    )
+    try:
+        filters = LogFilters(
+            status=status.strip(),
+            channel=channel.strip(),
+            api_key=api_key.strip(),
+            since=parse_time(since),
+            until=parse_time(until),
+        )
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    try:
+        page = query_logs(db, filters, cursor=cursor, direction=dir, limit=20)
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    total = count_logs(db, filters)
+    channel_names = [name for (name,) in db.query(Channel.name).order_by(Channel.name).all()]
     return templates.TemplateResponse(
         "logs.html",
-        _ctx(request, logs=logs, page=page, total_pages=total_pages),
+        _ctx(
+            request,
+            logs=page.items,
+            next_cursor=page.next_cursor,
+            prev_cursor=page.prev_cursor,
+            total=total,
+            filters=filters,
+            filter_qs=urlencode(filters.as_params()),
+            channel_names=channel_names,
+        ),
     )
 
 
 # ── Public Webhook Endpoint ──────────────────────────────
 
-@app.post("/send")
-@limiter.limit(f"{settings.RATE_LIMIT_PER_MINUTE}/minute")
-async def webhook_send(
-    request: Request,
-    db: Session = Depends(get_db),
-    key: Optional[str] = Query(None),
-    x_api_key: Optional[str] = Header(None),
-):
-    # --- Auth ---
+def _error(status_code: int, msg: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content=ApiResponse(ok=False, msg=msg).model_dump())
+
+
+async def _authenticate(key: Optional[str], x_api_key: Optional[str], cost: int = 1):
+    """Return ``(api_key, None)``, or ``(None, error_response)`` if the key is missing or
+    unknown, or has used up its rate limit. ``cost`` messages are charged to the limit
+    (``0`` to charge later with :func:`_charge`)."""
+    with tracing.span("auth"):
+        api_key, error = await _check_key(key, x_api_key)
+        if api_key and cost:
+            error = await _charge(api_key, cost)
+        return (None, error) if error else (api_key, None)
+
+
+async def _charge(api_key, cost: int) -> Optional[JSONResponse]:
+    """Count ``cost`` messages against the key's rate limit; an error response if over it."""
+    retry_after = await ratelimit.check(api_key.id, api_key.rate_limit, cost)
+    if retry_after == math.inf:
+        return _error(413, f"Batch of {cost} messages exceeds this key's burst of {ratelimit.burst(api_key.rate_limit)}")
+    if retry_after > 0:
+        response = _error(429, f"Rate limit exceeded: {ratelimit.quota(api_key.rate_limit)} messages per minute")
+        response.headers["Retry-After"] = str(math.ceil(retry_after))
+        return response
+    return None
+
+
+async def _check_key(key: Optional[str], x_api_key: Optional[str]):
     api_key_value = None
     if x_api_key:
         api_key_value = x_api_key.strip()
@@ -164,29 +239,55 @@ async def webhook_send(
         api_key_value = key.strip()
 
     if not api_key_value:
-        return JSONResponse(
-            status_code=401,
-            content=ApiResponse(ok=False, msg="Missing API key").model_dump(),
-        )
+        return None, _error(401, "Missing API key")
 
-    api_key = (
-        db.query(APIKey)
-        .filter(APIKey.key == api_key_value)
-        .first()
-    )
+    api_key = await cache.get_api_key(api_key_value)
     if not api_key:
-        return JSONResponse(
-            status_code=401,
-            content=ApiResponse(ok=False, msg="Invalid or revoked API key").model_dump(),
-        )
+        return None, _error(401, "Invalid or revoked API key")
+    return api_key, None
 
-    # --- Parse body (JSON or Form) ---
-    content_type = request.headers.get("content-type", "")
-    if "application/json" in content_type:
-        data = await request.json()
+
+async def _resolve_channels(channels_str: str):
+    """Return ``(channels, None)``, or ``([], error_message)`` if nothing matches.
+
+    ``channels_str`` is a comma-separated list of names; empty means the default channels.
+    """
+    with tracing.span("resolve"):
+        return await _lookup_channels(channels_str)
+
+
+async def _lookup_channels(channels_str: str):
+    if channels_str:
+        names = [n.strip() for n in channels_str.split(",") if n.strip()]
+        channels = await cache.resolve_channels(names)
+        if not channels:
+            return [], f"Channel(s) not found or disabled: {channels_str}"
     else:
-        form = await request.form()
-        data = dict(form)
+        channels = await cache.resolve_channels()
+        if not channels:
+            return [], "No default channels configured"
+    return channels, None
+
+
+@app.post("/send")
+async def webhook_send(
+    request: Request,
+    key: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(None),
+):
+    # --- Auth ---
+    api_key, error = await _authenticate(key, x_api_key)
+    if error:
+        return error
+
+    # --- Parse body (JSON or Form) ---
+    with tracing.span("parse"):
+        content_type = request.headers.get("content-type", "")
+        if "application/json" in content_type:
+            data = await request.json()
+        else:
+            form = await request.form()
+            data = dict(form)
 
     title = data.get("title", "").strip()
     body = data.get("body", "").strip()
@@ -199,32 +300,31 @@ async def webhook_send(
         )
 
     # --- Resolve channels ---
-    if channels_str:
-        names = [n.strip() for n in channels_str.split(",") if n.strip()]
-        channels = (
-            db.query(Channel)
-            .filter(Channel.name.in_(names), Channel.enabled == True)
-            .all()
-        )
-        if not channels:
-            return JSONResponse(
-                status_code=404,
-                content=ApiResponse(ok=False, msg=f"Channel(s) not found or disabled: {channels_str}").model_dump(),
-            )
-    else:
-        channels = (
-            db.query(Channel)
-            .filter(Channel.is_default == True, Channel.enabled == True)
-            .all()
+    channels, error_msg = await _resolve_channels(channels_str)
+    if error_msg:
+        return _error(404, error_msg)
+
+    # --- Duplicate suppression ---
+    if dedup.check(api_key.name, channels, title, body):
+        await record_logs(dedup.suppressed_logs(api_key.name, channels, title, body))
+        return ApiResponse(msg=f"Duplicate suppressed for {len(channels)} channel(s)", data={"suppressed": True})
+
+    # --- Async mode: queue and reply 202 immediately ---
+    async_flag = data.get("async", request.query_params.get("async"))
+    use_async = api_key.async_delivery if async_flag is None else _is_truthy(async_flag)
+    if use_async:
+        with tracing.span("enqueue"):
+            logs = await delivery.enqueue_message(title, body, channels, api_key_name=api_key.name)
+        return JSONResponse(
+            status_code=202,
+            content=ApiResponse(
+                msg=f"Queued for {len(logs)} channel(s)",
+                data=[{"channel": l.channel_name, "log_id": l.id} for l in logs],
+            ).model_dump(),
         )
-        if not channels:
-            return JSONResponse(
-                status_code=404,
-                content=ApiResponse(ok=False, msg="No default channels configured").model_dump(),
-            )
 
     # --- Dispatch ---
-    logs = await dispatch_message(db, title, body, channels, api_key_name=api_key.name)
+    logs = await dispatch_message(title, body, channels, api_key_name=api_key.name)
 
     failed = [l for l in logs if l.status == "failed"]
     if failed:
@@ -238,3 +338,115 @@ async def webhook_send(
         )
 
     return ApiResponse(msg=f"Sent to {len(logs)} channel(s)")
+
+
+@app.post("/send_batch")
+async def webhook_send_batch(
+    request: Request,
+    key: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(None),
+):
+    """Send many messages in one call: ``{"messages": [{title, body, channels}, ...]}``.
+
+    Authenticates and resolves channels once, dispatches every message concurrently and
+    records all logs in one transaction. Every message counts against the key's rate
+    limit. Invalid items are reported without failing the rest; ``data`` holds one
+    result per input message, in order.
+    """
+    # --- Auth (charged per message once the batch is parsed) ---
+    api_key, error = await _authenticate(key, x_api_key, cost=0)
+    if error:
+        return error
+
+    # --- Parse body (JSON only) ---
+    try:
+        data = await request.json()
+    except ValueError:
+        return _error(400, "Request body must be JSON")
+    items = data.get("messages") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return _error(400, "messages must be a non-empty array")
+    if len(items) > settings.SEND_BATCH_MAX:
+        return _error(413, f"At most {settings.SEND_BATCH_MAX} messages per batch")
+    error = await _charge(api_key, len(items))
+    if error:
+        return error
+
+    # --- Validate items and resolve each distinct channel list once ---
+    results: list[dict] = [{"index": i} for i in range(len(items))]
+    accepted = []  # (index, title, body, channels)
+    suppressed = []  # logs of duplicate messages
+    resolved = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i].update(ok=False, error="message must be an object")
+            continue
+        title = str(item.get("title") or "").strip()
+        body = str(item.get("body") or "").strip()
+        raw_channels = item.get("channels") or item.get("channel") or ""
+        if isinstance(raw_channels, list):
+            raw_channels = ",".join(str(n) for n in raw_channels)
+        channels_str = str(raw_channels).strip()
+        if not title:
+            results[i].update(ok=False, error="title is required")
+            continue
+        if channels_str not in resolved:
+            resolved[channels_str] = await _resolve_channels(channels_str)
+        channels, error_msg = resolved[channels_str]
+        if error_msg:
+            results[i].update(ok=False, error=error_msg)
+            continue
+        if dedup.check(api_key.name, channels, title, body):
+            results[i].update(ok=True, suppressed=True)
+            suppressed.extend(dedup.suppressed_logs(api_key.name, channels, title, body))
+            continue
+        accepted.append((i, title, body, channels))
+    if suppressed:
+        await record_logs(suppressed)
+
+    messages = [(title, body, channels) for _, title, body, channels in accepted]
+    async_flag = data.get("async") if isinstance(data, dict) else None
+    if async_flag is None:
+        async_flag = request.query_params.get("async")
+    use_async = api_key.async_delivery if async_flag is None else _is_truthy(async_flag)
+
+    # --- Queue or dispatch ---
+    if use_async:
+        with tracing.span("enqueue"):
+            batches = await delivery.enqueue_batch(messages, api_key_name=api_key.name) if messages else []
+        for (i, *_), logs in zip(accepted, batches):
+            results[i].update(ok=True, queued=[{"channel": l.channel_name, "log_id": l.id} for l in logs])
+    else:
+        batches = await dispatch_batch(messages, api_key_name=api_key.name) if messages else []
+        for (i, *_), logs in zip(accepted, batches):
+            results[i].update(
+                ok=all(l.status != "failed" for l in logs),
+                results=[{"channel": l.channel_name, "status": l.status, "error": l.error_msg} for l in logs],
+            )
+
+    failed = sum(1 for r in results if not r["ok"])
+    if failed:
+        return JSONResponse(
+            status_code=207,
+            content=ApiResponse(
+                ok=False, msg=f"{failed}/{len(results)} message(s) failed", data=results
+            ).model_dump(),
+        )
+    if use_async:
+        return JSONResponse(
+            status_code=202,
+            content=ApiResponse(msg=f"Queued {len(results)} message(s)", data=results).model_dump(),
+        )
+    return ApiResponse(msg=f"Sent {len(results)} message(s)", data=results)
+
+
+# ── Metrics ──────────────────────────────────────────────
+
+@app.get("/metrics")
+async def metrics_endpoint(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint (per process)."""
+    if not settings.METRICS_ENABLED:
+        return _error(404, "Metrics are disabled")
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        return _error(401, "Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,277 @@
+"""In-process metrics, served in the Prometheus text format at ``/metrics``.
+
+Counters and histograms are plain dicts keyed by label values, updated under a
+per-metric lock (uncontended, well under a microsecond; DB timings are recorded from
+worker threads). Histograms count per bucket, found with :func:`bisect.bisect_left`,
+and are made cumulative only when rendered. Gauges — connection pools, queue depths,
+breaker states — are read from the owning modules only when ``/metrics`` is scraped,
+so they cost nothing in between. Metrics are per process; with several workers, scrape each one
+or let the collector aggregate.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+from app import breaker, http_client, log_sink, smtp_pool
+from app.config import settings
+from app.database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+LOOP_LAG_INTERVAL = 0.5  # seconds between event loop lag samples
+
+_registry: list = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}  # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket", _labels(self.labelnames, labels, le), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), round(total, 6)
+            yield f"{self.name}_count", _labels(self.labelnames, labels), cumulative
+
+
+class Gauge:
+    """A value read at scrape time: ``collect()`` returns ``{label values: value}``."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], collect):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._collect = collect
+        _registry.append(self)
+
+    def samples(self):
+        try:
+            values = self._collect()
+        except Exception:
+            logger.exception("Collecting gauge %s failed", self.name)
+            return
+        for labels, value in values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+# ── Hot-path metrics (updated by the modules that own the work) ─────────
+
+REQUEST_SECONDS = Histogram(
+    "herald_request_duration_seconds", "Latency of /send and /send_batch requests.", ("path", "status")
+)
+SEND_SECONDS = Histogram(
+    "herald_channel_send_duration_seconds", "Latency of single send attempts.", ("channel", "type")
+)
+SEND_ATTEMPTS = Counter(
+    "herald_channel_send_attempts_total", "Send attempts by outcome.", ("channel", "type", "outcome")
+)
+DELIVERIES = Counter(
+    "herald_deliveries_total", "Messages delivered to a channel, by final status.", ("channel", "type", "status")
+)
+RETRIES = Counter("herald_send_retries_total", "Retries after failed send attempts.", ("channel", "type"))
+DB_QUERY_SECONDS = Histogram(
+    "herald_db_query_duration_seconds", "Duration of SQL statements.", buckets=DB_BUCKETS
+)
+DB_COMMIT_SECONDS = Histogram(
+    "herald_db_commit_duration_seconds", "Duration of session commits (flush included).", buckets=DB_BUCKETS
+)
+LOOP_LAG_SECONDS = Histogram(
+    "herald_event_loop_lag_seconds", "How late the event loop woke a periodic timer.", buckets=DB_BUCKETS
+)
+
+
+# ── Scrape-time gauges ───────────────────────────────────
+
+def _db_pool() -> dict:
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {("checked_out",): pool.checkedout(), ("idle",): pool.checkedin()}
+
+
+def _http_pool() -> dict:
+    stats = http_client.pool_stats()
+    return {("active",): stats["active"], ("idle",): stats["idle"]}
+
+
+def _smtp_pool() -> dict:
+    stats = smtp_pool.pool_stats()
+    return {("in_use",): stats["in_use"], ("idle",): stats["idle"]} if stats else {}
+
+
+def _queues() -> dict:
+    from app import delivery  # imports services, which imports this module
+    return {("delivery",): delivery.queue_size(), ("log_sink",): log_sink.stats()["queue_depth"]}
+
+
+def _breakers() -> dict:
+    return {(name, s["state"]): 1 for name, s in breaker.states().items() if s["state"] != breaker.CLOSED}
+
+
+_loop_lag = {"last": 0.0}
+
+Gauge("herald_db_pool_connections", "Database pool connections by state.", ("state",), _db_pool)
+Gauge("herald_http_pool_connections", "Outbound HTTP pool connections by state.", ("state",), _http_pool)
+Gauge("herald_smtp_pool_sessions", "SMTP pool sessions by state.", ("state",), _smtp_pool)
+Gauge("herald_queue_depth", "Items waiting in in-process queues.", ("queue",), _queues)
+Gauge("herald_breaker_open", "Channels whose circuit breaker is not closed.", ("channel", "state"), _breakers)
+Gauge("herald_event_loop_lag_last_seconds", "Most recent event loop lag sample.", (),
+      lambda: {(): round(_loop_lag["last"], 6)})
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# ── Instrumentation hooks ────────────────────────────────
+
+class RequestTimer:
+    """ASGI middleware timing requests to ``paths``; other requests pass straight through."""
+
+    def __init__(self, app, paths: tuple[str, ...] = ("/send", "/send_batch")):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope["path"], str(status))
+
+
+def instrument_database(engine, session_factory) -> None:
+    """Time every SQL statement on ``engine`` and every commit of ``session_factory`` sessions."""
+
+    # The start time lives on the statement's execution context, which is discarded
+    # with it, so statements that fail (never reaching after_cursor_execute) leave
+    # nothing behind on the pooled connection.
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._herald_t0 = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_herald_t0", None)
+        if started is not None:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started)
+
+    @event.listens_for(session_factory, "before_commit")
+    def _before_commit(session):
+        session.info["metrics_commit_started"] = time.perf_counter()
+
+    @event.listens_for(session_factory, "after_commit")
+    def _after_commit(session):
+        started = session.info.pop("metrics_commit_started", None)
+        if started is not None:
+            DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+
+_task: asyncio.Task | None = None
+_instrumented = False
+
+
+async def _watch_loop() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        _loop_lag["last"] = lag
+        LOOP_LAG_SECONDS.observe(lag)
+
+
+async def start():
+    """Install the DB hooks and start sampling event loop lag (if metrics are enabled)."""
+    global _task, _instrumented
+    if not settings.METRICS_ENABLED:
+        return
+    if not settings.METRICS_TOKEN:
+        logger.warning("/metrics is enabled without METRICS_TOKEN: anyone who can reach it sees channel and key names")
+    if not _instrumented:
+        instrument_database(engine, SessionLocal)
+        _instrumented = True
+    _task = asyncio.create_task(_watch_loop(), name="herald-loop-lag")
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,31 @@
+"""Create or upgrade the database schema, then exit.
+
+Runs the same steps as startup with ``AUTO_MIGRATE`` on. Applied versions are recorded
+in ``schema_migrations``, so on an up-to-date database this is one query. With several
+workers or instances sharing one database, run it once before starting them (and set
+``AUTO_MIGRATE=false``) so they don't race to alter the same tables::
+
+    python -m app.migrate
+"""
+
+import logging
+
+from app import retention
+from app.database import SessionLocal, init_db
+from app.stats import ensure_built as ensure_stats_built
+
+logger = logging.getLogger(__name__)
+
+
+def run() -> None:
+    if init_db():
+        # Upgraded from an older release: backfill the stats rollup if it predates it
+        with SessionLocal() as db:
+            ensure_stats_built(db)
+    retention.enable_incremental_vacuum()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
+    logger.info("Database schema is up to date")
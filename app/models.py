@@ -1,7 +1,7 @@
 """SQLAlchemy ORM models."""
 
 import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, Index, UniqueConstraint
 
 from app.database import Base
 
@@ -24,6 +24,8 @@ class APIKey(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False)
     key = Column(String(64), unique=True, index=True, nullable=False)
+    async_delivery = Column(Boolean, default=False)  # Queue /send and reply 202 by default
+    rate_limit = Column(Integer, nullable=True)  # messages per minute; NULL = default, 0 = unlimited
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 
@@ -33,9 +35,64 @@ class MessageLog(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(500), nullable=False)
     body = Column(Text, default="")
-    status = Column(String(20), index=True, default="pending")  # pending | success | failed
+    status = Column(String(20), index=True, default="pending")  # pending | success | failed | suppressed
     channel_name = Column(String(100), index=True, default="")
     error_msg = Column(Text, default="")
     retry_count = Column(Integer, default=0)
+    attempt_ms = Column(Text, default="")  # comma-separated latency of each send attempt
+    timings = Column(Text, default="")  # JSON: ms per delivery stage (pacing, queue, send, http, ...)
+    trace_id = Column(String(64), index=True, default="")  # X-Request-ID of the request that sent it
     api_key_name = Column(String(100), index=True, default="")
     created_at = Column(DateTime, index=True, default=datetime.datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)  # async queue: when a worker took the pending row
+
+    # Composite indexes backing keyset pagination on (created_at, id) per filter
+    __table_args__ = (
+        Index("ix_message_logs_created_at_id", "created_at", "id"),
+        Index("ix_message_logs_status_created_at", "status", "created_at", "id"),
+        Index("ix_message_logs_channel_created_at", "channel_name", "created_at", "id"),
+        Index("ix_message_logs_api_key_created_at", "api_key_name", "created_at", "id"),
+    )
+
+
+class MessageStat(Base):
+    """Hourly rollup of final message outcomes, maintained as logs are written."""
+    __tablename__ = "message_stats"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bucket = Column(DateTime, nullable=False)  # UTC hour start
+    channel_name = Column(String(100), nullable=False, default="")
+    api_key_name = Column(String(100), nullable=False, default="")
+    status = Column(String(20), nullable=False)  # success | failed
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "channel_name", "api_key_name", "status", name="uq_message_stats_bucket"),
+    )
+
+
+class RateLimitState(Base):
+    """GCRA state per rate-limited key, shared by all workers (``RATE_LIMIT_BACKEND=database``)."""
+    __tablename__ = "rate_limits"
+
+    key = Column(String(100), primary_key=True)
+    tat = Column(Float, nullable=False)  # theoretical arrival time of the next request (unix time)
+
+
+class AppState(Base):
+    """Named counters and leases shared by all worker processes."""
+    __tablename__ = "app_state"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)  # bumped when cached state changes
+    holder = Column(String(100), nullable=True)  # worker holding the lease
+    lease_until = Column(DateTime, nullable=True)
+
+
+class SchemaMigration(Base):
+    """Schema versions applied to this database (see ``app.database.MIGRATIONS``)."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -0,0 +1,122 @@
+"""Outbound pacing — token buckets that delay channel sends instead of failing them.
+
+Each send first takes a token from its channel's bucket and from its channel type's
+bucket (rates from ``PACING_CHANNEL_RATES`` / ``PACING_TYPE_RATES``, in messages per
+second). When a bucket is empty the send waits until its turn; waiting happens before
+the dispatch concurrency slot is taken, so paced sends don't hold slots.
+
+When a provider answers with an explicit back-off (Telegram ``retry_after``, HTTP
+``Retry-After``), the handler raises :class:`~app.channels.RetryAfter` and the channel
+is paused for that long, so queued and retried sends wait for the provider too.
+"""
+
+import asyncio
+import time
+
+from app.config import settings
+
+MAX_DEFER = 300  # seconds; upper bound for a provider-requested pause
+
+_channel_buckets: dict[str, "TokenBucket | None"] = {}
+_type_buckets: dict[str, "TokenBucket | None"] = {}
+_paused_until: dict[str, float] = {}  # channel name -> monotonic time
+_stats = {"paced": 0, "waiting": 0, "delay_seconds_total": 0.0, "max_delay_seconds": 0.0, "deferrals": 0}
+
+
+class TokenBucket:
+    """A token bucket refilled at ``rate`` tokens/second, holding at most ``burst``.
+
+    Tokens are reserved rather than awaited: a caller takes its token immediately (the
+    balance may go negative) and is told how long to wait, so waiters are served in
+    arrival order without a lock.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waiting = 0
+
+    def reserve(self) -> float:
+        """Take one token and return the seconds to wait before using it."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def refund(self) -> None:
+        """Give back a reserved token that was never used (its send was cancelled)."""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def snapshot(self) -> dict:
+        return {"rate": self.rate, "burst": self.burst, "waiting": self.waiting}
+
+
+def _new_bucket(rate: float | None) -> TokenBucket | None:
+    if not rate or rate <= 0:
+        return None
+    return TokenBucket(rate, burst=max(1.0, rate))
+
+
+def _channel_bucket(channel: str, type_name: str) -> TokenBucket | None:
+    if channel not in _channel_buckets:
+        rates = settings.PACING_CHANNEL_RATES
+        _channel_buckets[channel] = _new_bucket(rates.get(channel, rates.get(type_name)))
+    return _channel_buckets[channel]
+
+
+def _type_bucket(type_name: str) -> TokenBucket | None:
+    if type_name not in _type_buckets:
+        _type_buckets[type_name] = _new_bucket(settings.PACING_TYPE_RATES.get(type_name))
+    return _type_buckets[type_name]
+
+
+async def wait(channel: str, type_name: str) -> None:
+    """Wait until ``channel`` may send, according to its channel and type buckets."""
+    buckets = [b for b in (_channel_bucket(channel, type_name), _type_bucket(type_name)) if b]
+    delay = _paused_until.get(channel, 0.0) - time.monotonic()
+    if buckets:
+        delay = max(delay, *(b.reserve() for b in buckets))
+    if delay <= 0:
+        return
+    _stats["paced"] += 1
+    _stats["delay_seconds_total"] += delay
+    _stats["max_delay_seconds"] = max(_stats["max_delay_seconds"], delay)
+    _stats["waiting"] += 1
+    for b in buckets:
+        b.waiting += 1
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        # e.g. the delivery deadline ran out while waiting: later sends shouldn't wait
+        # for this send's tokens
+        for b in buckets:
+            b.refund()
+        raise
+    finally:
+        _stats["waiting"] -= 1
+        for b in buckets:
+            b.waiting -= 1
+
+
+def defer(channel: str, seconds: float) -> None:
+    """Pause ``channel`` for a provider-requested ``seconds`` (capped at ``MAX_DEFER``)."""
+    until = time.monotonic() + min(max(seconds, 0.0), MAX_DEFER)
+    _paused_until[channel] = max(_paused_until.get(channel, 0.0), until)
+    _stats["deferrals"] += 1
+
+
+def stats() -> dict:
+    """Pacing counters plus the current queue depth (sends waiting) per bucket."""
+    buckets = {f"channel:{name}": b.snapshot() for name, b in _channel_buckets.items() if b}
+    buckets.update({f"type:{name}": b.snapshot() for name, b in _type_buckets.items() if b})
+    now = time.monotonic()
+    return {
+        **_stats,
+        "delay_seconds_total": round(_stats["delay_seconds_total"], 3),
+        "max_delay_seconds": round(_stats["max_delay_seconds"], 3),
+        "paused": {name: round(until - now, 3) for name, until in _paused_until.items() if until > now},
+        "buckets": buckets,
+    }
@@ -0,0 +1,188 @@
+"""Opt-in profiling for diagnosing a live process (``PROFILING_ENABLED``).
+
+* :class:`Sampler` — a wall-clock sampling profiler. A daemon thread reads every
+  thread's stack with :func:`sys._current_frames` every ``PROFILE_SAMPLE_INTERVAL``
+  seconds and counts identical stacks. The result is in the collapsed-stack format
+  (``thread;outer;...;inner count`` per line) that ``flamegraph.pl``, speedscope and
+  inferno read. The event loop thread shows the coroutine that is running, so await
+  points spent waiting don't appear; ``herald-*`` helper threads show their own stacks.
+* :func:`top_allocations` — the biggest allocation sites per :mod:`tracemalloc`, which
+  must be started first (it slows every allocation while on).
+* :class:`SlowRequestLog` — ASGI middleware logging ``/send`` and ``/send_batch``
+  requests slower than ``SLOW_REQUEST_SECONDS``, with their stage timings.
+
+Nothing here runs unless asked to: the sampler and tracemalloc only run between the
+admin API's start and stop calls, and the middleware is only installed when the
+threshold is set.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from app import tracing
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Samples all thread stacks until stopped or ``seconds`` have passed."""
+
+    def __init__(self, seconds: float, interval: float):
+        self.seconds, self.interval = seconds, interval
+        self.samples = 0
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stacks: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="herald-profiler", daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(labels))  # readers split the count off at the last space
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+        self.stopped_at = time.time()
+
+    def collapsed(self) -> str:
+        """The samples in collapsed-stack format, heaviest stacks first."""
+        ranked = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in ranked)
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "seconds": self.seconds,
+            "interval": self.interval,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at or None,
+        }
+
+
+_sampler: Sampler | None = None
+_lock = threading.Lock()
+
+
+def start_sampler(seconds: float) -> Sampler:
+    """Start a profile of up to ``seconds``; raises ``RuntimeError`` if one is running."""
+    global _sampler
+    with _lock:
+        if _sampler is not None and _sampler.running:
+            raise RuntimeError("profiler already running")
+        _sampler = Sampler(seconds, settings.PROFILE_SAMPLE_INTERVAL)
+        _sampler.start()
+        return _sampler
+
+
+def stop_sampler() -> Sampler | None:
+    """Stop the current profile (if still running) and return it, or None if there is none."""
+    with _lock:
+        if _sampler is not None and _sampler.running:
+            _sampler.stop()
+        return _sampler
+
+
+def sampler_status() -> dict | None:
+    return _sampler.status() if _sampler is not None else None
+
+
+# ── Allocations ──────────────────────────────────────────
+
+def start_tracemalloc(frames: int = 1) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracemalloc() -> None:
+    tracemalloc.stop()
+
+
+def top_allocations(limit: int = 20, group_by: str = "lineno") -> dict | None:
+    """The ``limit`` largest allocation sites still alive, or None if tracemalloc is off."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    sites = []
+    for stat in snapshot.statistics(group_by)[:limit]:
+        frame = stat.traceback[0]
+        sites.append({"file": frame.filename, "line": frame.lineno, "size": stat.size, "count": stat.count})
+    return {"traced_bytes": current, "peak_bytes": peak, "sites": sites}
+
+
+# ── Slow requests ────────────────────────────────────────
+
+class SlowRequestLog:
+    """ASGI middleware logging requests to ``paths`` that take longer than ``threshold`` seconds.
+
+    Install it inside :class:`~app.tracing.TraceMiddleware` so the log line can carry
+    the request ID and stage timings.
+    """
+
+    def __init__(self, app, threshold: float, paths: tuple[str, ...] = ("/send", "/send_batch")):
+        self.app = app
+        self.threshold = threshold
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold:
+                logger.warning(
+                    "Slow request %s %s: %d in %.0f ms (request %s; %s)",
+                    scope["method"], scope["path"], status, elapsed * 1000,
+                    tracing.current_id() or "-", tracing.stages() or "no stages",
+                )
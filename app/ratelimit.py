@@ -0,0 +1,160 @@
+"""Per-API-key rate limiting for ``/send`` with GCRA (generic cell rate algorithm).
+
+Each key's quota is ``APIKey.rate_limit`` messages per minute (``RATE_LIMIT_PER_MINUTE``
+when unset, ``0`` for unlimited) with a burst of ``RATE_LIMIT_BURST`` messages. A
+``/send`` costs one, a ``/send_batch`` one per message. GCRA keeps a single number per
+key — the theoretical arrival time (TAT) of the next request — so a check is one
+read-modify-write:
+
+    new_tat = max(tat, now) + interval * cost        # interval = 60 / quota
+    allow if new_tat - now <= interval * burst, and store new_tat
+
+The backends only see the TAT increment, so weighted requests need nothing from them.
+
+The TAT lives in a backend selected by ``RATE_LIMIT_BACKEND``:
+
+* ``memory``   — a dict in this process (single worker, or a local stand-in)
+* ``database`` — the ``rate_limits`` table, updated with one atomic upsert, so every
+  worker sharing the database shares the limit
+* ``redis``    — any Redis-compatible server at ``RATE_LIMIT_REDIS_URL``, updated by a
+  Lua script (needs the optional ``redis`` package)
+"""
+
+import math
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import engine, run_db
+from app.models import RateLimitState
+
+_backend = None
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._tats: dict[str, float] = {}
+
+    async def hit(self, key: str, now: float, interval: float, tolerance: float) -> float:
+        new_tat = max(self._tats.get(key, now), now) + interval
+        if new_tat - now > tolerance:
+            return new_tat - now - tolerance
+        self._tats[key] = new_tat
+        return 0.0
+
+    async def close(self) -> None:
+        pass
+
+
+class DatabaseBackend:
+    def __init__(self):
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            self._greatest = func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            self._greatest = func.max  # SQLite's two-argument max() is scalar
+        self._insert = insert
+
+    def _hit(self, db: Session, key: str, now: float, interval: float, tolerance: float) -> float:
+        table = RateLimitState.__table__
+        new_tat = self._greatest(table.c.tat, now) + interval
+        stmt = (
+            self._insert(table)
+            .values(key=key, tat=now + interval)
+            .on_conflict_do_update(
+                index_elements=[table.c.key],
+                set_={"tat": new_tat},
+                where=new_tat - now <= tolerance,
+            )
+            .returning(table.c.tat)
+        )
+        allowed = db.execute(stmt).first() is not None
+        db.commit()
+        if allowed:
+            return 0.0
+        tat = db.execute(select(table.c.tat).where(table.c.key == key)).scalar() or now
+        return max(tat, now) + interval - now - tolerance
+
+    async def hit(self, key: str, now: float, interval: float, tolerance: float) -> float:
+        return await run_db(self._hit, key, now, interval, tolerance)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    _SCRIPT = """
+local now, interval, tolerance = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+local new_tat = math.max(tat, now) + interval
+if new_tat - now > tolerance then
+    return tostring(new_tat - now - tolerance)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package (pip install redis)")
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+
+    async def hit(self, key: str, now: float, interval: float, tolerance: float) -> float:
+        result = await self._script(keys=[f"herald:ratelimit:{key}"], args=[now, interval, tolerance])
+        return float(result)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def _make_backend():
+    kind = settings.RATE_LIMIT_BACKEND
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "database":
+        return DatabaseBackend()
+    if kind == "redis":
+        return RedisBackend(settings.RATE_LIMIT_REDIS_URL)
+    raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND: {kind}")
+
+
+def quota(key_limit: int | None) -> int:
+    """Requests per minute for a key: its own limit, else the default. 0 = unlimited."""
+    return settings.RATE_LIMIT_PER_MINUTE if key_limit is None else key_limit
+
+
+def burst(key_limit: int | None) -> int:
+    """Messages a key may send back-to-back: ``RATE_LIMIT_BURST``, else its per-minute quota."""
+    return settings.RATE_LIMIT_BURST or quota(key_limit)
+
+
+async def check(key_id: int, key_limit: int | None, cost: int = 1) -> float:
+    """Count ``cost`` messages for API key ``key_id``. Returns 0 if allowed, else seconds to wait.
+
+    Returns ``math.inf`` if ``cost`` exceeds the key's burst: that request can never pass.
+    """
+    global _backend
+    per_minute = quota(key_limit)
+    if per_minute <= 0:
+        return 0.0
+    if cost > burst(key_limit):
+        return math.inf
+    if _backend is None:
+        _backend = _make_backend()
+    interval = 60.0 / per_minute
+    tolerance = interval * burst(key_limit) + 1e-6  # absorb float error at exactly ``burst`` messages
+    return await _backend.hit(f"key:{key_id}", time.time(), interval * cost, tolerance)
+
+
+async def stop() -> None:
+    """Close the backend connection, if any."""
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
@@ -0,0 +1,167 @@
+"""Message log retention: age/row-count pruning in small batches, with optional archival.
+
+A background task runs :func:`prune` every ``LOG_PRUNE_INTERVAL`` seconds when a policy
+is configured (``LOG_RETENTION_DAYS`` and/or ``LOG_RETENTION_MAX_ROWS``). Rows are
+deleted oldest first, ``LOG_PRUNE_BATCH_SIZE`` at a time, each batch in its own short
+transaction so ``/send`` writes are never blocked for long. ``pending`` rows (the async
+delivery queue) are never pruned. With ``LOG_ARCHIVE_DIR`` set, each batch is appended
+to a gzip-compressed JSONL file before it is deleted. On SQLite, freed pages are
+returned to the OS with incremental VACUUM; switching the database to that mode takes
+one full VACUUM, which :mod:`app.migrate` runs before the workers start. With several
+worker processes, only the one holding the ``retention`` lease prunes.
+"""
+
+import asyncio
+import datetime
+import gzip
+import json
+import logging
+import os
+import time
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app import coordination
+from app.config import settings
+from app.database import engine, run_db
+from app.log_query import invalidate_counts, log_to_dict
+from app.models import MessageLog
+
+logger = logging.getLogger(__name__)
+
+BATCH_PAUSE = 0.05  # seconds between batches, lets queued writers take the lock
+VACUUM_STEP_PAGES = 1000
+
+_task: asyncio.Task | None = None
+
+
+def policy_enabled() -> bool:
+    return settings.LOG_RETENTION_DAYS > 0 or settings.LOG_RETENTION_MAX_ROWS > 0
+
+
+def _is_sqlite() -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def _archive(path: str, rows: list[MessageLog]) -> None:
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for log in rows:
+            f.write(json.dumps(log_to_dict(log), ensure_ascii=False) + "\n")
+
+
+def _delete_batches(db: Session, query, limit: int | None, archive_path: str | None) -> int:
+    """Delete rows matched by ``query`` oldest first, batch by batch, up to ``limit`` rows.
+
+    ``query`` selects whole rows when archiving, otherwise just ``MessageLog.id``.
+    """
+    deleted = 0
+    while limit is None or deleted < limit:
+        size = settings.LOG_PRUNE_BATCH_SIZE
+        if limit is not None:
+            size = min(size, limit - deleted)
+        batch = query.order_by(MessageLog.created_at, MessageLog.id).limit(size).all()
+        if not batch:
+            break
+        if archive_path:
+            _archive(archive_path, batch)
+        db.query(MessageLog).filter(
+            MessageLog.id.in_([row.id for row in batch])
+        ).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(batch)
+        if len(batch) < size:
+            break
+        time.sleep(BATCH_PAUSE)
+    return deleted
+
+
+def _incremental_vacuum(db: Session) -> None:
+    if not _is_sqlite():
+        return
+    if db.execute(text("PRAGMA auto_vacuum")).scalar() != 2:  # 2 = INCREMENTAL
+        return
+    while db.execute(text("PRAGMA freelist_count")).scalar():
+        db.execute(text(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})"))
+        db.commit()
+        time.sleep(BATCH_PAUSE)
+
+
+def prune(db: Session) -> dict:
+    """Apply the retention policy once. Returns the number of rows deleted per rule."""
+    result = {"expired": 0, "over_limit": 0}
+    if not policy_enabled():
+        return result
+
+    archive_path = None
+    if settings.LOG_ARCHIVE_DIR:
+        os.makedirs(settings.LOG_ARCHIVE_DIR, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        archive_path = os.path.join(settings.LOG_ARCHIVE_DIR, f"message_logs-{stamp}.jsonl.gz")
+
+    # Titles and bodies are only needed for the archive
+    prunable = db.query(MessageLog if archive_path else MessageLog.id).filter(MessageLog.status != "pending")
+    if settings.LOG_RETENTION_DAYS > 0:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=settings.LOG_RETENTION_DAYS)
+        result["expired"] = _delete_batches(
+            db, prunable.filter(MessageLog.created_at < cutoff), None, archive_path
+        )
+    if settings.LOG_RETENTION_MAX_ROWS > 0:
+        excess = (db.query(func.count(MessageLog.id)).scalar() or 0) - settings.LOG_RETENTION_MAX_ROWS
+        if excess > 0:
+            result["over_limit"] = _delete_batches(db, prunable, excess, archive_path)
+
+    if result["expired"] or result["over_limit"]:
+        invalidate_counts()
+        _incremental_vacuum(db)
+        logger.info("Pruned message logs: %s", result)
+    return result
+
+
+def enable_incremental_vacuum() -> None:
+    """Switch an SQLite database with a retention policy to auto_vacuum=INCREMENTAL.
+
+    The switch takes one full VACUUM, which blocks writers while it runs; afterwards
+    this is a single PRAGMA read. Called by :mod:`app.migrate`.
+    """
+    if not policy_enabled() or not _is_sqlite():
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            return
+        logger.info("Enabling incremental auto-vacuum (one-time VACUUM, may take a while)")
+        # The new mode only takes effect through a VACUUM on the same connection
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+
+def _prune_if_leader(db: Session) -> dict | None:
+    # The lease outlives one interval, so the holder keeps it while it is alive
+    if not coordination.try_lease(db, "retention", settings.LOG_PRUNE_INTERVAL * 1.5):
+        return None
+    return prune(db)
+
+
+async def _run():
+    while True:
+        try:
+            await run_db(_prune_if_leader)
+        except Exception:
+            logger.exception("Message log pruning failed")
+        await asyncio.sleep(settings.LOG_PRUNE_INTERVAL)
+
+
+async def start():
+    """Start background pruning if a retention policy is configured."""
+    global _task
+    if not policy_enabled():
+        return
+    _task = asyncio.create_task(_run(), name="herald-retention")
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,117 @@
+"""Retry policy — which failures to retry, how long to back off, and when to give up.
+
+Defaults come from ``RETRY_*`` settings; a channel can override them with the optional
+``max_retries`` / ``retry_base_delay`` / ``retry_deadline`` keys in its config. The
+deadline must end before ``DELIVERY_CLAIM_TIMEOUT``, or another process could claim a
+queued message that is still being retried and send it again. Backoff
+uses full jitter (a random delay up to the exponential cap) so retries from many
+messages and workers don't fire in lockstep.
+"""
+
+import random
+import sys
+from dataclasses import dataclass
+
+from app.config import settings
+
+CLAIM_MARGIN = 10  # seconds between the latest deadline and the claim timeout, for saving the outcome
+
+# Optional per-channel overrides, appended to every channel type's config form
+CONFIG_SCHEMA = [
+    {"key": "max_retries", "label": "最大重试次数", "type": "text", "required": False,
+     "placeholder": "留空使用全局设置"},
+    {"key": "retry_base_delay", "label": "重试基础间隔（秒）", "type": "text", "required": False,
+     "placeholder": "留空使用全局设置"},
+    {"key": "retry_deadline", "label": "投递截止时间（秒）", "type": "text", "required": False,
+     "placeholder": "单条消息含重试的总时长上限，留空使用全局设置"},
+]
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_retries: int
+    base_delay: float
+    max_delay: float
+    deadline: float  # seconds for all attempts of one message, including backoff
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number ``attempt + 1``."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def _override(config: dict, key: str, cast, label: str, minimum: float):
+    value = config.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{label}必须是数字")
+    if value < minimum:
+        raise ValueError(f"{label}不能小于 {minimum}")
+    return value
+
+
+def max_deadline() -> float:
+    """The longest per-channel ``retry_deadline`` that still ends before a queued claim expires."""
+    return max(1.0, settings.DELIVERY_CLAIM_TIMEOUT - CLAIM_MARGIN)
+
+
+def validate_overrides(config: dict) -> None:
+    """Check a channel config's retry overrides before saving it. Raises ValueError."""
+    policy_for(config)
+    deadline = _override(config, "retry_deadline", float, "投递截止时间", 1)
+    limit = max_deadline()
+    if deadline is not None and deadline > limit:
+        raise ValueError(f"投递截止时间不能大于 {limit:g} 秒（需小于 DELIVERY_CLAIM_TIMEOUT）")
+
+
+def policy_for(config: dict) -> RetryPolicy:
+    """The default policy with this channel config's overrides applied. Raises ValueError.
+
+    A ``retry_deadline`` above :func:`max_deadline` (saved before the limit existed) is capped.
+    """
+    max_retries = _override(config, "max_retries", int, "最大重试次数", 0)
+    base_delay = _override(config, "retry_base_delay", float, "重试基础间隔", 0)
+    deadline = _override(config, "retry_deadline", float, "投递截止时间", 1)
+    return RetryPolicy(
+        max_retries=settings.RETRY_MAX if max_retries is None else max_retries,
+        base_delay=settings.RETRY_BASE_DELAY if base_delay is None else base_delay,
+        max_delay=settings.RETRY_MAX_DELAY,
+        deadline=settings.RETRY_DEADLINE if deadline is None else min(deadline, max_deadline()),
+    )
+
+
+def retryable_status(status_code: int) -> bool:
+    """Timeouts, rate limits and server errors may pass on retry; other 4xx won't."""
+    return status_code in (408, 425, 429) or status_code >= 500
+
+
+def retryable(error: Exception) -> bool:
+    """Classify a send failure as transient (worth retrying) or permanent.
+
+    Library exception types are looked up in ``sys.modules`` rather than imported: an
+    error can only come from httpx, smtplib or jinja2 if a handler already loaded it,
+    and importing them here would defeat lazy handler loading.
+    """
+    retryable_flag = getattr(error, "retryable", None)  # channels.DeliveryError
+    if retryable_flag is not None:
+        return retryable_flag
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        if isinstance(error, httpx.HTTPStatusError):
+            return retryable_status(error.response.status_code)
+        if isinstance(error, httpx.TransportError):  # connect/read timeouts, refused, reset
+            return True
+    smtplib = sys.modules.get("smtplib")
+    if smtplib is not None:
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return any(400 <= code < 500 for code, _ in error.recipients.values())
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 400 <= error.smtp_code < 500  # 4xx transient, 5xx permanent
+    jinja2 = sys.modules.get("jinja2")
+    if isinstance(error, (ValueError, TypeError, KeyError)) or (
+        jinja2 is not None and isinstance(error, jinja2.TemplateError)
+    ):
+        return False  # bad config or template: the same input fails the same way
+    return True  # timeouts, dropped connections and anything unknown
@@ -1,7 +1,7 @@
 """Pydantic request/response schemas."""
 
 from typing import Any, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # --- Unified Response ---
@@ -46,6 +46,15 @@ class TestChannelRequest(BaseModel):
 # --- API Key ---
 class CreateKeyRequest(BaseModel):
     name: str
+    async_delivery: bool = False
+    rate_limit: Optional[int] = Field(None, ge=0)  # per minute; None = default, 0 = unlimited
+
+
+class UpdateKeyRequest(BaseModel):
+    id: int
+    name: str
+    async_delivery: bool = False
+    rate_limit: Optional[int] = Field(None, ge=0)
 
 
 class DeleteKeyRequest(BaseModel):
@@ -55,3 +64,7 @@ class DeleteKeyRequest(BaseModel):
 # --- Log ---
 class RetryMsgRequest(BaseModel):
     log_id: int
+
+
+class StartProfileRequest(BaseModel):
+    seconds: float = Field(30, gt=0)
@@ -3,59 +3,218 @@
 import asyncio
 import json
 import logging
+import time
+from contextlib import asynccontextmanager
 
 from sqlalchemy.orm import Session
 
+from app.config import settings
+from app.database import run_db
+from app import breaker, log_sink, metrics, pacing, stats, tracing
+from app.cache import CachedChannel
 from app.models import Channel, MessageLog
-from app.channels import get_handler
+from app.channels import RetryAfter, handler_for
+from app.retry import policy_for, retryable
 
 logger = logging.getLogger(__name__)
 
-# Retry settings
-MAX_RETRIES = 3
-RETRY_BASE_DELAY = 1  # seconds, exponential backoff: 1s, 2s, 4s
+# Concurrency limits, created lazily so they bind to the running event loop
+_global_limit: asyncio.Semaphore | None = None
+_type_limits: dict[str, asyncio.Semaphore] = {}
+
+
+@asynccontextmanager
+async def _send_slot(type_name: str):
+    """Hold one global and (if configured) one per-type concurrency slot.
+
+    Time spent waiting for the slots is traced as the ``queue`` stage.
+    """
+    global _global_limit
+    if _global_limit is None:
+        _global_limit = asyncio.Semaphore(max(1, settings.DISPATCH_CONCURRENCY))
+    type_limit = _type_limits.get(type_name)
+    if type_limit is None and type_name in settings.DISPATCH_CONCURRENCY_PER_TYPE:
+        type_limit = asyncio.Semaphore(max(1, settings.DISPATCH_CONCURRENCY_PER_TYPE[type_name]))
+        _type_limits[type_name] = type_limit
+
+    with tracing.span("queue"):
+        await _global_limit.acquire()
+        if type_limit is not None:
+            try:
+                await type_limit.acquire()
+            except BaseException:
+                _global_limit.release()
+                raise
+    try:
+        yield
+    finally:
+        if type_limit is not None:
+            type_limit.release()
+        _global_limit.release()
+
+
+async def _attempt(ch: Channel | CachedChannel, handler, log: MessageLog, latencies: list[int]) -> None:
+    """One send attempt: wait for pacing, take a slot, send. Records the send's latency."""
+    with tracing.span("pacing"):
+        await pacing.wait(ch.name, ch.type)
+    async with _send_slot(ch.type):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with tracing.span("send"):
+                await handler.send(handler.config, log.title, log.body)
+            outcome = "success"
+        finally:
+            elapsed = time.perf_counter() - started
+            latencies.append(round(elapsed * 1000))
+            metrics.SEND_SECONDS.observe(elapsed, ch.name, ch.type)
+            metrics.SEND_ATTEMPTS.inc(ch.name, ch.type, outcome)
+
+
+async def deliver(ch: Channel | CachedChannel, log: MessageLog) -> None:
+    """Send ``log``'s message to a single channel with retries, updating the log in place.
+
+    Raises :class:`~app.breaker.CircuitOpen`, leaving the log untouched, if the channel's
+    circuit doesn't admit the first attempt.
+    """
+    with tracing.collect_timings() as timings:
+        await _deliver_with_retries(ch, log)
+    log.timings = tracing.encode_timings(timings)
+
+
+async def _deliver_with_retries(ch: Channel | CachedChannel, log: MessageLog) -> None:
+    log.retry_count = 0
+    try:
+        config = json.loads(ch.config) if isinstance(ch.config, str) else ch.config
+        handler = handler_for(ch.name, ch.type, config)
+        policy = policy_for(config)
+    except Exception as e:
+        # Unknown type or a config the handler can't prepare — retrying won't help
+        log.status = "failed"
+        log.error_msg = str(e)[:1000]
+        metrics.DELIVERIES.inc(ch.name, ch.type, log.status)
+        return
+
+    # Transient failures are retried with full-jitter backoff (or the provider's
+    # Retry-After) until the policy's attempts or deadline run out; permanent ones stop
+    # at once. Pacing waits and retry sleeps happen outside the slot so a slow channel
+    # doesn't starve others.
+    deadline = time.monotonic() + policy.deadline
+    latencies: list[int] = []
+    for attempt in range(policy.max_retries + 1):
+        if not breaker.allow(ch.name):
+            if attempt == 0:
+                # Nothing was attempted: the caller decides whether to fail or defer
+                raise breaker.CircuitOpen(ch.name, breaker.blocked_for(ch.name))
+            break  # the circuit opened while retrying; keep the last real error
+        try:
+            await asyncio.wait_for(_attempt(ch, handler, log, latencies), max(0.0, deadline - time.monotonic()))
+        except Exception as e:
+            log.status = "failed"
+            if isinstance(e, TimeoutError) and time.monotonic() >= deadline:
+                log.error_msg = f"Delivery deadline of {policy.deadline:g}s exceeded"
+                break
+            log.error_msg = (str(e) or type(e).__name__)[:1000]
+            if breaker.counts(e):  # not rate limiting or a fault of this message
+                breaker.record_failure(ch.name, handler, e)
+            transient = retryable(e)
+            if not transient or attempt == policy.max_retries:
+                break
+            delay = e.retry_after if isinstance(e, RetryAfter) else policy.backoff(attempt)
+            if time.monotonic() + delay >= deadline:
+                break  # the retry couldn't finish before the deadline anyway
+            log.retry_count = attempt + 1
+            if isinstance(e, RetryAfter):
+                # Pause the whole channel; the next pacing.wait() sleeps until then
+                pacing.defer(ch.name, e.retry_after)
+                logger.warning("Channel %s rate limited — retrying in %.1fs", ch.name, delay)
+                continue
+            logger.warning(
+                "Channel %s attempt %d failed: %s — retrying in %.1fs",
+                ch.name, attempt + 1, e, delay,
+            )
+            with tracing.span("retry_wait"):
+                await asyncio.sleep(delay)
+        else:
+            log.status = "success"
+            breaker.record_success(ch.name)
+            break
+    log.attempt_ms = ",".join(str(ms) for ms in latencies)
+    metrics.DELIVERIES.inc(ch.name, ch.type, log.status)
+    if log.retry_count:
+        metrics.RETRIES.inc(ch.name, ch.type, amount=log.retry_count)
+
+
+async def _deliver(ch: Channel | CachedChannel, title: str, body: str, api_key_name: str) -> MessageLog:
+    """Send to a single channel and return its (unsaved) log entry."""
+    log = MessageLog(
+        title=title,
+        body=body,
+        channel_name=ch.name,
+        api_key_name=api_key_name,
+        status="pending",
+        retry_count=0,
+        trace_id=tracing.current_id(),
+    )
+    with tracing.span("deliver", channel=ch.name, type=ch.type):
+        try:
+            await deliver(ch, log)
+        except breaker.CircuitOpen as e:
+            # Fail fast while the channel's circuit is open
+            log.status = "failed"
+            log.error_msg = str(e)
+            metrics.DELIVERIES.inc(ch.name, ch.type, log.status)
+    return log
+
+
+def save_logs(db: Session, logs: list[MessageLog]) -> None:
+    """Insert (or update detached) message logs and their stats in a single transaction."""
+    db.add_all(logs)
+    db.flush()  # apply column defaults (created_at) before bucketing
+    stats.record_logs(db, logs)
+    db.commit()
+
+
+async def record_logs(logs: list[MessageLog]) -> None:
+    """Persist finished logs through the write-behind sink if enabled, else in one transaction."""
+    if log_sink.enabled():
+        await log_sink.submit(logs)
+    else:
+        await run_db(save_logs, logs)
 
 
 async def dispatch_message(
-    db: Session,
     title: str,
     body: str,
-    channels: list[Channel],
+    channels: list[Channel | CachedChannel],
     api_key_name: str = "",
 ) -> list[MessageLog]:
-    """Send a message to each channel and record the results."""
-    logs = []
-    for ch in channels:
-        log = MessageLog(
-            title=title,
-            body=body,
-            channel_name=ch.name,
-            api_key_name=api_key_name,
-            status="pending",
-            retry_count=0,
-        )
-        config = json.loads(ch.config) if isinstance(ch.config, str) else ch.config
-        handler = get_handler(ch.type)
+    """Send a message to all channels concurrently and record the results.
 
-        # Attempt with automatic retries (exponential backoff)
-        for attempt in range(MAX_RETRIES + 1):
-            try:
-                await handler.send(config, title, body)
-                log.status = "success"
-                break
-            except Exception as e:
-                log.status = "failed"
-                log.error_msg = str(e)[:1000]
-                if attempt < MAX_RETRIES:
-                    log.retry_count = attempt + 1
-                    delay = RETRY_BASE_DELAY * (2 ** attempt)
-                    logger.warning(
-                        "Channel %s attempt %d failed: %s — retrying in %ds",
-                        ch.name, attempt + 1, e, delay,
-                    )
-                    await asyncio.sleep(delay)
-
-        db.add(log)
-        logs.append(log)
-    db.commit()
-    return logs
+    Each channel is delivered in its own task, so total latency is bounded by the
+    slowest channel. Logs are returned in the same order as ``channels``.
+    """
+    return (await dispatch_batch([(title, body, channels)], api_key_name))[0]
+
+
+async def dispatch_batch(
+    messages: list[tuple[str, str, list[Channel | CachedChannel]]],
+    api_key_name: str = "",
+) -> list[list[MessageLog]]:
+    """Send several ``(title, body, channels)`` messages concurrently.
+
+    Every channel send of every message runs in one ``gather`` (still bounded by the
+    dispatch slots), and all resulting logs are recorded together in one transaction.
+    Returns each message's logs in input order.
+    """
+    with tracing.span("dispatch"):
+        logs = await asyncio.gather(
+            *(_deliver(ch, title, body, api_key_name) for title, body, channels in messages for ch in channels)
+        )
+    with tracing.span("save"):
+        await record_logs(logs)
+    result, start = [], 0
+    for _, _, channels in messages:
+        result.append(logs[start:start + len(channels)])
+        start += len(channels)
+    return result
@@ -0,0 +1,221 @@
+"""Reusable SMTP session pool for the email channel.
+
+Opening an SMTP connection costs a TCP + TLS handshake and an AUTH exchange, so
+authenticated sessions are kept and reused across messages. Sessions idle longer than
+``SMTP_IDLE_TIMEOUT`` are discarded, sessions idle longer than ``SMTP_NOOP_AFTER`` are
+checked with NOOP before reuse, and a send that hits a dropped connection is retried
+once on a fresh session. Any other SMTP error except a refused recipient (e.g. a 421
+"service closing" reply) also discards the session. :meth:`SMTPPool.send` is blocking;
+async code uses :meth:`SMTPPool.send_async`, which runs it on the pool's own ``size``
+threads. Senders waiting for a session then wait in that executor's queue rather than
+holding threads of the default executor, which ``run_db`` needs for every query.
+
+Only the email handler creates the pool; :mod:`smtplib` is imported when it does.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    import smtplib
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        security: str = "ssl",
+        size: int = 2,
+        idle_timeout: float = 60,
+        noop_after: float = 10,
+        timeout: float = 15,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.security = security
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.timeout = timeout
+        self._idle: deque[tuple["smtplib.SMTP", float]] = deque()  # (session, last_used)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="herald-smtp")
+        self._in_use = 0
+        self._counters = {"sessions_opened": 0, "messages_sent": 0, "reconnects": 0}
+
+    # ── Sessions ─────────────────────────────────────────
+
+    def _connect(self) -> "smtplib.SMTP":
+        import smtplib
+
+        if self.security == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.security == "starttls":
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        self._counters["sessions_opened"] += 1
+        return server
+
+    @staticmethod
+    def _quit(server: "smtplib.SMTP") -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _is_alive(server: "smtplib.SMTP") -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> "smtplib.SMTP":
+        """Take a healthy idle session or open a new one. Caller must hold a slot."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()  # most recently used first
+            idle_for = time.monotonic() - last_used
+            if idle_for > self.idle_timeout:
+                self._quit(server)
+            elif idle_for <= self.noop_after or self._is_alive(server):
+                return server
+            else:
+                server.close()
+        return self._connect()
+
+    def _release(self, server: "smtplib.SMTP") -> None:
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    # ── Sending ──────────────────────────────────────────
+
+    def send(self, from_addr: str, to_addrs: list[str], msg: str) -> None:
+        """Send one message over a pooled session.
+
+        A dropped connection is re-established once before giving up. When only
+        recipients are refused the session goes back to the pool; after any other SMTP
+        error it is closed.
+        """
+        import smtplib
+
+        with self._slots:
+            with self._lock:
+                self._in_use += 1
+            server = None
+            try:
+                for attempt in range(2):
+                    try:
+                        server = self._acquire()
+                        server.sendmail(from_addr, to_addrs, msg)
+                        self._counters["messages_sent"] += 1
+                        return
+                    except smtplib.SMTPServerDisconnected as e:
+                        error = e
+                    except smtplib.SMTPRecipientsRefused as e:
+                        if any(code == 421 for code, _ in e.recipients.values()):
+                            server.close()  # "service closing" — the session is gone
+                            server = None
+                        raise  # otherwise the session itself is still usable
+                    except smtplib.SMTPException:
+                        # 421, a failed DATA, a failed login or a protocol error: the
+                        # session's state is unknown, so don't hand it out again
+                        if server is not None:
+                            server.close()
+                            server = None
+                        raise
+                    except OSError as e:
+                        error = e
+                    # The session is dead: drop it and retry once on a new one
+                    if server is not None:
+                        server.close()
+                        server = None
+                    if attempt == 0:
+                        self._counters["reconnects"] += 1
+                    else:
+                        raise error
+            finally:
+                if server is not None:
+                    self._release(server)
+                with self._lock:
+                    self._in_use -= 1
+
+    async def send_async(self, from_addr: str, to_addrs: list[str], msg: str) -> None:
+        """Run :meth:`send` on the pool's own threads."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.send, from_addr, to_addrs, msg)
+
+    # ── Maintenance ──────────────────────────────────────
+
+    def close_idle(self) -> None:
+        """Close every idle session."""
+        with self._lock:
+            sessions = list(self._idle)
+            self._idle.clear()
+        for server, _ in sessions:
+            self._quit(server)
+
+    def close(self) -> None:
+        """Close every idle session and stop the pool's threads."""
+        self._executor.shutdown(wait=False)
+        self.close_idle()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "idle": len(self._idle), "in_use": self._in_use, "size": self.size}
+
+
+_pool: SMTPPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SMTPPool:
+    """Return the process-wide pool built from ``settings``, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPPool(
+                host=settings.SMTP_HOST,
+                port=settings.SMTP_PORT,
+                user=settings.SMTP_USER,
+                password=settings.SMTP_PASSWORD,
+                security=settings.SMTP_SECURITY,
+                size=settings.SMTP_POOL_SIZE,
+                idle_timeout=settings.SMTP_IDLE_TIMEOUT,
+                noop_after=settings.SMTP_NOOP_AFTER,
+            )
+        return _pool
+
+
+def close_pool() -> None:
+    """Close all pooled sessions (called on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def pool_stats() -> dict:
+    return _pool.stats() if _pool is not None else {}
@@ -0,0 +1,166 @@
+"""Pre-aggregated message statistics (``message_stats``) for the dashboard and stats API.
+
+Every time logs reach a final status they are counted into hourly buckets keyed by
+channel, API key and status, in the same transaction that writes the logs. Reads then
+cost a handful of rows per hour instead of a scan over ``message_logs``. The rollup
+can be rebuilt from ``message_logs`` on demand (history already pruned is lost then).
+"""
+
+import datetime
+from collections import Counter
+from collections.abc import Iterable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import MessageLog, MessageStat
+
+REBUILD_CHUNK = 5000
+
+
+def hour_bucket(ts: datetime.datetime | None) -> datetime.datetime:
+    ts = ts or datetime.datetime.utcnow()
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _upsert(db: Session, counts: Counter) -> None:
+    dialect = db.get_bind().dialect.name
+    rows = [
+        {"bucket": b, "channel_name": ch, "api_key_name": key, "status": st, "count": n}
+        for (b, ch, key, st), n in counts.items()
+    ]
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(MessageStat)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["bucket", "channel_name", "api_key_name", "status"],
+            set_={"count": MessageStat.count + stmt.excluded["count"]},
+        )
+        db.execute(stmt, rows)
+        return
+
+    for row in rows:
+        updated = (
+            db.query(MessageStat)
+            .filter_by(bucket=row["bucket"], channel_name=row["channel_name"],
+                       api_key_name=row["api_key_name"], status=row["status"])
+            .update({MessageStat.count: MessageStat.count + row["count"]}, synchronize_session=False)
+        )
+        if not updated:
+            db.add(MessageStat(**row))
+    db.flush()  # the session doesn't autoflush: a later upsert in this transaction must see new rows
+
+
+def record(db: Session, entries: Iterable[tuple[datetime.datetime | None, str, str, str]]) -> None:
+    """Count ``(created_at, channel_name, api_key_name, status)`` entries into the rollup.
+
+    Pending entries are skipped; they are counted once they reach a final status.
+    Does not commit — call inside the transaction that writes the logs.
+    """
+    counts = Counter(
+        (hour_bucket(created_at), channel or "", key or "", status)
+        for created_at, channel, key, status in entries
+        if status and status != "pending"
+    )
+    if counts:
+        _upsert(db, counts)
+
+
+def record_logs(db: Session, logs: Iterable[MessageLog]) -> None:
+    record(db, ((l.created_at, l.channel_name, l.api_key_name, l.status) for l in logs))
+
+
+def rebuild(db: Session) -> int:
+    """Recompute the rollup from ``message_logs``. Returns the number of logs counted."""
+    db.query(MessageStat).delete()
+    counts: Counter = Counter()
+    total = 0
+    query = db.query(
+        MessageLog.created_at, MessageLog.channel_name, MessageLog.api_key_name, MessageLog.status
+    ).filter(MessageLog.status != "pending")
+    for created_at, channel, key, status in query.yield_per(REBUILD_CHUNK):
+        counts[(hour_bucket(created_at), channel or "", key or "", status)] += 1
+        total += 1
+    _upsert(db, counts)
+    db.commit()
+    return total
+
+
+def ensure_built(db: Session) -> None:
+    """Backfill the rollup once for databases created before it existed."""
+    if db.query(MessageStat.id).first() is not None:
+        return
+    if db.query(MessageLog.id).filter(MessageLog.status != "pending").first() is not None:
+        rebuild(db)
+
+
+def clear(db: Session) -> None:
+    db.query(MessageStat).delete()
+
+
+def totals_since(db: Session, since: datetime.datetime) -> dict[str, int]:
+    """Message counts per status from ``since`` (rounded down to the hour) until now.
+
+    Final statuses come from the rollup; ``pending`` rows aren't in it yet and are
+    counted from ``message_logs`` (an index range on ``(status, created_at)``).
+    """
+    start = hour_bucket(since)
+    rows = (
+        db.query(MessageStat.status, func.sum(MessageStat.count))
+        .filter(MessageStat.bucket >= start)
+        .group_by(MessageStat.status)
+        .all()
+    )
+    totals = {status: int(n or 0) for status, n in rows}
+    pending = (
+        db.query(func.count(MessageLog.id))
+        .filter(MessageLog.status == "pending", MessageLog.created_at >= start)
+        .scalar()
+    )
+    if pending:
+        totals["pending"] = pending
+    return totals
+
+
+def trends(
+    db: Session,
+    since: datetime.datetime,
+    until: datetime.datetime | None = None,
+    granularity: str = "day",
+    channel: str = "",
+    api_key: str = "",
+) -> list[dict]:
+    """Per-bucket, per-channel outcome counts and success rate, oldest bucket first."""
+    query = db.query(
+        MessageStat.bucket, MessageStat.channel_name, MessageStat.status, func.sum(MessageStat.count)
+    ).filter(MessageStat.bucket >= hour_bucket(since))
+    if until:
+        query = query.filter(MessageStat.bucket < until)
+    if channel:
+        query = query.filter(MessageStat.channel_name == channel)
+    if api_key:
+        query = query.filter(MessageStat.api_key_name == api_key)
+    query = query.group_by(MessageStat.bucket, MessageStat.channel_name, MessageStat.status)
+
+    grouped: dict[tuple[datetime.datetime, str], Counter] = {}
+    for bucket, ch, status, n in query.all():
+        if granularity == "day":
+            bucket = bucket.replace(hour=0)
+        grouped.setdefault((bucket, ch), Counter())[status] += int(n or 0)
+
+    result = []
+    for (bucket, ch), counts in sorted(grouped.items()):
+        total = counts.get("success", 0) + counts.get("failed", 0)
+        result.append({
+            "bucket": bucket.isoformat(),
+            "channel": ch,
+            "success": counts.get("success", 0),
+            "failed": counts.get("failed", 0),
+            "suppressed": counts.get("suppressed", 0),
+            "total": total,
+            "success_rate": round(counts.get("success", 0) / total, 4) if total else None,
+        })
+    return result
@@ -0,0 +1,257 @@
+"""Request tracing — a trace ID per ``/send`` and timed spans through the send pipeline.
+
+:class:`TraceMiddleware` starts a trace for ``/send`` and ``/send_batch``. It reuses the
+caller's ID from ``X-Request-ID`` or a W3C ``traceparent`` header, or generates one.
+The ID goes back in ``X-Request-ID`` and is stored on every log the request creates.
+Top-level stage timings are returned in ``Server-Timing``.
+
+Code marks stages with ``with tracing.span("name"):``. The current trace and parent
+span live in :mod:`contextvars`, so spans opened inside per-channel tasks nest under
+the span that spawned them. :func:`deliver <app.services.deliver>` also collects the
+stages of one channel delivery (pacing, queueing, the send and its render/HTTP parts,
+retry waits) into ``MessageLog.timings``. Outside a trace and a delivery, ``span`` does
+nothing.
+
+With ``TRACE_EXPORT_FILE`` set, each finished trace is appended to that file as one
+line of OTLP/JSON (the format of the OpenTelemetry Collector's file exporter). A
+background thread does the writing.
+"""
+
+import hashlib
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_ID = re.compile(r"^[\w.\-]{1,64}$")
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: list[tuple] = []  # (name, span_id, parent_id, start_ns, end_ns, attributes)
+
+
+_trace: ContextVar[Trace | None] = ContextVar("herald_trace", default=None)
+_parent: ContextVar[str] = ContextVar("herald_span", default="")
+_timings: ContextVar[dict | None] = ContextVar("herald_timings", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def incoming_id(headers: dict[str, str]) -> str | None:
+    """The caller's trace ID from ``X-Request-ID`` or ``traceparent``, if usable."""
+    request_id = headers.get("x-request-id", "").strip()
+    if request_id and _REQUEST_ID.match(request_id):
+        return request_id
+    match = _TRACEPARENT.match(headers.get("traceparent", "").strip().lower())
+    return match.group(1) if match else None
+
+
+def current_id() -> str:
+    """The active trace ID, or ``""`` outside a trace."""
+    current = _trace.get()
+    return current.trace_id if current is not None else ""
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a stage of the current trace and/or delivery (a no-op outside both)."""
+    current, timings = _trace.get(), _timings.get()
+    if current is None and timings is None:
+        yield
+        return
+    span_id, parent_id = _new_id(64), _parent.get()
+    token = _parent.set(span_id)
+    wall, started = time.time_ns(), time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter_ns() - started
+        _parent.reset(token)
+        if timings is not None:
+            timings[name] = timings.get(name, 0) + elapsed / 1e6
+        if current is not None:
+            current.spans.append((name, span_id, parent_id, wall, wall + elapsed, attributes))
+
+
+@contextmanager
+def trace(trace_id: str | None, name: str, **attributes):
+    """Run the block as a new trace with a root span; exported when the block ends."""
+    current = Trace(trace_id or _new_id(128))
+    token = _trace.set(current)
+    parent = _parent.set("")
+    try:
+        with span(name, **attributes):
+            yield current
+    finally:
+        _parent.reset(parent)
+        _trace.reset(token)
+        export(current)
+
+
+@contextmanager
+def collect_timings():
+    """Gather the durations (ms, summed per stage name) of spans inside the block."""
+    timings: dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def encode_timings(timings: dict[str, float]) -> str:
+    return json.dumps({name: round(ms, 2) for name, ms in timings.items()}, separators=(",", ":"))
+
+
+def format_timings(raw: str | None) -> str:
+    """``MessageLog.timings`` as ``"send 210.3 · http 209.8"`` for tooltips."""
+    try:
+        timings = json.loads(raw) if raw else {}
+    except ValueError:
+        return ""
+    return " · ".join(f"{name} {ms:g}" for name, ms in timings.items())
+
+
+def server_timing(current: Trace, root_id: str) -> str:
+    """``Server-Timing`` header value for the root's direct child spans."""
+    totals: dict[str, float] = {}
+    for name, _, parent_id, start, end, _ in current.spans:
+        if parent_id == root_id:
+            totals[name] = totals.get(name, 0) + (end - start) / 1e6
+    return ", ".join(f"{name};dur={ms:.2f}" for name, ms in totals.items())
+
+
+def stages() -> str:
+    """:func:`server_timing` for the active trace, called from inside its root span."""
+    current = _trace.get()
+    return server_timing(current, _parent.get()) if current is not None else ""
+
+
+# ── Middleware ───────────────────────────────────────────
+
+class TraceMiddleware:
+    """ASGI middleware tracing requests to ``paths``; other requests pass straight through."""
+
+    def __init__(self, app, paths: tuple[str, ...] = ("/send", "/send_batch")):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+
+        with trace(incoming_id(headers), f"{scope['method']} {scope['path']}") as current:
+            root_id = _parent.get()
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    extra = [(b"x-request-id", current.trace_id.encode())]
+                    timing = server_timing(current, root_id)
+                    if timing:
+                        extra.append((b"server-timing", timing.encode()))
+                    message = {**message, "headers": [*message.get("headers", []), *extra]}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+# ── OTLP/JSON file exporter ──────────────────────────────
+
+_export_queue: queue.SimpleQueue | None = None
+_writer: threading.Thread | None = None
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp(current: Trace) -> dict:
+    trace_id = current.trace_id
+    if not _TRACE_ID.match(trace_id):
+        trace_id = hashlib.md5(trace_id.encode()).hexdigest()  # OTLP needs 16 bytes of hex
+    spans = []
+    for name, span_id, parent_id, start, end, attributes in current.spans:
+        item = {
+            "traceId": trace_id,
+            "spanId": span_id,
+            "name": name,
+            "kind": 1 if parent_id else 2,  # INTERNAL; the root is the SERVER span
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(end),
+            "attributes": [_attribute(k, v) for k, v in attributes.items()],
+        }
+        if parent_id:
+            item["parentSpanId"] = parent_id
+        else:
+            item["attributes"].append(_attribute("herald.request_id", current.trace_id))
+        spans.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", "herald")]},
+        "scopeSpans": [{"scope": {"name": "herald"}, "spans": spans}],
+    }]}
+
+
+def _write_loop(path: str, items: queue.SimpleQueue) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        while True:
+            current = items.get()
+            if current is None:
+                return
+            try:
+                f.write(json.dumps(_otlp(current), separators=(",", ":")) + "\n")
+                if items.empty():
+                    f.flush()
+            except Exception:
+                logger.exception("Writing trace %s failed", current.trace_id)
+
+
+def export(current: Trace) -> None:
+    """Hand a finished trace to the file exporter (if enabled)."""
+    if _export_queue is not None and current.spans:
+        _export_queue.put(current)
+
+
+async def start():
+    """Start the exporter thread if ``TRACE_EXPORT_FILE`` is set."""
+    global _export_queue, _writer
+    if not settings.TRACE_EXPORT_FILE or _writer is not None:
+        return
+    _export_queue = queue.SimpleQueue()
+    _writer = threading.Thread(
+        target=_write_loop, args=(settings.TRACE_EXPORT_FILE, _export_queue), name="herald-trace-export", daemon=True
+    )
+    _writer.start()
+
+
+async def stop():
+    """Write out queued traces and stop the exporter thread."""
+    global _export_queue, _writer
+    if _writer is None:
+        return
+    _export_queue.put(None)
+    _writer.join(timeout=5)
+    _export_queue, _writer = None, None
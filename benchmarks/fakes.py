@@ -0,0 +1,149 @@
+"""Local stand-ins for the channels Herald talks to, used by the benchmarks.
+
+Each server runs in a daemon thread on 127.0.0.1 and counts what it receives. Every
+request (or message, for SMTP) waits ``latency`` seconds, and fails with probability
+``error_rate``:
+
+* :class:`FakeHTTP` serves webhooks (any ``POST`` path, failing with ``500``) and the
+  Telegram Bot API (``/bot<token>/sendMessage`` and ``getMe``, failing with ``429`` and
+  ``retry_after=1`` like a flood-limited bot). Point ``TELEGRAM_API_BASE`` at it.
+* :class:`FakeSMTP` speaks enough SMTP for ``smtplib`` (no TLS, any AUTH accepted),
+  failing with a transient ``451``. Use it with ``SMTP_SECURITY=none``.
+"""
+
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Counts:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.received = 0
+        self.failed = 0
+
+    def hit(self, error_rate: float) -> bool:
+        """Count one request; return True if it should fail."""
+        fail = error_rate > 0 and random.random() < error_rate
+        with self._lock:
+            self.received += 1
+            self.failed += fail
+        return fail
+
+    def snapshot(self) -> dict:
+        return {"received": self.received, "failed": self.failed}
+
+
+class FakeHTTP:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency, self.error_rate = latency, error_rate
+        self.webhook, self.telegram = _Counts(), _Counts()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):  # Telegram getMe (breaker probes)
+                self._reply(200, {"ok": True, "result": {"id": 1, "is_bot": True}})
+
+            def do_HEAD(self):  # webhook probes
+                self.send_response(200)
+                self.send_header("content-length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if self.path.startswith("/bot"):
+                    if fake.telegram.hit(fake.error_rate):
+                        self._reply(429, {"ok": False, "error_code": 429,
+                                          "description": "Too Many Requests: retry after 1",
+                                          "parameters": {"retry_after": 1}})
+                    else:
+                        self._reply(200, {"ok": True, "result": {"message_id": 1}})
+                elif fake.webhook.hit(fake.error_rate):
+                    self._reply(500, {"error": "injected failure"})
+                else:
+                    self._reply(200, {})
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stats(self) -> dict:
+        return {"webhook": self.webhook.snapshot(), "telegram": self.telegram.snapshot()}
+
+
+class FakeSMTP:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency, self.error_rate = latency, error_rate
+        self.messages = _Counts()
+        self.sessions = 0
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _write(self, line: str) -> None:
+                self.wfile.write((line + "\r\n").encode())
+
+            def handle(self):
+                fake.sessions += 1
+                self._write("220 fake-smtp ready")
+                in_data = False
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw:
+                        return
+                    line = raw.decode(errors="replace").rstrip("\r\n")
+                    if in_data:
+                        if line == ".":
+                            in_data = False
+                            if fake.latency:
+                                time.sleep(fake.latency)
+                            if fake.messages.hit(fake.error_rate):
+                                self._write("451 4.3.0 injected temporary failure")
+                            else:
+                                self._write("250 2.0.0 queued")
+                        continue
+                    verb = line[:4].upper()
+                    if verb == "EHLO":
+                        self._write("250-fake-smtp")
+                        self._write("250 AUTH PLAIN LOGIN")
+                    elif verb == "HELO":
+                        self._write("250 fake-smtp")
+                    elif verb == "AUTH":
+                        self._write("235 2.7.0 accepted")
+                    elif verb == "DATA":
+                        in_data = True
+                        self._write("354 end with .")
+                    elif verb == "QUIT":
+                        self._write("221 bye")
+                        return
+                    elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                        self._write("250 ok")
+                    else:
+                        self._write("502 command not implemented")
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stats(self) -> dict:
+        return {**self.messages.snapshot(), "sessions": self.sessions}
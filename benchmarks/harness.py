@@ -0,0 +1,154 @@
+"""Shared plumbing for the end-to-end benchmarks.
+
+* :func:`start_herald` runs Herald with uvicorn in a subprocess and waits until it
+  answers; ``app_dir`` points it at another checkout, so two revisions can be compared
+  with the same harness (e.g. ``git worktree add /tmp/herald-old <rev>``).
+* :func:`setup` creates default channels and an API key through the admin API, which
+  every release has, rather than through the models of the tree being run.
+* :func:`drive` fires ``/send`` requests closed-loop (``concurrency`` in flight) or
+  open-loop (``rate`` per second) and summarises throughput and latency. Client-side
+  errors such as timeouts are counted as statuses, so a server that stalls still
+  yields a report.
+"""
+
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+SECRET = "bench"  # HERALD_SECRET the benchmarks start Herald with
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def start_herald(port: int, env: dict, workers: int = 1, app_dir: str | None = None,
+                 timeout: float = 30) -> subprocess.Popen:
+    """Start ``uvicorn app.main:app`` from ``app_dir`` (default: the current directory)."""
+    app_dir = os.path.abspath(app_dir or os.getcwd())
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env={**env, "PYTHONPATH": app_dir},
+        cwd=app_dir,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Herald exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/login", timeout=1)
+        except httpx.TransportError:
+            time.sleep(0.01)
+            continue
+        if workers > 1:
+            time.sleep(1)  # let the remaining workers finish starting
+        return proc
+    stop_herald(proc)
+    raise RuntimeError("Herald did not start")
+
+
+def stop_herald(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def setup(base_url: str, channels: list[tuple[str, dict]]) -> str:
+    """Log in, create ``(type, config)`` channels as defaults and an unlimited key; return the key."""
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        client.post("/login", data={"password": SECRET})
+        for i, (type_name, config) in enumerate(channels):
+            r = client.post("/api/create_channel", json={
+                "name": f"bench-{type_name}-{i}", "type": type_name, "config": config, "is_default": True,
+            })
+            if not r.json().get("ok"):
+                raise RuntimeError(f"Creating channel failed: {r.text}")
+        r = client.post("/api/create_key", json={"name": "bench", "rate_limit": 0})
+        return r.json()["data"]["key"]
+
+
+async def drive(
+    base_url: str,
+    key: str,
+    requests: int,
+    concurrency: int,
+    rate: float = 0,
+    body: str = "x" * 200,
+    extra: dict | None = None,
+    timeout: float = 60,
+) -> dict:
+    """Send ``requests`` messages to ``/send`` and summarise the responses.
+
+    Closed loop unless ``rate`` is set. In open loop, latency is measured from each
+    request's scheduled start, so a backed-up server shows up in the percentiles
+    instead of slowing the schedule. ``extra`` is merged into every JSON payload.
+    """
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one(i: int, scheduled: float | None = None):
+            start = scheduled if scheduled is not None else time.perf_counter()
+            try:
+                resp = await client.post(
+                    "/send",
+                    json={"title": f"bench {i}", "body": body, **(extra or {})},
+                    headers={"X-API-Key": key},
+                )
+                code = str(resp.status_code)
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        if rate:
+            tasks = []
+            for i in range(requests):
+                scheduled = started + i / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(one(i, scheduled)))
+            await asyncio.gather(*tasks)
+        else:
+            gate = asyncio.Semaphore(concurrency)
+
+            async def gated(i: int):
+                async with gate:
+                    await one(i)
+
+            await asyncio.gather(*(gated(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "statuses": statuses,
+    }
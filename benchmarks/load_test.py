@@ -0,0 +1,169 @@
+"""End-to-end load test: Herald against local fake webhook, Telegram and SMTP servers.
+
+Starts the stand-ins from ``fakes.py`` (with ``--latency`` and ``--error-rate``), runs
+Herald with uvicorn in a subprocess against a fresh database, creates the channels and
+an API key through the admin API, then drives ``/send``:
+
+* closed loop (default): ``--concurrency`` requests in flight until ``--requests`` are done
+* open loop (``--rate``): requests start on a fixed schedule of ``--rate`` per second,
+  whether or not earlier ones finished. Latency is measured from the scheduled start,
+  so a backed-up server shows up in the percentiles instead of slowing the schedule.
+
+With ``--async`` the messages are queued (202) and the run also waits for the queue to
+drain. The report covers throughput, p50/p95/p99 latency, status codes, delivery
+outcomes per the database, what the fakes received, and database growth (rows and
+bytes). ``--output`` writes it as JSON; ``--baseline`` compares with an earlier JSON
+report and exits with status 1 if throughput dropped or p95/p99 rose by more than
+``--tolerance``.
+
+Run from the repository root::
+
+    python benchmarks/load_test.py --requests 2000 --concurrency 50 --output new.json
+    python benchmarks/load_test.py --rate 100 --requests 3000 --error-rate 0.05 --async
+    python benchmarks/load_test.py --requests 2000 --baseline new.json
+
+Any Herald setting can be overridden through the environment (e.g.
+``SQLITE_PROFILE=performance`` or ``LOG_WRITE_BEHIND=true``).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+from fakes import FakeHTTP, FakeSMTP
+from harness import SECRET, drive, free_port, setup, start_herald, stop_herald
+
+
+def _db_snapshot(database_url: str) -> dict:
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        statuses = dict(conn.execute(text("SELECT status, COUNT(*) FROM message_logs GROUP BY status")).all())
+        stat_rows = conn.execute(text("SELECT COUNT(*) FROM message_stats")).scalar()
+        if engine.dialect.name == "sqlite":
+            path = engine.url.database
+            size = sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+        else:
+            size = conn.execute(text("SELECT pg_database_size(current_database())")).scalar()
+    engine.dispose()
+    return {"logs": statuses, "log_rows": sum(statuses.values()), "stat_rows": stat_rows, "bytes": size}
+
+
+def _wait_drained(database_url: str, timeout: float) -> float | None:
+    """Seconds until no ``pending`` logs remain, or None if ``timeout`` passed first."""
+    engine = create_engine(database_url)
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < timeout:
+            with engine.connect() as conn:
+                pending = conn.execute(text("SELECT COUNT(*) FROM message_logs WHERE status = 'pending'")).scalar()
+            if not pending:
+                return round(time.perf_counter() - started, 3)
+            time.sleep(0.2)
+        return None
+    finally:
+        engine.dispose()
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of ``report`` against ``baseline`` beyond ``tolerance`` (a fraction)."""
+    regressions = []
+    old, new = baseline["results"], report["results"]
+    if new["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput_rps {old['throughput_rps']} -> {new['throughput_rps']}")
+    for metric in ("p95_ms", "p99_ms"):
+        if new[metric] > old[metric] * (1 + tolerance):
+            regressions.append(f"{metric} {old[metric]} -> {new[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50, help="requests (or connections) in flight")
+    parser.add_argument("--rate", type=float, default=0, help="open-loop requests per second (0 = closed loop)")
+    parser.add_argument("--async", dest="async_delivery", action="store_true", help="queue instead of sending inline")
+    parser.add_argument("--webhook", type=int, default=2, help="default webhook channels")
+    parser.add_argument("--telegram", type=int, default=1, help="default Telegram channels")
+    parser.add_argument("--email", type=int, default=1, help="default email channels")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake server latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake sends that fail")
+    parser.add_argument("--body-size", type=int, default=200, help="message body length")
+    parser.add_argument("--database-url", help="defaults to a throwaway SQLite database (must be empty)")
+    parser.add_argument("--drain-timeout", type=float, default=300, help="async: max seconds to wait for the queue")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression (fraction)")
+    args = parser.parse_args()
+
+    http = FakeHTTP(args.latency, args.error_rate)
+    smtp = FakeSMTP(args.latency, args.error_rate)
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='herald-load-')}/herald.db"
+
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": database_url,
+        "HERALD_SECRET": SECRET,
+        "TELEGRAM_API_BASE": http.url,
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_SECURITY": "none",
+        "SMTP_USER": "",
+        "SMTP_FROM": "herald@example.com",
+    })
+    # Measure Herald, not its politeness towards real providers
+    env.setdefault("PACING_TYPE_RATES", "{}")
+    env.setdefault("PACING_CHANNEL_RATES", "{}")
+
+    port = free_port()
+    proc = start_herald(port, env)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        key = setup(base_url, (
+            [("webhook", {"url": f"{http.url}/hook/{i}"}) for i in range(args.webhook)]
+            + [("telegram", {"bot_token": f"{i}:bench", "chat_id": "1"}) for i in range(args.telegram)]
+            + [("email", {"to": f"bench{i}@example.com"}) for i in range(args.email)]
+        ))
+        db_before = _db_snapshot(database_url)
+        results = asyncio.run(drive(
+            base_url, key, args.requests, args.concurrency, rate=args.rate,
+            body="x" * args.body_size, extra={"async": args.async_delivery}, timeout=120,
+        ))
+        if args.async_delivery:
+            results["drain_s"] = _wait_drained(database_url, args.drain_timeout)
+        db_after = _db_snapshot(database_url)
+    finally:
+        stop_herald(proc)
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "results": results,
+        "deliveries": db_after["logs"],
+        "fakes": {**http.stats(), "smtp": smtp.stats()},
+        "db_growth": {
+            "log_rows": db_after["log_rows"] - db_before["log_rows"],
+            "stat_rows": db_after["stat_rows"] - db_before["stat_rows"],
+            "bytes": db_after["bytes"] - db_before["bytes"],
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
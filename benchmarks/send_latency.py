@@ -0,0 +1,56 @@
+"""Benchmark: /send latency under concurrent load.
+
+Starts Herald with uvicorn in a subprocess against a throwaway SQLite database and a
+local fake webhook target, creates the channels and an API key through the admin
+API, then fires ``--requests`` POST /send calls with ``--concurrency`` in flight and
+prints throughput and p50/p95/p99 latency as JSON. Requests that time out on the
+client are reported under ``statuses`` rather than aborting the run.
+
+Run from the repository root. ``--app-dir`` runs another checkout with this same
+harness, so two revisions are measured identically::
+
+    git worktree add /tmp/herald-old <rev>
+    python benchmarks/send_latency.py --requests 2000 --concurrency 50 --app-dir /tmp/herald-old
+    python benchmarks/send_latency.py --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from fakes import FakeHTTP
+from harness import SECRET, drive, free_port, setup, start_herald, stop_herald
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--channels", type=int, default=2, help="default webhook channels per message")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake webhook latency in seconds")
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout per request in seconds")
+    parser.add_argument("--app-dir", help="checkout to run (defaults to the current directory)")
+    args = parser.parse_args()
+
+    http = FakeHTTP(args.latency)
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='herald-bench-')}/herald.db"
+    env["HERALD_SECRET"] = SECRET
+    # Older releases only have the global per-minute limit; keep it out of the way
+    env.setdefault("RATE_LIMIT_PER_MINUTE", "1000000")
+
+    port = free_port()
+    proc = start_herald(port, env, app_dir=args.app_dir)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        key = setup(base_url, [("webhook", {"url": f"{http.url}/hook/{i}"}) for i in range(args.channels)])
+        result = asyncio.run(drive(base_url, key, args.requests, args.concurrency, timeout=args.timeout))
+    finally:
+        stop_herald(proc)
+    print(json.dumps({"requests": args.requests, "concurrency": args.concurrency, **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark: concurrent read/write throughput per SQLite profile.
+
+For each ``SQLITE_PROFILE`` a fresh database is seeded, then writer threads insert
+MessageLog rows (one transaction each, like /send) while reader threads run the
+dashboard queries (today's counts + latest logs) for ``--seconds``. Each profile runs
+in its own subprocess because the engine is configured at import time.
+
+Run from the repository root::
+
+    python benchmarks/sqlite_profile.py --writers 4 --readers 4 --seconds 10
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = ["default", "performance"]
+
+
+def _child(args) -> dict:
+    sys.path.insert(0, os.getcwd())
+    from sqlalchemy import func
+
+    from app.database import SessionLocal, init_db
+    from app.models import MessageLog
+
+    init_db()
+    db = SessionLocal()
+    db.add_all(MessageLog(title=f"seed {i}", body="x" * 200, channel_name="seed", status="success")
+               for i in range(args.seed))
+    db.commit()
+    db.close()
+
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + args.seconds
+
+    def writer():
+        while time.monotonic() < stop:
+            db = SessionLocal()
+            try:
+                db.add(MessageLog(title="bench", body="x" * 200, channel_name="bench", status="success"))
+                db.commit()
+                key = "writes"
+            except Exception:
+                key = "errors"
+            finally:
+                db.close()
+            with lock:
+                counts[key] += 1
+
+    def reader():
+        today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        while time.monotonic() < stop:
+            db = SessionLocal()
+            try:
+                db.query(func.count(MessageLog.id)).filter(MessageLog.created_at >= today).scalar()
+                db.query(func.count(MessageLog.id)).filter(
+                    MessageLog.created_at >= today, MessageLog.status == "failed").scalar()
+                db.query(MessageLog).order_by(MessageLog.created_at.desc()).limit(10).all()
+                key = "reads"
+            except Exception:
+                key = "errors"
+            finally:
+                db.close()
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        "profile": os.environ["SQLITE_PROFILE"],
+        "writes_per_s": round(counts["writes"] / args.seconds, 1),
+        "reads_per_s": round(counts["reads"] / args.seconds, 1),
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=20000, help="rows inserted before measuring")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_child(args)))
+        return
+
+    results = []
+    for profile in PROFILES:
+        tmp = tempfile.mkdtemp(prefix="herald-bench-")
+        env = dict(os.environ, SQLITE_PROFILE=profile, DATABASE_URL=f"sqlite:///{tmp}/herald.db")
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", *sys.argv[1:]],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
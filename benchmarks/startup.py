@@ -0,0 +1,102 @@
+"""Benchmark: process startup cost — imports, schema migration and time to first request.
+
+Every measurement runs in a fresh Python process, so module imports and connection
+setup are cold each time:
+
+* ``import``: ``import app.main``, and which channel handler modules it pulled in
+* ``migrate_fresh``: ``init_db()`` on an empty database
+* ``migrate_current``: ``init_db()`` on a database already at the latest schema version
+  (what every restart and every new worker pays)
+* ``migrate_legacy``: ``init_db()`` on a database from before versioned migrations
+  (``schema_migrations`` dropped), which replays every migration once
+* ``ready``: from spawning uvicorn until ``/login`` answers
+
+Each step reports the median wall time in ms over ``--runs`` and the number of SQL
+statements it executed. Run from the repository root::
+
+    python benchmarks/startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import SECRET, free_port, start_herald, stop_herald
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter() - started
+
+from sqlalchemy import event, text
+from app.database import engine, init_db
+
+statements = 0
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count(*args):
+    global statements
+    statements += 1
+
+step = sys.argv[1]
+if step == "migrate_legacy":
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+    statements = 0
+if step.startswith("migrate"):
+    started = time.perf_counter()
+    init_db()
+    elapsed = time.perf_counter() - started
+else:
+    elapsed = imported
+handlers = sorted(m for m in sys.modules if m.startswith("app.channels."))
+print(json.dumps({"ms": elapsed * 1000, "statements": statements, "handlers": handlers}))
+"""
+
+
+def _probe(step: str, env: dict) -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE, step], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _ready_ms(env: dict) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    proc = start_herald(port, env)
+    elapsed = (time.perf_counter() - started) * 1000
+    stop_herald(proc)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("PYTHONPATH", os.getcwd())
+    env.setdefault("HERALD_SECRET", SECRET)
+    runs: dict[str, list[dict]] = {}
+    for _ in range(args.runs):
+        env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='herald-startup-')}/herald.db"
+        for step in ("import", "migrate_fresh", "migrate_current", "migrate_legacy"):
+            runs.setdefault(step, []).append(_probe(step, env))
+        runs.setdefault("ready", []).append({"ms": _ready_ms(env)})
+
+    report = {}
+    for step, results in runs.items():
+        report[step] = {"median_ms": round(statistics.median(r["ms"] for r in results), 2)}
+        if "statements" in results[0]:
+            report[step]["statements"] = results[0]["statements"]
+    report["import"]["handlers_loaded"] = runs["import"][0]["handlers"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
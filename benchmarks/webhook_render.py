@@ -0,0 +1,52 @@
+"""Microbenchmark: per-message cost of rendering a webhook body template.
+
+Compares compiling the template on every message (``from_string`` per send) with the
+cached compiled template used by ``WebhookHandler``, including the ``json.loads`` of
+the rendered payload. Run from the repository root::
+
+    python benchmarks/webhook_render.py --messages 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+TEMPLATE = """{
+  "msgtype": "markdown",
+  "markdown": {
+    "title": "{{ title }}",
+    "text": "### {{ title }}\\n{{ body | replace('\\n', '\\\\n') }}"
+  },
+  "at": {"isAtAll": {{ 'true' if 'urgent' in title else 'false' }}}
+}"""
+
+
+def _measure(render, messages: int) -> float:
+    started = time.perf_counter()
+    for i in range(messages):
+        json.loads(render(f"alert {i}", "disk usage above threshold"))
+    return (time.perf_counter() - started) / messages * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    from app.channels.webhook import _sandbox, compile_template
+
+    uncached = _measure(lambda t, b: _sandbox.from_string(TEMPLATE).render(title=t, body=b), args.messages)
+    cached = _measure(lambda t, b: compile_template(TEMPLATE).render(title=t, body=b), args.messages)
+    print(json.dumps({
+        "messages": args.messages,
+        "compile_per_message_us": round(uncached, 2),
+        "cached_template_us": round(cached, 2),
+        "speedup": round(uncached / cached, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Shared fixtures. The app reads its settings at import, so the throwaway database is
+configured here, before any test module imports it."""
+
+import os
+import tempfile
+
+import pytest
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='herald-tests-')}/herald.db"
+os.environ["HERALD_SECRET"] = "test-secret"
+
+
+@pytest.fixture
+def db():
+    """A session on the migrated test database; every table is emptied afterwards."""
+    from app import cache
+    from app.database import Base, SessionLocal, engine, init_db
+
+    init_db()
+    with SessionLocal() as session:
+        yield session
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name != "schema_migrations":
+                conn.execute(table.delete())
+    cache._snapshot = None
+
+
+@pytest.fixture
+def client(db):
+    """A logged-in client for the app. Startup hooks don't run, so no background tasks start."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    client.post("/login", data={"password": "test-secret"}, follow_redirects=False)
+    return client
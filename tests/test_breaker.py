@@ -0,0 +1,220 @@
+"""Circuit breaker: which failures count, state transitions, probing and display."""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import breaker
+from app.channels import ChannelHandler, DeliveryError, RetryAfter, register
+from app.config import settings
+from app.database import run_db
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://example.com/hook")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+
+@pytest.mark.parametrize("error", [
+    _status_error(500),
+    _status_error(503),
+    _status_error(401),
+    _status_error(404),
+    httpx.ConnectError("refused"),
+    ConnectionResetError(),
+    DeliveryError("Telegram API Error (401): Unauthorized", retryable=False),
+])
+def test_channel_failures_count(error):
+    assert breaker.counts(error)
+
+
+@pytest.mark.parametrize("error", [
+    _status_error(400),
+    _status_error(413),
+    RetryAfter("slow down", 5),
+    DeliveryError("Body template failed to render", retryable=False, channel_fault=False),
+    ValueError("Expecting ',' delimiter"),
+])
+def test_message_failures_dont_count(error):
+    assert not breaker.counts(error)
+
+
+# ── State transitions ────────────────────────────────────
+
+class _Probed(ChannelHandler):
+    type_name = "probed-test"
+    supports_probe = True
+
+    def __init__(self):
+        super().__init__()
+        self.healthy = False
+        self.probes = 0
+
+    async def probe(self, config):
+        self.probes += 1
+        if not self.healthy:
+            raise ConnectionError("still down")
+
+    async def send(self, config, title, body):
+        pass
+
+
+@register
+class _Gated(ChannelHandler):
+    """Sends block until ``release`` is set, so a half-open trial stays in flight."""
+
+    type_name = "gated-test"
+    release: asyncio.Event | None = None
+
+    async def send(self, config, title, body):
+        await self.release.wait()
+
+
+@pytest.fixture(autouse=True)
+def _breaker_settings(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(settings, "BREAKER_OPEN_SECONDS", 0.05)
+    yield
+    for name in list(breaker._breakers):
+        breaker.reset(name)
+
+
+def _fail(name, handler, times):
+    for _ in range(times):
+        breaker.record_failure(name, handler, ConnectionError("refused"))
+
+
+def test_opens_at_the_threshold():
+    async def run():
+        handler = _Probed()
+        _fail("ch", handler, 1)
+        assert breaker.states()["ch"]["state"] == breaker.CLOSED
+        assert breaker.allow("ch")
+        _fail("ch", handler, 1)
+        assert breaker.states()["ch"]["state"] == breaker.OPEN
+        assert not breaker.allow("ch")
+        assert breaker.blocked_for("ch") >= 1.0
+        await breaker.stop()
+
+    asyncio.run(run())
+
+
+def test_success_resets_the_failure_count():
+    async def run():
+        handler = _Probed()
+        _fail("ch", handler, 1)
+        breaker.record_success("ch")
+        _fail("ch", handler, 1)
+        assert breaker.states()["ch"]["state"] == breaker.CLOSED
+
+    asyncio.run(run())
+
+
+def test_probe_keeps_the_circuit_open_until_it_succeeds():
+    async def run():
+        handler = _Probed()
+        _fail("ch", handler, 2)
+        await asyncio.sleep(0.12)
+        assert handler.probes >= 1
+        assert breaker.states()["ch"]["state"] == breaker.OPEN
+        assert breaker.states()["ch"]["last_error"] == "still down"
+        handler.healthy = True
+        await asyncio.sleep(0.12)
+        assert breaker.states()["ch"]["state"] == breaker.CLOSED
+        assert breaker.allow("ch")
+
+    asyncio.run(run())
+
+
+def test_without_probe_one_real_send_is_the_trial():
+    async def run():
+        handler = _Gated()
+        _fail("ch", handler, 2)
+        await asyncio.sleep(0.12)
+        assert breaker.states()["ch"]["state"] == breaker.HALF_OPEN
+        assert breaker.allow("ch")  # the trial
+        assert not breaker.allow("ch")  # everyone else waits for its outcome
+        _fail("ch", handler, 1)
+        assert breaker.states()["ch"]["state"] == breaker.OPEN
+        await asyncio.sleep(0.12)
+        assert breaker.allow("ch")
+        breaker.record_success("ch")
+        assert breaker.states()["ch"]["state"] == breaker.CLOSED
+
+    asyncio.run(run())
+
+
+def test_queued_message_waits_while_the_trial_runs(db):
+    from app import delivery
+    from app.models import Channel, MessageLog
+
+    db.add(Channel(name="gated", type="gated-test", config="{}", enabled=True))
+    logs = [MessageLog(title=f"m{i}", channel_name="gated", status="pending") for i in range(2)]
+    db.add_all(logs)
+    db.commit()
+
+    async def run():
+        _Gated.release = asyncio.Event()
+        _fail("gated", _Gated(), 2)
+        breaker._breakers["gated"].state = breaker.HALF_OPEN
+        claimed = [await run_db(delivery._load, log.id) for log in logs]
+        trial = asyncio.create_task(delivery._process_claimed(claimed[0]))
+        await asyncio.sleep(0.01)
+        retry_in = await delivery._process_claimed(claimed[1])  # loses the race for the trial
+        _Gated.release.set()
+        assert await trial is None
+        return retry_in
+
+    assert asyncio.run(run()) > 0
+    db.expire_all()
+    first, second = (db.get(MessageLog, log.id) for log in logs)
+    assert first.status == "success"
+    assert second.status == "pending" and second.claimed_at is None
+    assert breaker.states()["gated"]["state"] == breaker.CLOSED
+
+
+def test_direct_send_fails_fast_while_open(db):
+    from app.cache import CachedChannel
+    from app.services import dispatch_message
+
+    channel = CachedChannel(id=1, name="gated", type="gated-test", config={}, is_default=False)
+
+    async def run():
+        _fail("gated", _Gated(), 2)
+        return await dispatch_message("t", "b", [channel])
+
+    [log] = asyncio.run(run())
+    assert log.status == "failed"
+    assert log.error_msg.startswith("Circuit open for channel gated")
+
+
+def test_channels_page_shows_breaker_state(client, db):
+    from app.models import Channel
+
+    db.add_all([
+        Channel(name="down", type="webhook", config='{"url": "https://example.com"}'),
+        Channel(name="trial", type="webhook", config='{"url": "https://example.com"}'),
+    ])
+    db.commit()
+    breaker._breakers["down"] = breaker._Breaker(state=breaker.OPEN, failures=5, opened_at=time.monotonic())
+    breaker._breakers["trial"] = breaker._Breaker(state=breaker.HALF_OPEN, failures=5)
+    page = client.get("/channels").text
+    assert "熔断" in page and "连续失败 5 次" in page
+    assert "半开" in page
+
+
+@pytest.mark.parametrize("status_code, healthy", [(200, True), (405, True), (501, True), (401, False), (404, False), (502, False)])
+def test_webhook_probe(monkeypatch, status_code, healthy):
+    from app import http_client
+    from app.channels import get_handler
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(status_code))
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=transport))
+    probe = get_handler("webhook").probe({"url": "https://example.com/hook"})
+    if healthy:
+        asyncio.run(probe)
+    else:
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(probe)
@@ -0,0 +1,95 @@
+"""API key / channel cache: reuse, cross-worker invalidation via app_state and the TTL backstop."""
+
+import asyncio
+import json
+
+import pytest
+
+from app import cache, coordination
+from app.config import settings
+from app.models import APIKey, Channel
+
+
+@pytest.fixture(autouse=True)
+def intervals(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_TTL", 30)
+    monkeypatch.setattr(settings, "CACHE_SYNC_INTERVAL", 1)
+    monkeypatch.setattr(cache, "_reload_lock", None)
+
+
+def _add_key(db, name: str) -> None:
+    db.add(APIKey(name=name, key=f"key-{name}"))
+    db.commit()
+
+
+def _key(name: str):
+    return asyncio.run(cache.get_api_key(f"key-{name}"))
+
+
+def _age(loaded: float = 0, checked: float = 0) -> None:
+    cache._snapshot.loaded_at -= loaded
+    cache._snapshot.checked_at -= checked
+
+
+def test_snapshot_is_reused_within_the_sync_interval(db):
+    _add_key(db, "a")
+    assert _key("a").name == "a"
+    snap = cache._snapshot
+    _add_key(db, "b")  # written behind the cache's back
+    assert _key("b") is None
+    assert cache._snapshot is snap
+
+
+def test_unchanged_version_only_refreshes_the_check(db):
+    _add_key(db, "a")
+    _key("a")
+    snap = cache._snapshot
+    _add_key(db, "b")
+    _age(checked=settings.CACHE_SYNC_INTERVAL + 1)
+    assert _key("b") is None
+    assert cache._snapshot is snap
+    assert cache._fresh(snap)  # checked again, not reloaded
+
+
+def test_version_bump_from_another_worker_reloads(db):
+    _add_key(db, "a")
+    _key("a")
+    old_version = cache._snapshot.version
+    _add_key(db, "b")
+    coordination.bump("config")  # what invalidate() does in the worker that made the change
+    assert _key("b") is None  # not yet due for a version check
+    _age(checked=settings.CACHE_SYNC_INTERVAL + 1)
+    assert _key("b").name == "b"
+    assert cache._snapshot.version == old_version + 1
+
+
+def test_ttl_reloads_without_a_bump(db):
+    _add_key(db, "a")
+    _key("a")
+    _add_key(db, "b")
+    _age(loaded=settings.CACHE_TTL + 1)
+    assert _key("b").name == "b"
+
+
+def test_invalidate_drops_the_snapshot_and_bumps_the_version(db):
+    _add_key(db, "a")
+    _key("a")
+    before = coordination.version(db, "config")
+    cache.invalidate()
+    assert cache._snapshot is None
+    db.expire_all()
+    assert coordination.version(db, "config") == before + 1
+
+
+def test_channels_resolve_to_enabled_defaults_and_names(db):
+    db.add_all([
+        Channel(name="d1", type="webhook", config=json.dumps({"url": "http://x/1"}), is_default=True),
+        Channel(name="d2", type="webhook", config=json.dumps({"url": "http://x/2"}), is_default=True,
+                enabled=False),
+        Channel(name="n", type="webhook", config="not json"),
+    ])
+    db.commit()
+    assert [ch.name for ch in asyncio.run(cache.resolve_channels())] == ["d1"]
+    assert [ch.name for ch in asyncio.run(cache.resolve_channels(["n", "d2", "n", "d1"]))] == ["n", "d1"]
+    assert asyncio.run(cache.get_channel("d1")).config == {"url": "http://x/1"}
+    assert asyncio.run(cache.get_channel("n")).config == {}  # malformed JSON is logged, not raised
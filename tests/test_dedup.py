@@ -0,0 +1,140 @@
+"""Duplicate suppression: fingerprints, window expiry, digests and shutdown."""
+
+import asyncio
+import time
+
+import pytest
+
+from app import dedup
+from app.cache import CachedChannel
+from app.config import settings
+from app.models import MessageLog
+
+A = CachedChannel(id=1, name="a", type="webhook", config={}, is_default=False)
+B = CachedChannel(id=2, name="b", type="webhook", config={}, is_default=False)
+
+
+def _expire_windows():
+    for window in dedup._windows.values():
+        window.expires_at = time.monotonic() - 1
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Digests dispatched by the module, as (title, body, channel names, api key)."""
+    messages = []
+
+    async def dispatch(title, body, channels, api_key_name=""):
+        messages.append((title, body, [ch.name for ch in channels], api_key_name))
+
+    monkeypatch.setattr(dedup, "dispatch_message", dispatch)
+    return messages
+
+
+@pytest.fixture(autouse=True)
+def window(monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_WINDOW", 60)
+    monkeypatch.setattr(settings, "DEDUP_MODE", "drop")
+    monkeypatch.setattr(dedup, "_windows", dedup.OrderedDict())
+    monkeypatch.setattr(dedup, "_digests", set())
+
+
+def test_fingerprint_ignores_channel_order_only():
+    fp = dedup._fingerprint("k", [A, B], "t", "b")
+    assert dedup._fingerprint("k", [B, A], "t", "b") == fp
+    assert dedup._fingerprint("other", [A, B], "t", "b") != fp
+    assert dedup._fingerprint("k", [A], "t", "b") != fp
+    assert dedup._fingerprint("k", [A, B], "t2", "b") != fp
+    assert dedup._fingerprint("k", [A, B], "t", "b2") != fp
+    # fields are separated, so moving text between title and body changes the fingerprint
+    assert dedup._fingerprint("k", [A, B], "tb", "") != dedup._fingerprint("k", [A, B], "t", "b")
+
+
+def test_disabled_never_suppresses(monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_WINDOW", 0)
+    assert not dedup.check("k", [A], "t", "b")
+    assert not dedup.check("k", [A], "t", "b")
+
+
+def test_repeats_are_suppressed_until_the_window_expires():
+    assert not dedup.check("k", [A], "t", "b")
+    assert dedup.check("k", [A], "t", "b")
+    assert not dedup.check("k", [A], "t", "other body")
+    _expire_windows()
+    assert not dedup.check("k", [A], "t", "b")
+    assert dedup.check("k", [A], "t", "b")
+
+
+def test_suppressed_logs_one_per_channel():
+    logs = dedup.suppressed_logs("k", [A, B], "t", "b")
+    assert [(log.channel_name, log.status) for log in logs] == [("a", "suppressed"), ("b", "suppressed")]
+
+
+def test_digest_is_sent_when_a_window_closes(sent, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_MODE", "digest")
+
+    async def run():
+        dedup.check("k", [A, B], "disk full", "on db1")
+        dedup.check("k", [A, B], "disk full", "on db1")
+        dedup.check("k", [A, B], "disk full", "on db1")
+        dedup.check("k", [A], "quiet", "")  # nothing suppressed: no digest
+        dedup._close_expired()
+        assert len(dedup._windows) == 2  # still open
+        _expire_windows()
+        dedup._close_expired()
+        await asyncio.gather(*dedup._digests)
+
+    asyncio.run(run())
+    assert sent == [("[×3] disk full", "on db1\n\n（60 秒内共出现 3 次）", ["a", "b"], "k")]
+    assert dedup._windows == {}
+
+
+def test_evicted_window_sends_its_digest_early(sent, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_MODE", "digest")
+    monkeypatch.setattr(settings, "DEDUP_MAX_ENTRIES", 1)
+
+    async def run():
+        dedup.check("k", [A], "first", "")
+        dedup.check("k", [A], "first", "")
+        dedup.check("k", [A], "second", "")
+        await asyncio.gather(*dedup._digests)
+
+    asyncio.run(run())
+    assert [title for title, *_ in sent] == ["[×2] first"]
+
+
+def test_stop_queues_open_digests_instead_of_sending_them(db, sent, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_MODE", "digest")
+
+    async def run():
+        dedup.check("k", [A, B], "t", "b")
+        dedup.check("k", [A, B], "t", "b")
+        await dedup.stop()
+
+    asyncio.run(run())
+    assert sent == []
+    queued = db.query(MessageLog).order_by(MessageLog.id).all()
+    assert [(log.title, log.channel_name, log.status) for log in queued] == [
+        ("[×2] t", "a", "pending"),
+        ("[×2] t", "b", "pending"),
+    ]
+
+
+def test_stop_is_bounded_by_digests_in_flight(db, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_MODE", "digest")
+    monkeypatch.setattr(dedup, "SHUTDOWN_GRACE", 0.05)
+
+    async def stuck(*args, **kwargs):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(dedup, "dispatch_message", stuck)
+
+    async def run():
+        dedup.check("k", [A], "t", "b")
+        dedup.check("k", [A], "t", "b")
+        dedup._close(next(iter(dedup._windows)))  # its digest is now being sent
+        started = time.monotonic()
+        await dedup.stop()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 1
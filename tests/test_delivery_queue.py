@@ -0,0 +1,118 @@
+"""Async delivery queue: row claims across sessions, stale-claim recovery and the sweep."""
+
+import asyncio
+import datetime
+
+import pytest
+
+from app import delivery
+from app.config import settings
+from app.database import SessionLocal
+from app.models import MessageLog
+
+NOW = datetime.datetime.utcnow
+
+
+def _pending(db, age: float = 0, claimed_ago: float | None = None) -> int:
+    log = MessageLog(
+        title="t",
+        channel_name="ch",
+        status="pending",
+        created_at=NOW() - datetime.timedelta(seconds=age),
+        claimed_at=None if claimed_ago is None else NOW() - datetime.timedelta(seconds=claimed_ago),
+    )
+    db.add(log)
+    db.commit()
+    return log.id
+
+
+def test_only_one_session_wins_a_claim(db):
+    log_id = _pending(db)
+    with SessionLocal() as first, SessionLocal() as second:
+        assert delivery._load(first, log_id) is not None
+        assert delivery._load(second, log_id) is None
+    db.expire_all()
+    assert db.get(MessageLog, log_id).claimed_at is not None
+
+
+def test_finished_rows_are_not_claimed(db):
+    log_id = _pending(db)
+    db.get(MessageLog, log_id).status = "success"
+    db.commit()
+    with SessionLocal() as session:
+        assert delivery._load(session, log_id) is None
+
+
+def test_stale_claim_is_taken_over(db):
+    fresh = _pending(db, claimed_ago=settings.DELIVERY_CLAIM_TIMEOUT - 30)
+    stale = _pending(db, claimed_ago=settings.DELIVERY_CLAIM_TIMEOUT + 30)
+    with SessionLocal() as session:
+        assert delivery._load(session, fresh) is None
+        assert delivery._load(session, stale) is not None
+    assert delivery._pending_ids(db, 0) == []  # the takeover renewed the claim
+
+
+def test_released_row_can_be_claimed_again(db):
+    log_id = _pending(db)
+    with SessionLocal() as session:
+        assert delivery._load(session, log_id) is not None
+        delivery._release(session, log_id)
+        assert delivery._load(session, log_id) is not None
+
+
+def test_sweep_waits_for_min_age(db):
+    young = _pending(db, age=delivery.SWEEP_MIN_AGE - 10)
+    old = _pending(db, age=delivery.SWEEP_MIN_AGE + 10)
+    stale = _pending(db, age=1000, claimed_ago=settings.DELIVERY_CLAIM_TIMEOUT + 30)
+    _pending(db, age=1000, claimed_ago=5)  # a live worker has it
+    assert delivery._pending_ids(db, delivery.SWEEP_MIN_AGE) == [old, stale]
+    assert delivery._pending_ids(db, 0) == [young, old, stale]  # startup takes every unclaimed row
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(delivery, "_owned", set())
+    monkeypatch.setattr(delivery, "_queue", None)
+    return delivery
+
+
+def test_sweep_skips_ids_this_process_holds(db, queue, monkeypatch):
+    monkeypatch.setattr(settings, "DELIVERY_SWEEP_INTERVAL", 0.01)
+    held = _pending(db, age=delivery.SWEEP_MIN_AGE + 10)
+    left_behind = _pending(db, age=delivery.SWEEP_MIN_AGE + 10)
+
+    async def run():
+        queue._queue = asyncio.Queue()
+        assert queue._schedule(held)
+        assert not queue._schedule(held)  # already queued here
+        sweeper = asyncio.create_task(queue._sweep())
+        await asyncio.sleep(0.1)  # several sweeps
+        sweeper.cancel()
+        return [queue._queue.get_nowait() for _ in range(queue._queue.qsize())]
+
+    assert asyncio.run(run()) == [held, left_behind]
+    assert queue._owned == {held, left_behind}
+
+
+def test_deferred_id_stays_owned_until_requeued(db, queue, monkeypatch):
+    log_id = _pending(db)
+    calls = []
+
+    async def fake_process(i):
+        calls.append(i)
+        return 0.05 if len(calls) == 1 else None  # deferred once, then done
+
+    monkeypatch.setattr(delivery, "_process", fake_process)
+
+    async def run():
+        queue._queue = asyncio.Queue()
+        queue._schedule(log_id)
+        worker = asyncio.create_task(queue._worker())
+        await asyncio.sleep(0.01)
+        assert log_id in queue._owned and not queue._schedule(log_id)  # the sweep can't double it
+        await asyncio.sleep(0.1)
+        worker.cancel()
+
+    asyncio.run(run())
+    assert calls == [log_id, log_id]
+    assert queue._owned == set()
@@ -0,0 +1,113 @@
+"""Keyset pagination, filters and cached totals over message_logs."""
+
+import datetime
+
+import pytest
+
+from app import log_query
+from app.config import settings
+from app.log_query import LogFilters, count_logs, decode_cursor, query_logs
+from app.models import MessageLog
+
+T0 = datetime.datetime(2024, 1, 31, 8, 0, 0)
+
+
+@pytest.fixture
+def logs(db):
+    """25 logs, created in bursts of five rows sharing one timestamp (ties on created_at)."""
+    rows = [
+        MessageLog(
+            title=f"m{i}",
+            status="failed" if i % 3 == 0 else "success",
+            channel_name="a" if i % 2 else "b",
+            created_at=T0 + datetime.timedelta(seconds=i // 5),
+        )
+        for i in range(25)
+    ]
+    db.add_all(rows)
+    db.commit()
+    log_query.invalidate_counts()
+    return rows
+
+
+def _newest_first(rows):
+    return sorted(rows, key=lambda log: (log.created_at, log.id), reverse=True)
+
+
+def _walk(db, filters, limit):
+    """Every page from the first onwards, following next_cursor."""
+    pages, cursor = [], None
+    while True:
+        page = query_logs(db, filters, cursor=cursor, limit=limit)
+        pages.append(page)
+        if not page.next_cursor:
+            return pages
+        cursor = page.next_cursor
+
+
+def test_pages_cover_every_row_once_across_ties(db, logs):
+    pages = _walk(db, LogFilters(), limit=7)
+    seen = [log.id for page in pages for log in page.items]
+    assert seen == [log.id for log in _newest_first(logs)]
+    assert [len(page.items) for page in pages] == [7, 7, 7, 4]
+    assert pages[0].prev_cursor is None and pages[-1].next_cursor is None
+
+
+def test_prev_returns_the_page_before(db, logs):
+    first = query_logs(db, LogFilters(), limit=7)
+    second = query_logs(db, LogFilters(), cursor=first.next_cursor, limit=7)
+    back = query_logs(db, LogFilters(), cursor=second.prev_cursor, direction="prev", limit=7)
+    assert [log.id for log in back.items] == [log.id for log in first.items]
+    assert back.prev_cursor is None
+    assert back.next_cursor == first.next_cursor
+
+
+def test_filters_apply_with_the_cursor(db, logs):
+    filters = LogFilters(status="success", channel="a", since=T0 + datetime.timedelta(seconds=1))
+    expected = [
+        log.id for log in _newest_first(logs)
+        if log.status == "success" and log.channel_name == "a" and log.created_at >= filters.since
+    ]
+    pages = _walk(db, filters, limit=3)
+    assert [log.id for page in pages for log in page.items] == expected
+    assert count_logs(db, filters) == len(expected)
+
+
+def test_links_keep_full_time_precision():
+    filters = LogFilters(since=datetime.datetime(2024, 1, 31, 8, 0, 59), until=datetime.datetime(2024, 2, 1, 0, 0, 0, 500))
+    params = filters.as_params()
+    assert log_query.parse_time(params["since"]) == filters.since
+    assert log_query.parse_time(params["until"]) == filters.until
+
+
+def test_counts_are_cached_until_invalidated(db, logs, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_COUNT_CACHE_TTL", 60)
+    assert count_logs(db, LogFilters()) == 25
+    db.add(MessageLog(title="late", created_at=T0))
+    db.commit()
+    assert count_logs(db, LogFilters()) == 25
+    assert count_logs(db, LogFilters(channel="b")) == 13  # other filter sets are counted separately
+    log_query.invalidate_counts()
+    assert count_logs(db, LogFilters()) == 26
+
+
+@pytest.mark.parametrize("cursor", ["garbage!", "bm90LWEta2V5"])
+def test_bad_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_bad_cursor_is_a_400_on_both_endpoints(client, logs):
+    assert client.get("/api/logs", params={"cursor": "garbage!"}).status_code == 400
+    assert client.get("/logs", params={"cursor": "garbage!"}).status_code == 400
+    assert client.get("/api/logs", params={"since": "yesterday"}).status_code == 400
+    assert client.get("/logs", params={"since": "yesterday"}).status_code == 400
+
+
+def test_api_logs_pages(client, logs):
+    first = client.get("/api/logs", params={"limit": 5, "status": "failed"}).json()["data"]
+    assert first["total"] == 9
+    second = client.get("/api/logs", params={"limit": 5, "status": "failed", "cursor": first["next_cursor"]}).json()
+    assert [item["id"] for item in first["items"] + second["data"]["items"]] == [
+        log.id for log in _newest_first(logs) if log.status == "failed"
+    ]
@@ -0,0 +1,94 @@
+"""Write-behind log sink: batching, shutdown flush, backpressure and flush retries."""
+
+import asyncio
+
+import pytest
+
+from app import log_sink
+from app.config import settings
+from app.models import MessageLog, MessageStat
+
+
+@pytest.fixture(autouse=True)
+def sink(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_WRITE_BEHIND", True)
+    monkeypatch.setattr(settings, "LOG_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "LOG_FLUSH_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "LOG_QUEUE_MAX", 100)
+    monkeypatch.setattr(log_sink, "_stats", {key: 0 for key in log_sink._stats})
+    yield
+    log_sink._queue = log_sink._task = None
+
+
+def _logs(n: int) -> list[MessageLog]:
+    return [MessageLog(title=f"t{i}", status="success", channel_name="ch", api_key_name="k") for i in range(n)]
+
+
+def _run(*steps):
+    """Start the sink, await each step in turn, then stop it (flushing what is left)."""
+    async def main():
+        await log_sink.start()
+        for step in steps:
+            await step
+        await log_sink.stop()
+
+    asyncio.run(main())
+
+
+def test_rows_are_written_in_batches_with_defaults(db):
+    _run(log_sink.submit(_logs(7)))
+    rows = db.query(MessageLog).order_by(MessageLog.id).all()
+    assert [row.title for row in rows] == [f"t{i}" for i in range(7)]
+    assert rows[0].created_at is not None and rows[0].retry_count == 0
+    stats = log_sink.stats()
+    assert stats["rows_written"] == 7
+    assert stats["batches"] == 3  # 3 + 3 + 1
+    assert stats["enabled"] is False
+    assert sum(s.count for s in db.query(MessageStat)) == 7
+
+
+def test_a_partial_batch_is_flushed_after_the_interval(db):
+    async def check():
+        await log_sink.submit(_logs(2))
+        await asyncio.sleep(settings.LOG_FLUSH_INTERVAL * 4)
+        assert log_sink.stats()["batches"] == 1
+        assert db.query(MessageLog).count() == 2
+
+    _run(check())
+
+
+def test_full_queue_makes_submitters_wait(db, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_QUEUE_MAX", 2)
+    monkeypatch.setattr(settings, "LOG_BATCH_SIZE", 1)
+    _run(log_sink.submit(_logs(6)))
+    assert log_sink.stats()["backpressure_waits"] > 0
+    assert log_sink.stats()["dropped"] == 0
+    assert db.query(MessageLog).count() == 6
+
+
+def test_failed_flush_is_retried(db, monkeypatch):
+    insert_rows = log_sink._insert_rows
+    calls = []
+
+    def flaky(session, rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        insert_rows(session, rows)
+
+    monkeypatch.setattr(log_sink, "_insert_rows", flaky)
+    _run(log_sink.submit(_logs(2)))
+    assert calls == [2, 2]
+    assert db.query(MessageLog).count() == 2
+    assert log_sink.stats()["dropped"] == 0
+
+
+def test_rows_are_dropped_after_the_last_attempt(db, monkeypatch):
+    def broken(session, rows):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(log_sink, "FLUSH_ATTEMPTS", 1)
+    monkeypatch.setattr(log_sink, "_insert_rows", broken)
+    _run(log_sink.submit(_logs(2)))
+    assert log_sink.stats()["dropped"] == 2
+    assert db.query(MessageLog).count() == 0
@@ -0,0 +1,88 @@
+"""Versioned schema migrations: fresh databases, upgrades from v1 and the stats backfill."""
+
+import pytest
+from sqlalchemy import event, inspect, text
+
+from app import migrate
+from app.database import SCHEMA_VERSION, Base, engine, init_db, schema_version
+
+
+@pytest.fixture
+def empty_db():
+    """Start from an empty database; leave a fully migrated, empty one behind."""
+    from app import models  # noqa: F401 – ensure models are registered
+
+    Base.metadata.drop_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+
+
+@pytest.fixture
+def backfills(monkeypatch):
+    """Calls of the stats backfill made by :func:`app.migrate.run`."""
+    calls = []
+    monkeypatch.setattr(migrate, "ensure_stats_built", calls.append)
+    return calls
+
+
+def _make_v1() -> None:
+    """Turn the current schema into what a v1 release left behind."""
+    init_db()
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_message_logs_trace_id"))
+        conn.execute(text("ALTER TABLE message_logs DROP COLUMN trace_id"))
+        conn.execute(text("ALTER TABLE message_logs DROP COLUMN timings"))
+        conn.execute(text("DROP TABLE message_stats"))
+        conn.execute(text("DELETE FROM schema_migrations WHERE version > 1"))
+        conn.execute(text(
+            "INSERT INTO message_logs (title, body, status, channel_name, api_key_name, created_at) "
+            "VALUES ('old', '', 'success', 'ch', 'k', CURRENT_TIMESTAMP)"
+        ))
+
+
+def _columns(table: str) -> set[str]:
+    return {col["name"] for col in inspect(engine).get_columns(table)}
+
+
+def test_fresh_database_is_marked_fully_migrated(empty_db, backfills):
+    migrate.run()
+    assert schema_version() == SCHEMA_VERSION
+    assert {"timings", "trace_id"} <= _columns("message_logs")
+    assert backfills == []
+
+
+def test_v1_database_is_upgraded_and_backfilled(empty_db):
+    _make_v1()
+    assert schema_version() == 1
+
+    migrate.run()
+    assert schema_version() == SCHEMA_VERSION
+    assert {"timings", "trace_id"} <= _columns("message_logs")
+    assert "ix_message_logs_trace_id" in {ix["name"] for ix in inspect(engine).get_indexes("message_logs")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT status, count FROM message_stats")).all() == [("success", 1)]
+        assert conn.execute(text("SELECT trace_id FROM message_logs")).scalar() == ""
+
+
+def test_backfill_only_runs_on_upgrade(empty_db, backfills):
+    _make_v1()
+    migrate.run()
+    assert len(backfills) == 1
+    migrate.run()
+    assert len(backfills) == 1
+
+
+def test_current_database_is_one_query(empty_db):
+    init_db()
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        assert init_db() == []
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert len(statements) == 1
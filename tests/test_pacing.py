@@ -0,0 +1,23 @@
+"""Cancelled paced sends give their tokens back."""
+
+import asyncio
+
+from app import pacing
+from app.config import settings
+
+
+def test_cancelled_wait_refunds_its_token(monkeypatch):
+    monkeypatch.setattr(settings, "PACING_CHANNEL_RATES", {"paced-test": 1})
+    monkeypatch.setattr(settings, "PACING_TYPE_RATES", {})
+
+    async def run():
+        await pacing.wait("paced-test", "webhook")  # takes the only token
+        for _ in range(5):
+            try:
+                await asyncio.wait_for(pacing.wait("paced-test", "webhook"), 0.05)
+            except TimeoutError:
+                pass
+
+    asyncio.run(run())
+    # Without refunds the balance would be about -5, delaying the next send by ~5s
+    assert pacing._channel_buckets["paced-test"].tokens > -1
@@ -0,0 +1,101 @@
+"""Message log retention: batched pruning by age and row count, pending rows and archives."""
+
+import datetime
+import glob
+import gzip
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app import retention
+from app.config import settings
+from app.database import engine
+from app.models import MessageLog
+
+NOW = datetime.datetime.utcnow()
+
+
+@pytest.fixture(autouse=True)
+def _policy(monkeypatch):
+    monkeypatch.setattr(retention, "BATCH_PAUSE", 0)
+    monkeypatch.setattr(settings, "LOG_PRUNE_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "LOG_RETENTION_DAYS", 0)
+    monkeypatch.setattr(settings, "LOG_RETENTION_MAX_ROWS", 0)
+    monkeypatch.setattr(settings, "LOG_ARCHIVE_DIR", "")
+
+
+@pytest.fixture
+def deletes():
+    """Counts DELETE statements against message_logs."""
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("DELETE FROM message_logs"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def _seed(db, days_old: list[int], status="success") -> list[int]:
+    logs = [
+        MessageLog(title=f"t{i}", body="b", status=status, created_at=NOW - datetime.timedelta(days=d, seconds=i))
+        for i, d in enumerate(days_old)
+    ]
+    db.add_all(logs)
+    db.commit()
+    return [log.id for log in logs]
+
+
+def _remaining(db) -> set[int]:
+    return {row.id for row in db.query(MessageLog.id)}
+
+
+def test_disabled_policy_deletes_nothing(db):
+    _seed(db, [100, 100])
+    assert retention.prune(db) == {"expired": 0, "over_limit": 0}
+    assert len(_remaining(db)) == 2
+
+
+def test_expired_rows_are_deleted_by_id_in_batches(db, deletes, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_RETENTION_DAYS", 30)
+    old = _seed(db, [40] * 7)
+    fresh = _seed(db, [1, 2])
+    assert retention.prune(db) == {"expired": 7, "over_limit": 0}
+    assert _remaining(db) == set(fresh)
+    assert not set(old) & _remaining(db)
+    assert len(deletes) == 3  # 3 + 3 + 1
+    assert all("IN" in statement for statement in deletes)
+
+
+def test_row_limit_deletes_the_oldest(db, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_RETENTION_MAX_ROWS", 4)
+    ids = _seed(db, [9, 8, 7, 6, 5, 4])  # ids in oldest-first order
+    assert retention.prune(db) == {"expired": 0, "over_limit": 2}
+    assert _remaining(db) == set(ids[2:])
+
+
+def test_pending_rows_are_never_pruned(db, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_RETENTION_DAYS", 30)
+    pending = _seed(db, [40, 40], status="pending")
+    _seed(db, [40])
+    assert retention.prune(db)["expired"] == 1
+    assert _remaining(db) == set(pending)
+
+
+def test_archive_holds_every_pruned_row(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "LOG_ARCHIVE_DIR", str(tmp_path))
+    old = _seed(db, [40] * 5)
+    _seed(db, [1])
+    retention.prune(db)
+
+    [path] = glob.glob(str(tmp_path / "message_logs-*.jsonl.gz"))
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert [row["id"] for row in archived] == old[::-1]  # oldest first
+    assert archived[-1]["title"] == "t0"
+    assert archived[-1]["body"] == "b"
+    assert archived[-1]["status"] == "success"
@@ -0,0 +1,20 @@
+"""Per-channel retry deadlines must end before a queued message's claim expires."""
+
+import pytest
+
+from app.config import settings
+from app.retry import max_deadline, policy_for, validate_overrides
+
+
+def test_deadline_above_claim_timeout_is_rejected():
+    with pytest.raises(ValueError, match="DELIVERY_CLAIM_TIMEOUT"):
+        validate_overrides({"retry_deadline": str(settings.DELIVERY_CLAIM_TIMEOUT + 300)})
+
+
+def test_deadline_within_limit_is_accepted():
+    validate_overrides({"retry_deadline": str(max_deadline())})
+    validate_overrides({"retry_deadline": ""})
+
+
+def test_saved_oversized_deadline_is_capped():
+    assert policy_for({"retry_deadline": 10_000}).deadline == max_deadline() < settings.DELIVERY_CLAIM_TIMEOUT
@@ -0,0 +1,82 @@
+"""POST /send_batch: per-message results, partial failures and per-message rate limiting."""
+
+import pytest
+
+from app import ratelimit
+from app.channels import ChannelHandler, DeliveryError, register
+from app.config import settings
+from app.models import APIKey, Channel
+
+
+@register
+class _Accepting(ChannelHandler):
+    type_name = "accepting-test"
+
+    async def send(self, config, title, body):
+        pass
+
+
+@register
+class _Rejecting(ChannelHandler):
+    type_name = "rejecting-test"
+
+    async def send(self, config, title, body):
+        raise DeliveryError("payload rejected", retryable=False, channel_fault=False)
+
+
+@pytest.fixture
+def api_key(db, monkeypatch):
+    monkeypatch.setattr(ratelimit, "_backend", None)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 0)
+    db.add_all([
+        APIKey(name="batch", key="batch-key", rate_limit=10),
+        Channel(name="ok", type="accepting-test", config="{}", is_default=True),
+        Channel(name="bad", type="rejecting-test", config="{}"),
+    ])
+    db.commit()
+    return "batch-key"
+
+
+def _batch(client, key, messages):
+    return client.post("/send_batch", json={"messages": messages}, headers={"X-API-Key": key})
+
+
+def test_all_sent(client, api_key):
+    resp = _batch(client, api_key, [{"title": "a"}, {"title": "b", "channels": ["ok"]}])
+    assert resp.status_code == 200
+    assert [r["ok"] for r in resp.json()["data"]] == [True, True]
+
+
+def test_partial_failure_is_207_with_one_result_per_message(client, api_key):
+    resp = _batch(client, api_key, [
+        {"title": "fine"},
+        {"body": "no title"},
+        {"title": "to a failing channel", "channels": "ok,bad"},
+        {"title": "to nowhere", "channels": "missing"},
+        "not an object",
+    ])
+    assert resp.status_code == 207
+    payload = resp.json()
+    assert payload["ok"] is False
+    assert payload["msg"] == "4/5 message(s) failed"
+    fine, untitled, partial, nowhere, junk = payload["data"]
+    assert fine["ok"] is True and fine["index"] == 0
+    assert untitled == {"index": 1, "ok": False, "error": "title is required"}
+    assert partial["ok"] is False
+    assert [(r["channel"], r["status"]) for r in partial["results"]] == [("ok", "success"), ("bad", "failed")]
+    assert partial["results"][1]["error"] == "payload rejected"
+    assert nowhere["error"].startswith("Channel(s) not found")
+    assert junk["error"] == "message must be an object"
+
+
+def test_every_message_counts_against_the_rate_limit(client, api_key):
+    assert _batch(client, api_key, [{"title": str(i)} for i in range(6)]).status_code == 200
+    resp = _batch(client, api_key, [{"title": str(i)} for i in range(6)])
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) == 12  # room for two more messages at 10/min
+
+
+def test_batch_larger_than_the_burst_is_rejected(client, api_key):
+    resp = _batch(client, api_key, [{"title": str(i)} for i in range(11)])
+    assert resp.status_code == 413
+    assert "burst of 10" in resp.json()["msg"]
@@ -0,0 +1,140 @@
+"""SMTP session pool against a stand-in SMTP server on localhost."""
+
+import asyncio
+import smtplib
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app.smtp_pool import SMTPPool
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections.append(self.connection)
+        self._reply("220 stand-in ready")
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:  # the client closed the session without QUIT
+                return
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            server.commands.append(command.split(":")[0].split(" ")[0])
+            if command.startswith("EHLO"):
+                self._reply("250-stand-in", "250 8BITMIME")
+            elif command.startswith("MAIL") and server.mail_reply:
+                self._reply(server.mail_reply)
+            elif command.startswith("DATA"):
+                self._reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                server.delivered += 1
+                self._reply("250 queued")
+            elif command.startswith("QUIT"):
+                self._reply("221 bye")
+                return
+            else:  # MAIL, RCPT, NOOP, RSET
+                self._reply("250 OK")
+
+    def _reply(self, *lines):
+        self.wfile.write("".join(f"{line}\r\n" for line in lines).encode())
+
+
+class _StandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.connections: list[socket.socket] = []
+        self.commands: list[str] = []
+        self.delivered = 0
+        self.mail_reply = ""  # e.g. "421 closing" to reject MAIL FROM
+
+    def drop_all(self):
+        """Close every client connection from the server side."""
+        with self.lock:
+            for conn in self.connections:
+                conn.shutdown(socket.SHUT_RDWR)
+            self.connections.clear()
+
+
+@pytest.fixture
+def smtp_server():
+    server = _StandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pool(smtp_server):
+    pool = SMTPPool("127.0.0.1", smtp_server.server_address[1], "", "", security="none", size=2)
+    yield pool
+    pool.close()
+
+
+def _send(pool):
+    pool.send("from@example.com", ["to@example.com"], "Subject: hi\r\n\r\nhello")
+
+
+def test_session_is_reused(smtp_server, pool):
+    for _ in range(3):
+        _send(pool)
+    assert smtp_server.delivered == 3
+    assert pool.stats()["sessions_opened"] == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_reconnects_after_server_side_drop(smtp_server, pool):
+    _send(pool)
+    smtp_server.drop_all()
+    _send(pool)
+    stats = pool.stats()
+    assert smtp_server.delivered == 2
+    assert stats["reconnects"] == 1
+    assert stats["sessions_opened"] == 2
+
+
+def test_idle_session_is_checked_with_noop(smtp_server, pool):
+    _send(pool)
+    server, _ = pool._idle[0]
+    pool._idle[0] = (server, time.monotonic() - pool.noop_after - 1)
+    _send(pool)
+    assert "NOOP" in smtp_server.commands
+    assert pool.stats()["sessions_opened"] == 1
+
+
+def test_expired_session_is_replaced(smtp_server, pool):
+    _send(pool)
+    server, _ = pool._idle[0]
+    pool._idle[0] = (server, time.monotonic() - pool.idle_timeout - 1)
+    _send(pool)
+    assert "NOOP" not in smtp_server.commands
+    assert smtp_server.commands.count("QUIT") == 1
+    assert pool.stats()["sessions_opened"] == 2
+
+
+def test_service_closing_reply_discards_the_session(smtp_server, pool):
+    _send(pool)
+    smtp_server.mail_reply = "421 service closing"
+    with pytest.raises(smtplib.SMTPSenderRefused):
+        _send(pool)
+    assert pool.stats()["idle"] == 0
+
+
+def test_send_async_runs_on_the_pools_threads(smtp_server, pool):
+    names = []
+    send = pool.send
+    pool.send = lambda *args: names.append(threading.current_thread().name) or send(*args)
+    asyncio.run(pool.send_async("from@example.com", ["to@example.com"], "Subject: hi\r\n\r\nhello"))
+    assert names and names[0].startswith("herald-smtp")
@@ -0,0 +1,110 @@
+"""Hourly message_stats rollup: upserts, rebuilds, backfill and the dashboard totals."""
+
+import datetime
+import os
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import stats
+from app.models import MessageLog, MessageStat
+
+NOW = datetime.datetime.utcnow()
+HOUR = stats.hour_bucket(NOW)
+
+
+def _log(status, channel="ch", created_at=NOW):
+    return MessageLog(title="t", status=status, channel_name=channel, api_key_name="k", created_at=created_at)
+
+
+def _rollup(db) -> dict:
+    return {(s.bucket, s.channel_name, s.status): s.count for s in db.query(MessageStat).all()}
+
+
+def test_record_logs_accumulates_per_bucket(db):
+    stats.record_logs(db, [_log("success"), _log("success"), _log("failed"), _log("pending")])
+    stats.record_logs(db, [_log("success"), _log("suppressed", channel="other")])
+    db.commit()
+    assert _rollup(db) == {
+        (HOUR, "ch", "success"): 3,
+        (HOUR, "ch", "failed"): 1,
+        (HOUR, "other", "suppressed"): 1,
+    }
+
+
+def test_generic_upsert_branch(db, monkeypatch):
+    monkeypatch.setattr(db.get_bind().dialect, "name", "generic")
+    counts = Counter({(HOUR, "ch", "k", "success"): 2})
+    stats._upsert(db, counts)
+    stats._upsert(db, counts)
+    db.commit()
+    assert _rollup(db) == {(HOUR, "ch", "success"): 4}
+
+
+@pytest.mark.skipif(not os.environ.get("HERALD_TEST_POSTGRES_URL"), reason="set HERALD_TEST_POSTGRES_URL to run")
+def test_postgres_upsert_branch():
+    engine = create_engine(os.environ["HERALD_TEST_POSTGRES_URL"])
+    MessageStat.__table__.create(engine, checkfirst=True)
+    with Session(engine) as pg:
+        pg.query(MessageStat).delete()
+        counts = Counter({(HOUR, "ch", "k", "success"): 2})
+        stats._upsert(pg, counts)
+        stats._upsert(pg, counts)
+        pg.commit()
+        assert _rollup(pg) == {(HOUR, "ch", "success"): 4}
+        pg.query(MessageStat).delete()
+        pg.commit()
+
+
+def test_rebuild_recounts_final_logs(db):
+    earlier = NOW - datetime.timedelta(hours=3)
+    db.add_all([_log("success"), _log("failed", created_at=earlier), _log("pending")])
+    db.add(MessageStat(bucket=HOUR, channel_name="stale", api_key_name="", status="success", count=99))
+    db.commit()
+    assert stats.rebuild(db) == 2
+    assert _rollup(db) == {
+        (HOUR, "ch", "success"): 1,
+        (stats.hour_bucket(earlier), "ch", "failed"): 1,
+    }
+
+
+def test_ensure_built_backfills_only_an_empty_rollup(db):
+    db.add_all([_log("success"), _log("failed")])
+    db.commit()
+    stats.ensure_built(db)
+    assert _rollup(db) == {(HOUR, "ch", "success"): 1, (HOUR, "ch", "failed"): 1}
+
+    db.add(_log("success"))
+    db.commit()
+    stats.ensure_built(db)  # already built: logs written since are counted as they're saved
+    assert _rollup(db)[(HOUR, "ch", "success")] == 1
+
+
+def test_ensure_built_ignores_a_database_without_final_logs(db):
+    db.add(_log("pending"))
+    db.commit()
+    stats.ensure_built(db)
+    assert _rollup(db) == {}
+
+
+def test_totals_since_include_pending(db):
+    logs = [_log("success"), _log("failed"), _log("suppressed"), _log("pending"), _log("pending")]
+    db.add_all(logs)
+    db.flush()
+    stats.record_logs(db, logs)
+    db.commit()
+    assert stats.totals_since(db, HOUR) == {"success": 1, "failed": 1, "suppressed": 1, "pending": 2}
+
+
+def test_dashboard_counts_every_message_of_today(client, db):
+    logs = [_log("success"), _log("failed"), _log("suppressed"), _log("pending")]
+    db.add_all(logs)
+    db.flush()
+    stats.record_logs(db, logs)
+    db.commit()
+    page = client.get("/").text
+    assert '<div class="stat-value text-accent">4</div>' in page
+    assert '<div class="stat-value text-error">1</div>' in page
+
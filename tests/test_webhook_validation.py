@@ -0,0 +1,40 @@
+"""Saving a webhook channel rejects body templates that fail to compile or render."""
+
+import asyncio
+
+import pytest
+
+from app.channels import DeliveryError, get_handler
+
+BASE = {"url": "https://example.com/hook", "content_type": "json"}
+
+
+@pytest.mark.parametrize("template, message", [
+    ('{"title": "{{ title }"}', "语法错误"),
+    ('{"x": "{{ foo.bar }}"}', "渲染失败"),  # jinja2.UndefinedError
+    ('{"x": {{ title|int + body }}}', "TypeError"),
+])
+def test_broken_body_template_is_a_validation_error(template, message):
+    with pytest.raises(ValueError, match=message):
+        get_handler("webhook").validate_config({**BASE, "body_template": template})
+
+
+def test_valid_body_template_passes():
+    get_handler("webhook").validate_config({**BASE, "body_template": '{"text": "{{ title }}: {{ body }}"}'})
+
+
+def test_render_failure_at_send_time_is_permanent():
+    handler = get_handler("webhook")
+    config = {**BASE, "body_template": '{"x": {{ 1 + body }}}'}
+    with pytest.raises(DeliveryError) as info:
+        asyncio.run(handler.send(config, "t", "b"))
+    assert info.value.retryable is False
+
+
+def test_body_that_breaks_the_json_is_not_a_channel_fault():
+    handler = get_handler("webhook")
+    config = {**BASE, "body_template": '{"text": "{{ body }}"}'}
+    with pytest.raises(DeliveryError) as info:
+        asyncio.run(handler.send(config, "t", 'say "hi"'))
+    assert info.value.retryable is False
+    assert info.value.channel_fault is False